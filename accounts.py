@@ -0,0 +1,65 @@
+"""
+Instagram account configuration for Instagram Bot
+Each account gets its own credentials and storage-state file
+"""
+
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Site the accounts log in to; point it at mock_instagram.py for offline runs and benchmarks
+INSTAGRAM_BASE_URL = os.getenv('INSTAGRAM_BASE_URL', 'https://www.instagram.com').rstrip('/')
+
+DEFAULT_ACCOUNT = 'default'
+# Kept for single-account setups so existing sessions keep working
+DEFAULT_STATE_FILE = 'instagram_state.json'
+
+
+class Account:
+    """Credentials and session file for one Instagram account"""
+
+    def __init__(self, name, username, password, state_file):
+        self.name = name
+        self.username = username
+        self.password = password
+        self.state_file = state_file
+
+    def to_dict(self):
+        return {'name': self.name, 'username': self.username, 'state_file': self.state_file}
+
+
+def load_accounts():
+    """Accounts from the environment, keyed by name.
+
+    Multi-account setups list names in IG_ACCOUNTS (e.g. "main,backup") and
+    give each one IG_<NAME>_USERNAME / IG_<NAME>_PASSWORD. Without IG_ACCOUNTS
+    the single IG_USERNAME / IG_PASSWORD account is used.
+    """
+    names = [n.strip() for n in os.getenv('IG_ACCOUNTS', '').split(',') if n.strip()]
+    if not names:
+        return {
+            DEFAULT_ACCOUNT: Account(
+                DEFAULT_ACCOUNT,
+                os.getenv('IG_USERNAME'),
+                os.getenv('IG_PASSWORD'),
+                DEFAULT_STATE_FILE
+            )
+        }
+
+    accounts = {}
+    for name in names:
+        key = re.sub(r'[^A-Za-z0-9]', '_', name).upper()
+        accounts[name] = Account(
+            name,
+            os.getenv(f'IG_{key}_USERNAME'),
+            os.getenv(f'IG_{key}_PASSWORD'),
+            f'instagram_state_{name}.json'
+        )
+    return accounts
+
+
+def default_account():
+    """First configured account, used when no account is specified"""
+    return next(iter(load_accounts().values()))
@@ -0,0 +1,128 @@
+"""
+Admission control for Instagram Bot API
+Bounds the send queue by depth and projected wait, and limits requests that block on the
+browser, so bursts get 429/503 with Retry-After instead of piling up
+"""
+
+import os
+import math
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from metrics import ADMISSION_REJECTED_TOTAL
+
+load_dotenv()
+
+# Most sends waiting in the queue (0 = unlimited); more get 429
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '1000'))
+# Longest projected wait (seconds) before a new send would start (0 = unlimited); longer gets 503
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '600'))
+# Requests that hold their connection open while the browser works (e.g. /login)
+ADMISSION_MAX_BLOCKING = int(os.getenv('ADMISSION_MAX_BLOCKING', '4'))
+
+
+class Overloaded(Exception):
+    """A request was turned away; status is 429 or 503 and retry_after is in seconds"""
+
+    def __init__(self, status, retry_after, message, reason):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.reason = reason
+
+
+class AdmissionController:
+    """Decides whether new work is accepted, from the job queue's depth and schedule.
+
+    queue_stats() is JobQueue.stats(): depth, counts per status and, with a
+    scheduler, the projected drain time.
+    """
+
+    def __init__(self, queue_stats, workers=1, max_queue=ADMISSION_MAX_QUEUE,
+                 max_wait=ADMISSION_MAX_WAIT_SECONDS, max_blocking=ADMISSION_MAX_BLOCKING):
+        self.queue_stats = queue_stats
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_blocking = max_blocking
+        self.blocking = 0
+        self.rejected = {}
+        self._lock = threading.Lock()
+
+    def _reject(self, status, retry_after, message, reason, record=True):
+        if record:
+            with self._lock:
+                self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            ADMISSION_REJECTED_TOTAL.inc(reason=reason)
+        return Overloaded(status, retry_after, message, reason)
+
+    def _per_job_seconds(self, stats):
+        """How often a worker slot frees up, from recent run times (1s if unknown)"""
+        run_seconds = (stats.get('schedule') or {}).get('run_seconds') or 1
+        return run_seconds / self.workers
+
+    def projected_wait(self, stats=None):
+        """Seconds until a send accepted now could start"""
+        stats = stats or self.queue_stats()
+        schedule = stats.get('schedule')
+        if schedule:
+            # Rate limits and sends already due; sends scheduled for later don't count
+            return max(0, schedule['wait_seconds'])
+        return stats['depth'] * self._per_job_seconds(stats)
+
+    def check(self, count=1, record=True):
+        """Raise Overloaded unless `count` more sends can be queued.
+
+        record=False only asks (e.g. /ready) without counting a rejection.
+        """
+        stats = self.queue_stats()
+        wait = self.projected_wait(stats)
+        if self.max_queue and stats['depth'] + count > self.max_queue:
+            excess = stats['depth'] + count - self.max_queue
+            # Rate limits can make each queued send take longer than a worker run
+            per_job = max(self._per_job_seconds(stats), wait / max(1, stats['depth']))
+            raise self._reject(
+                429, excess * per_job,
+                f"Send queue is full ({stats['depth']} waiting, max {self.max_queue})", 'queue_full', record
+            )
+        if self.max_wait and wait > self.max_wait:
+            raise self._reject(
+                503, wait - self.max_wait,
+                f'Projected wait of {wait:.0f}s exceeds {self.max_wait:.0f}s', 'wait_too_long', record
+            )
+
+    @contextmanager
+    def blocking_request(self):
+        """Hold one of the max_blocking slots for a request that waits on the browser"""
+        with self._lock:
+            if self.max_blocking and self.blocking >= self.max_blocking:
+                full = True
+            else:
+                full = False
+                self.blocking += 1
+        if full:
+            raise self._reject(
+                503, self._per_job_seconds(self.queue_stats()),
+                f'Too many requests waiting on the browser (max {self.max_blocking})', 'blocking_full'
+            )
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.blocking -= 1
+
+    def stats(self):
+        stats = self.queue_stats()
+        with self._lock:
+            blocking = self.blocking
+            rejected = dict(self.rejected)
+        return {
+            'in_flight': stats['counts'].get('running', 0) + blocking,
+            'waiting': stats['depth'],
+            'blocking_requests': blocking,
+            'projected_wait_seconds': round(self.projected_wait(stats), 3),
+            'max_queue': self.max_queue,
+            'max_wait_seconds': self.max_wait,
+            'max_blocking': self.max_blocking,
+            'rejected': rejected,
+        }
@@ -1,7 +1,28 @@
+import os
 import sys
-from flask import Flask, request, jsonify
-from bot import InstagramBot
+import json
+import math
+import time
+import queue
+import asyncio
 import threading
+import contextlib
+from datetime import datetime, timezone
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from bot import InstagramBot
+from browser_pool import BrowserPool
+from selector_resolver import resolver
+from thread_cache import thread_cache
+from jobs import JobQueue, RetryLater
+from scheduler import Scheduler, WINDOWS
+from session_probe import session_probe
+from outbox import outbox
+from webhooks import webhooks, valid_callback_url
+from admission import AdmissionController, Overloaded
+from failures import BotFailure, retry_policy, RETRY_NOW, WAIT, LOGIN_THEN_RETRY, GIVE_UP
+from idempotency import IdempotencyStore, IdempotencyConflict, IDEMPOTENCY_KEY_MAX_LENGTH, fingerprint
+from metrics import registry, Gauge, CONTENT_TYPE, RETRIES_TOTAL
+from tracing import tracer, profiler_name
 
 # Ensure UTF-8 encoding for stdout/stderr to handle emojis
 if sys.stdout.encoding != 'utf-8':
@@ -11,85 +32,827 @@ if sys.stderr.encoding != 'utf-8':
 
 app = Flask(__name__)
 
-# Global lock to prevent concurrent bot operations
-bot_lock = threading.Lock()
+# Changed to port 5001 to avoid conflicts with AirPlay Receiver on macOS
+PORT = int(os.getenv('PORT', '5001'))
+
+# Largest number of recipients accepted by one /send/batch call
+BATCH_MAX_ITEMS = 1000
+
+# A streamed /send/batch ends (listing the jobs still pending) when no result arrives for this long
+BATCH_RESULT_TIMEOUT_SECONDS = float(os.getenv('BATCH_RESULT_TIMEOUT_SECONDS', '300'))
+
+# Furthest ahead a send_at or deadline may be, which also caps timeouts (days)
+SCHEDULE_MAX_DAYS = float(os.getenv('SCHEDULE_MAX_DAYS', '365'))
+
+# Handlers that get a trace of their own (the read-only endpoints aren't traced)
+TRACED_ENDPOINTS = {'login', 'send_dm', 'send_batch'}
+
+# Long-lived warm browser shared by all requests; sends run concurrently on
+# separate pages while login runs exclusively
+browser_pool = BrowserPool()
+
+
+def check_sessions(names, force=False):
+    """Probe saved sessions without a browser; marks dead accounts so the dispatcher skips them"""
+    results = {}
+    for name in names:
+        result = session_probe.check(browser_pool.accounts[name], force=force)
+        if result['valid'] is False:
+            browser_pool.sessions[name].logged_in = False
+        results[name] = result
+    return results
+
+
+# Held while a background probe runs, so /health never starts a second one
+_session_refresh = threading.Lock()
+
+
+def refresh_sessions():
+    """Re-probe stale sessions on a background thread; /health reports the cached results meanwhile"""
+    if not _session_refresh.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            check_sessions(list(browser_pool.accounts))
+        except Exception as e:
+            print(f"[WARNING] Session probe failed: {e}")
+        finally:
+            _session_refresh.release()
+
+    threading.Thread(target=run, name='session-probe', daemon=True).start()
+
+
+def note_retry(job, reason, action, delay=0):
+    """Record a retry of a failed send attempt on the job, its trace and metrics"""
+    print(f"[RETRY] Send {job.id} attempt {job.attempts} failed ({reason}), next: {action}"
+          + (f" in {delay:.1f}s" if delay else ""))
+    job.retries.append({'attempt': job.attempts, 'reason': reason, 'action': action, 'delay': round(delay, 3)})
+    job.trace.event('retry', attempt=job.attempts, reason=reason, action=action, delay=delay)
+    RETRIES_TOTAL.inc(operation='send_dm', reason=reason, action=action)
+
+
+def relogin(job):
+    """Log the job's account in again with its stored credentials, True if that worked"""
+    with job.trace.span('relogin', account=job.account):
+        return browser_pool.run(
+            lambda session: InstagramBot(session, trace=job.trace, deadline=job.deadline).login(),
+            account=job.account,
+            exclusive=True
+        )
+
+
+def probe_accounts(job):
+    """(accounts whose saved session works, None), or ([], detail) when none does.
+
+    Fails fast instead of finding out after a full page load. Unpinned jobs
+    may move off the account the scheduler gave them if its session is dead.
+    """
+    names = [job.account] if job.pinned else (
+        [job.account] + [name for name in browser_pool.candidates() if name != job.account]
+    )
+    with job.trace.span('session_probe', accounts=names):
+        probes = check_sessions(names)
+    usable = [name for name in names if probes[name]['valid'] is not False]
+    if usable:
+        return usable, None
+    reasons = ', '.join(f"{name}: {result['reason']}" for name, result in probes.items())
+    return [], f'Not logged in ({reasons}). Please run /login first.'
+
+
+def run_send_job(job):
+    """Run a queued send on a warm browser page (called from a job worker).
+
+    Failed attempts are retried according to their failure class: transient
+    ones right away on the same page, expired sessions after logging in
+    again, others by putting the job back in the queue with a backoff. No
+    attempt is started, and no wait outlasts, the job's deadline.
+    """
+    if job.deadline is not None and time.time() >= job.deadline:
+        raise BotFailure('deadline_exceeded', 'Deadline passed while the send was queued', job.attempts)
+
+    async def send(session):
+        job.trace.record('pool_wait', submitted, time.time())
+        while True:
+            job.attempts += 1
+            bot = InstagramBot(session, job_id=job.id, trace=job.trace, deadline=job.deadline)
+            success = await bot.send_dm(job.username, job.message)
+            job.network = bot.network_stats
+            job.debug_dir = bot.capture.artifact_dir if bot.capture else None
+            if success:
+                return None
+            # None means success to the caller, so a failure always needs a reason
+            reason = bot.failure_reason or 'exception'
+            # Transient failures go again without giving the page back
+            action, _ = retry_policy.next_action(reason, job.attempts, deadline=job.deadline)
+            if action != RETRY_NOW:
+                return reason
+            note_retry(job, reason, action)
+
+    relogged = False
+    while True:
+        usable, detail = probe_accounts(job)
+        if usable and job.account not in usable:
+            # The scheduler charged this account's rate limit; give the token back and
+            # let it pick (and charge) one that works instead of switching here
+            scheduler.refund(job.account)
+            note_retry(job, 'not_logged_in', 'reroute')
+            raise RetryLater(0, 'not_logged_in')
+        if usable:
+            submitted = time.time()
+            reason = browser_pool.run(send, account=job.account)
+            if reason is None:
+                return True
+        else:
+            # A dead session found by the probe is a failed attempt like one found
+            # in the browser, so the policy can log the account in again
+            job.attempts += 1
+            reason = 'not_logged_in'
+        action, delay = retry_policy.next_action(reason, job.attempts, relogged, job.deadline)
+        if action == GIVE_UP:
+            raise BotFailure(reason, detail, attempts=job.attempts)
+        note_retry(job, reason, action, delay)
+        if action == WAIT:
+            # Don't hold a worker while backing off; the scheduler runs it again when due
+            raise RetryLater(delay, reason)
+        if action == LOGIN_THEN_RETRY:
+            relogged = True
+            if not relogin(job):
+                raise BotFailure(reason, 'Not logged in and logging in again failed', job.attempts)
+
+
+# Paces sends per account (RATE_LIMIT_PER_* settings) and holds back scheduled
+# ones; sends from before a restart still count against the limits
+scheduler = Scheduler(browser_pool.candidates, available=browser_pool.available)
+for name, starts in outbox.recent_starts(time.time() - max(WINDOWS.values())).items():
+    scheduler.seed(name, starts)
+
+# Sends are accepted immediately and processed in the background, one worker
+# per concurrent browser page; the outbox keeps them across restarts and results
+# are POSTed to the callback URL once they finish
+send_queue = JobQueue(run_send_job, workers=browser_pool.concurrency, store=outbox, scheduler=scheduler,
+                      notifier=webhooks)
+
+
+def _outbox_idempotency_lookup(key, since):
+    row = outbox.find_idempotency_key(key, since)
+    if not row:
+        return None
+    return row['id'], fingerprint(row['username'], row['message'], row['account'])
+
+
+# Turns sends away with 429/503 once the queue is too deep or too slow, and caps
+# requests that hold their connection while the browser works
+admission = AdmissionController(send_queue.stats, workers=browser_pool.concurrency)
+
+# Idempotency-Key -> send it created; keys from before a restart are found in the outbox
+idempotency = IdempotencyStore(lookup=_outbox_idempotency_lookup)
+
+Gauge('instabot_queue_depth', 'Send jobs waiting for a worker', lambda: send_queue.stats()['depth'])
+Gauge(
+    'instabot_queue_drain_seconds',
+    'Projected seconds until every queued send has run, given the rate limits',
+    lambda: send_queue.stats()['schedule']['drain_seconds']
+)
+Gauge('instabot_open_thread_tabs', 'Thread tabs kept open for follow-up sends', lambda: browser_pool.tab_cache_stats()['size'])
+Gauge('instabot_in_flight', 'Sends running plus requests waiting on the browser', lambda: admission.stats()['in_flight'])
+Gauge('instabot_pages_in_use', 'Browser pages currently running a bot operation', lambda: browser_pool.running)
+
+
+def overloaded(error):
+    """429/503 response with Retry-After for a request admission control turned away"""
+    response = jsonify({
+        'status': 'error',
+        'message': str(error),
+        'reason': error.reason,
+        'retry_after': error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
+
+def parse_timestamp(value):
+    """Unix timestamp from a number or an ISO 8601 string (naive means UTC), None if not given.
+
+    Times more than SCHEDULE_MAX_DAYS ahead are rejected.
+    """
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # JSON bodies may carry NaN/Infinity, which would never (or always) be due
+        if not math.isfinite(value):
+            raise ValueError(f'expected a finite number, got {value!r}')
+        timestamp = float(value)
+    elif isinstance(value, str):
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        timestamp = parsed.timestamp()
+    else:
+        raise ValueError(f'expected unix seconds or an ISO 8601 time, got {value!r}')
+    if timestamp > time.time() + SCHEDULE_MAX_DAYS * 86400:
+        raise ValueError(f'more than {SCHEDULE_MAX_DAYS:g} days ahead')
+    return timestamp
+
+
+def valid_text(value):
+    """True for a non-empty string (usernames, messages)"""
+    return isinstance(value, str) and bool(value.strip())
+
+
+def requested_deadline(data):
+    """Unix time the caller needs a result by, None if not given.
+
+    Either a timeout in seconds from now (X-Request-Timeout header or "timeout"
+    field) or an absolute "deadline" (unix seconds or ISO 8601).
+    """
+    timeout = request.headers.get('X-Request-Timeout', data.get('timeout'))
+    if timeout in (None, ''):
+        return parse_timestamp(data.get('deadline'))
+    try:
+        seconds = float(timeout)
+    except (TypeError, ValueError):
+        raise ValueError(f'timeout must be a number of seconds, got {timeout!r}')
+    # float() also takes "nan" and "inf"
+    if isinstance(timeout, bool) or not math.isfinite(seconds):
+        raise ValueError(f'timeout must be a finite number of seconds, got {timeout!r}')
+    if seconds <= 0:
+        raise ValueError('timeout must be positive')
+    if seconds > SCHEDULE_MAX_DAYS * 86400:
+        raise ValueError(f'timeout must be at most {SCHEDULE_MAX_DAYS:g} days')
+    return time.time() + seconds
+
+
+def requested_callback(data):
+    """(callback_url, None) for a send request, or (None, error response) for a bad URL"""
+    callback_url = data.get('callback_url')
+    if callback_url is not None and not valid_callback_url(callback_url):
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'callback_url must be an http(s) URL'
+        }), 400)
+    return callback_url, None
+
+
+def requested_profiler(data):
+    """Profiler asked for with the X-Profile header or a "profile" field, if any"""
+    return profiler_name(request.headers.get('X-Profile', data.get('profile')))
+
+
+@app.before_request
+def start_request_trace():
+    if request.endpoint in TRACED_ENDPOINTS:
+        g.trace = tracer.start(f'{request.method} {request.path}')
+        g.trace_span = g.trace.begin('handler', endpoint=request.endpoint)
+
+
+@app.after_request
+def finish_request_trace(response):
+    trace = g.pop('trace', None)
+    if trace:
+        trace.end(g.trace_span)
+        trace.finish(status_code=response.status_code)
+        response.headers['X-Trace-Id'] = trace.id
+    return response
 
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({'status': 'ok'})
+    refresh_sessions()
+    return jsonify({
+        'status': 'ok',
+        'browser_pool': browser_pool.stats(),
+        'selectors': resolver.report(),
+        'thread_cache': thread_cache.stats(),
+        'queue': send_queue.stats(),
+        'outbox': outbox.stats(),
+        'idempotency': idempotency.stats(),
+        'admission': admission.stats(),
+        'webhooks': webhooks.stats(),
+        'sessions': session_probe.stats(),
+    })
+
+
+@app.route('/sessions', methods=['GET'])
+def list_sessions():
+    """Probe every saved session now (cached results are reused unless ?force=true)"""
+    force = request.args.get('force', 'false').lower() == 'true'
+    return jsonify(check_sessions(browser_pool.accounts, force=force))
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Cheap readiness check for load balancers: 503 with Retry-After while new sends would be refused"""
+    try:
+        admission.check(record=False)
+    except Overloaded as e:
+        return overloaded(e)
+    return jsonify(dict(status='ok', **admission.stats()))
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-phase latencies, queue waits and outcomes in Prometheus text format"""
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/threads', methods=['GET'])
+def list_threads():
+    """Inspect the username -> thread URL cache"""
+    limit = request.args.get('limit', 100, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    return jsonify({
+        'stats': thread_cache.stats(),
+        'threads': thread_cache.entries(limit=limit, offset=offset, account=request.args.get('account')),
+    })
+
+
+@app.route('/threads', methods=['DELETE'])
+def clear_threads():
+    """Drop every cached thread URL"""
+    removed = thread_cache.clear()
+    return jsonify({'status': 'success', 'removed': removed})
+
+
+@app.route('/threads/<username>', methods=['DELETE'])
+def invalidate_thread(username):
+    """Drop the cached thread URL for one user (all accounts unless ?account= is given)"""
+    if not thread_cache.invalidate(username, request.args.get('account')):
+        return jsonify({
+            'status': 'error',
+            'message': f'No cached thread for {username}'
+        }), 404
+    return jsonify({'status': 'success', 'message': f'Cache entry for {username} removed'})
+
+
+@app.route('/accounts', methods=['GET'])
+def list_accounts():
+    """Configured accounts and their session state"""
+    return jsonify({
+        name: dict(account.to_dict(), **browser_pool.sessions[name].stats())
+        for name, account in browser_pool.accounts.items()
+    })
+
+
+async def login_with_retries(session, trace, deadline=None):
+    """Log one account in, retrying transient failures; returns None or the failure as a dict"""
+    attempts = 0
+    while True:
+        attempts += 1
+        bot = InstagramBot(session, trace=trace, deadline=deadline)
+        if await bot.login():
+            return None
+        action, delay = retry_policy.next_action(bot.failure_reason, attempts, deadline=deadline)
+        if action not in (RETRY_NOW, WAIT):
+            return BotFailure(bot.failure_reason, attempts=attempts).to_dict()
+        print(f"[RETRY] Login of {session.account.name} failed ({bot.failure_reason}), retrying"
+              + (f" in {delay:.1f}s" if delay else ""))
+        trace.event('retry', attempt=attempts, reason=bot.failure_reason, action=action, delay=delay)
+        RETRIES_TOTAL.inc(operation='login', reason=bot.failure_reason, action=action)
+        await asyncio.sleep(delay)
 
 
 @app.route('/login', methods=['POST'])
 def login():
-    """Trigger Instagram login"""
-    with bot_lock:
+    """Trigger Instagram login for one account, or every account if none is given"""
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        if not isinstance(data, dict):
+            return jsonify({
+                'status': 'error',
+                'message': 'JSON body must be an object'
+            }), 400
+        
+        account = data.get('account')
+        
+        if account and (not isinstance(account, str) or account not in browser_pool.accounts):
+            return jsonify({
+                'status': 'error',
+                'message': f'Unknown account: {account}'
+            }), 400
+        
         try:
-            bot = InstagramBot()
-            success = bot.login()
-            
-            if success:
-                return jsonify({
-                    'status': 'success',
-                    'message': 'Login successful'
-                })
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Login failed'
-                }), 400
-                
-        except Exception as e:
+            deadline = requested_deadline(data)
+        except ValueError as e:
             return jsonify({
                 'status': 'error',
-                'message': str(e)
-            }), 500
+                'message': f'Invalid deadline: {e}'
+            }), 400
+        
+        # Exclusive per account: waits for that account's in-flight sends and
+        # holds new ones back, other accounts keep sending. Accounts log in in parallel.
+        names = [account] if account else list(browser_pool.accounts)
+        profile = requested_profiler(data)
+        traces = {
+            name: tracer.start('login', account=name, profile=profile, request_trace_id=g.trace.id)
+            for name in names
+        }
+        try:
+            # The connection stays open until every login is done, so only a few may wait at once
+            with admission.blocking_request():
+                futures = {
+                    name: browser_pool.submit(
+                        lambda session, trace=traces[name]: login_with_retries(session, trace, deadline),
+                        account=name,
+                        exclusive=True
+                    )
+                    for name in names
+                }
+                failures = {name: future.result() for name, future in futures.items()}
+        finally:
+            for trace in traces.values():
+                trace.finish()
+        results = {name: failure is None for name, failure in failures.items()}
+        success = all(results.values())
+        trace_urls = {name: f'/traces/{trace.id}' for name, trace in traces.items()}
+        
+        if success:
+            return jsonify({
+                'status': 'success',
+                'message': 'Login successful',
+                'accounts': results,
+                'trace_urls': trace_urls
+            })
+        else:
+            return jsonify({
+                'status': 'error',
+                'message': 'Login failed',
+                'accounts': results,
+                'failures': {name: failure for name, failure in failures.items() if failure},
+                'trace_urls': trace_urls
+            }), 400
+            
+    except Overloaded as e:
+        return overloaded(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
 
 
 @app.route('/send', methods=['POST'])
 def send_dm():
-    """Send a direct message"""
-    with bot_lock:
+    """Queue a direct message, returns a job id to poll"""
+    try:
+        data = request.get_json(silent=True)
+        
+        if not data or not isinstance(data, dict):
+            return jsonify({
+                'status': 'error',
+                'message': 'No JSON data provided'
+            }), 400
+        
+        username = data.get('username')
+        message = data.get('message')
+        account = data.get('account')
+        
+        if not valid_text(username) or not valid_text(message):
+            return jsonify({
+                'status': 'error',
+                'message': 'username and message must be non-empty strings'
+            }), 400
+        
+        if account and (not isinstance(account, str) or account not in browser_pool.accounts):
+            return jsonify({
+                'status': 'error',
+                'message': f'Unknown account: {account}'
+            }), 400
+        
+        # Retries (e.g. after a client-side timeout) reuse the key and get the first send back
+        key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if key is not None and (not isinstance(key, str) or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH):
+            return jsonify({
+                'status': 'error',
+                'message': f'Idempotency key must be a string of at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters'
+            }), 400
+        
+        # Optional delayed send: unix seconds or an ISO 8601 time
         try:
-            data = request.get_json()
-            
-            if not data:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'No JSON data provided'
-                }), 400
-            
-            username = data.get('username')
-            message = data.get('message')
-            
-            if not username or not message:
+            send_at = parse_timestamp(data.get('send_at'))
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': f'Invalid send_at: {e}'
+            }), 400
+        
+        deadline, error = send_deadline(data, send_at)
+        if error:
+            return error
+        
+        # Result is POSTed here once the send finishes (instead of polling /jobs/<id>)
+        callback_url, error = requested_callback(data)
+        if error:
+            return error
+        
+        def queue_send():
+            # Retries of an accepted key are answered even when the queue is full
+            admission.check()
+            job = send_queue.submit(
+                username, message, account=account, profile=requested_profiler(data),
+                idempotency_key=key, send_at=send_at, deadline=deadline, callback_url=callback_url
+            )
+            job.trace.attributes['request_trace_id'] = g.trace.id
+            return job.id
+        
+        if key:
+            try:
+                job_id, created = idempotency.claim(key, fingerprint(username, message, account), queue_send)
+            except IdempotencyConflict as e:
                 return jsonify({
                     'status': 'error',
-                    'message': 'Missing username or message'
-                }), 400
+                    'message': str(e)
+                }), 422
+            if not created:
+                return idempotent_replay(job_id)
+        else:
+            job_id = queue_send()
+        g.trace.attributes['job_id'] = job_id
+        
+        return jsonify({
+            'status': 'queued',
+            'message': f'Message to {username} queued',
+            'job_id': job_id,
+            'status_url': f'/jobs/{job_id}',
+            'trace_url': f'/traces/{job_id}',
+            'queue_depth': send_queue.stats()['depth'],
+            'send_at': send_at,
+            'deadline': deadline,
+            'callback_url': callback_url or webhooks.url
+        }), 202
             
-            bot = InstagramBot()
-            success = bot.send_dm(username, message)
-            
-            if success:
-                return jsonify({
-                    'status': 'success',
-                    'message': f'Message sent to {username}'
-                })
-            else:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Failed to send message'
-                }), 400
-                
-        except Exception as e:
+    except Overloaded as e:
+        return overloaded(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+def send_deadline(data, send_at=None):
+    """(deadline, None) for a send request, or (None, error response) if it can't be met"""
+    try:
+        deadline = requested_deadline(data)
+    except ValueError as e:
+        return None, (jsonify({
+            'status': 'error',
+            'message': f'Invalid deadline: {e}'
+        }), 400)
+    if deadline is not None and deadline <= max(time.time(), send_at or 0):
+        return None, (jsonify({
+            'status': 'error',
+            'message': 'Deadline is already past' + (' send_at' if send_at else '')
+        }), 400)
+    return deadline, None
+
+
+def idempotent_replay(job_id):
+    """Answer a retried /send with the outcome of the send its key already created"""
+    job = send_queue.get(job_id)
+    data = job.to_dict() if job else outbox.get(job_id)
+    g.trace.attributes.update(job_id=job_id, idempotent_replay=True)
+    if not data:
+        # Pruned from both memory and the outbox; nothing more to report
+        data = {'id': job_id, 'status': 'unknown'}
+    finished = data['status'] not in ('queued', 'running')
+    response = jsonify(dict(
+        data,
+        job_id=job_id,
+        status_url=f'/jobs/{job_id}',
+        trace_url=f'/traces/{job_id}',
+        idempotent_replay=True
+    ))
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response, 200 if finished else 202
+
+
+@app.route('/send/batch', methods=['POST'])
+def send_batch():
+    """Queue many DMs on one account and stream each result as NDJSON as it finishes.
+
+    With a callback_url the request returns 202 right away and the results are POSTed there.
+    """
+    data = request.get_json(silent=True)
+    
+    if not data or not isinstance(data, dict):
+        return jsonify({
+            'status': 'error',
+            'message': 'No JSON data provided'
+        }), 400
+    
+    # Either explicit items, or one message for a list of recipients
+    items = data.get('items')
+    recipients = data.get('recipients')
+    if items is None and recipients is not None:
+        if not isinstance(recipients, list):
+            return jsonify({
+                'status': 'error',
+                'message': '"recipients" must be a list of usernames'
+            }), 400
+        items = [{'username': username, 'message': data.get('message')} for username in recipients]
+    
+    if not items or not isinstance(items, list):
+        return jsonify({
+            'status': 'error',
+            'message': 'Provide a non-empty "items" list, or "recipients" with "message"'
+        }), 400
+    
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({
+            'status': 'error',
+            'message': f'Batch too large (max {BATCH_MAX_ITEMS} items)'
+        }), 400
+    
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not valid_text(item.get('username')) or not valid_text(item.get('message')):
             return jsonify({
                 'status': 'error',
-                'message': str(e)
-            }), 500
+                'message': f'Item {index} needs username and message as non-empty strings'
+            }), 400
+    
+    account = data.get('account')
+    if account and (not isinstance(account, str) or account not in browser_pool.accounts):
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown account: {account}'
+        }), 400
+    
+    try:
+        send_at = parse_timestamp(data.get('send_at'))
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid send_at: {e}'
+        }), 400
+    
+    # One deadline for the whole batch
+    deadline, error = send_deadline(data, send_at)
+    if error:
+        return error
+    
+    callback_url, error = requested_callback(data)
+    if error:
+        return error
+    
+    # A streamed batch holds its connection until the last result, like /login
+    blocking = contextlib.ExitStack()
+    try:
+        admission.check(len(items))
+        if not callback_url:
+            blocking.enter_context(admission.blocking_request())
+    except Overloaded as e:
+        return overloaded(e)
+    
+    # The whole batch runs on one warm account session
+    account = account or browser_pool.pick_account()
+    started = time.time()
+    finished = queue.Queue()
+    try:
+        jobs = send_queue.submit_many(
+            [(item['username'], item['message']) for item in items],
+            account=account,
+            on_done=None if callback_url else finished.put,
+            send_at=send_at,
+            deadline=deadline,
+            callback_url=callback_url
+        )
+    except Exception:
+        blocking.close()
+        raise
+    index_of = {job.id: index for index, job in enumerate(jobs)}
+    for job in jobs:
+        job.trace.attributes['request_trace_id'] = g.trace.id
+    g.trace.attributes['job_ids'] = list(index_of)
+    
+    if callback_url:
+        # Don't hold the connection (and a tunnel stream) open for the whole batch
+        return jsonify({
+            'status': 'queued',
+            'account': account,
+            'total': len(jobs),
+            'job_ids': list(index_of),
+            'callback_url': callback_url
+        }), 202
+    
+    def stream():
+        yield json.dumps({
+            'type': 'accepted',
+            'account': account,
+            'total': len(jobs),
+            'job_ids': [job.id for job in jobs]
+        }) + '\n'
+        
+        succeeded = 0
+        pending = set(index_of)
+        while pending:
+            try:
+                job = finished.get(timeout=BATCH_RESULT_TIMEOUT_SECONDS)
+            except queue.Empty:
+                # The jobs keep running; their results stay available at /jobs/<id>
+                break
+            pending.discard(job.id)
+            succeeded += job.status == 'succeeded'
+            yield json.dumps(dict(type='result', index=index_of[job.id], **job.to_dict())) + '\n'
+        
+        yield json.dumps({
+            'type': 'summary',
+            'total': len(jobs),
+            'succeeded': succeeded,
+            'failed': len(jobs) - succeeded - len(pending),
+            'pending_job_ids': [job_id for job_id in index_of if job_id in pending],
+            'seconds': round(time.time() - started, 3)
+        }) + '\n'
+    
+    response = Response(stream_with_context(stream()), mimetype='application/x-ndjson')
+    # Frees the blocking slot once the stream ends or the client goes away
+    response.call_on_close(blocking.close)
+    return response
+
+
+@app.route('/webhook', methods=['GET'])
+def get_webhook():
+    """Default callback URL and delivery counts"""
+    return jsonify(webhooks.stats())
+
+
+@app.route('/webhook', methods=['PUT'])
+def set_webhook():
+    """Register the default callback URL for sends that don't pass their own ({"url": null} removes it)"""
+    data = request.get_json(silent=True)
+    if not data or 'url' not in data:
+        return jsonify({
+            'status': 'error',
+            'message': 'Provide "url" (or null to remove it)'
+        }), 400
+    if data['url'] is not None and not valid_callback_url(data['url']):
+        return jsonify({
+            'status': 'error',
+            'message': 'url must be an http(s) URL'
+        }), 400
+    webhooks.set_url(data['url'])
+    return jsonify(webhooks.stats())
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Recent send jobs and queue depth"""
+    status = request.args.get('status')
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({
+        'queue': send_queue.stats(),
+        'jobs': [job.to_dict() for job in send_queue.recent(status=status, limit=limit)],
+    })
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, timings and status history of a single send job"""
+    job = send_queue.get(job_id)
+    # Jobs from before a restart are only in the outbox
+    data = job.to_dict() if job else outbox.get(job_id)
+    if not data:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown job {job_id}'
+        }), 404
+    data['transitions'] = outbox.transitions(job_id)
+    return jsonify(data)
+
+
+@app.route('/traces', methods=['GET'])
+def list_traces():
+    """Recent traces, newest first (?name=send_dm|login|..., ?format=jsonl for JSON lines)"""
+    name = request.args.get('name')
+    limit = request.args.get('limit', 100, type=int)
+    traces = [trace.to_dict() for trace in tracer.recent(name=name, limit=limit)]
+    if request.args.get('format') == 'jsonl':
+        return Response(''.join(json.dumps(trace, default=str) + '\n' for trace in traces), mimetype='application/x-ndjson')
+    return jsonify({'traces': traces})
+
+
+@app.route('/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """Spans of one job (the trace id of a send is its job id), login or request"""
+    trace = tracer.get(trace_id)
+    if not trace:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown trace {trace_id}'
+        }), 404
+    return jsonify(trace.to_dict())
 
 
 if __name__ == '__main__':
-    # Changed to port 5001 to avoid conflicts with AirPlay Receiver on macOS
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Launch browsers before accepting requests so the first call is warm
+    browser_pool.start()
+    pruned = outbox.prune()
+    if pruned:
+        print(f"[OUTBOX] Pruned {pruned} finished send(s) past retention")
+    # Resumes sends a previous run accepted but didn't finish
+    send_queue.start()
+
+    # The reloader would restart the process and throw away the warm browsers
+    app.run(host='0.0.0.0', port=PORT, debug=True, use_reloader=False)
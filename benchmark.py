@@ -0,0 +1,285 @@
+"""
+Throughput/latency benchmark for Instagram Bot API
+Drives POST /send at a fixed concurrency and reports sends/sec, latency percentiles
+and a per-phase breakdown taken from the job traces
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile, None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(max(values), 3),
+    }
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=2)
+            return True
+        except requests.RequestException:
+            time.sleep(0.5)
+    return False
+
+
+def spawn_stack(args, workdir):
+    """Start mock_instagram.py and app.py pointed at it; returns (processes, api_url)"""
+    mock_url = f'http://127.0.0.1:{args.mock_port}'
+    api_url = f'http://127.0.0.1:{args.api_port}'
+    log = open(os.path.join(workdir, 'stack.log'), 'w', encoding='utf-8')
+
+    mock = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, 'mock_instagram.py'),
+        '--port', str(args.mock_port),
+        '--latency-ms', str(args.mock_latency_ms),
+        '--send-latency-ms', str(args.mock_send_latency_ms),
+        '--popup-rate', str(args.mock_popup_rate),
+    ], cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+
+    env = dict(
+        os.environ,
+        PORT=str(args.api_port),
+        INSTAGRAM_BASE_URL=mock_url,
+        BROWSER_PROFILE='production',
+        IG_ACCOUNTS='',
+        IG_USERNAME='bench',
+        IG_PASSWORD='bench',
+    )
+    if args.browser_concurrency:
+        env['BROWSER_CONCURRENCY'] = str(args.browser_concurrency)
+    if args.input_strategy:
+        env['MESSAGE_INPUT_STRATEGY'] = args.input_strategy
+    # Own working directory so session, caches and traces don't touch the real ones
+    api = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'app.py')],
+        cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+    processes = [mock, api]
+    if not wait_until_up(f'{mock_url}/mock/stats') or not wait_until_up(f'{api_url}/health', timeout=120):
+        stop_stack(processes)
+        raise RuntimeError(f'Mock stack did not come up, see {log.name}')
+
+    response = requests.post(f'{api_url}/login', json={}, timeout=120)
+    if response.status_code != 200:
+        stop_stack(processes)
+        raise RuntimeError(f'Login against the mock failed: {response.text}')
+    return processes, api_url
+
+
+def stop_stack(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def message_text(index, args):
+    """Benchmark message, padded to --message-length characters if given"""
+    text = f'{args.message} #{index}'
+    if args.message_length > len(text):
+        text += ' ' + 'x' * (args.message_length - len(text) - 1)
+    return text
+
+
+def send_one(api_url, index, args):
+    """Queue one send, wait for it to finish and collect its timings"""
+    username = f'{args.username_prefix}{index % args.recipients}'
+    started = time.time()
+    result = {'index': index, 'username': username, 'status': 'error'}
+    try:
+        response = requests.post(
+            f'{api_url}/send',
+            json={'username': username, 'message': message_text(index, args)},
+            timeout=30
+        )
+        if response.status_code != 202:
+            result['error'] = f'HTTP {response.status_code}: {response.text[:200]}'
+            return result
+        job_id = response.json()['job_id']
+
+        deadline = started + args.timeout
+        while time.time() < deadline:
+            job = requests.get(f'{api_url}/jobs/{job_id}', timeout=10).json()
+            if job['status'] in ('succeeded', 'failed'):
+                break
+            time.sleep(args.poll_interval)
+        else:
+            result['error'] = 'timed out waiting for job'
+            return result
+
+        result.update(
+            status=job['status'],
+            error=job.get('error'),
+            latency=time.time() - started,
+            queue_seconds=job.get('queue_seconds'),
+            run_seconds=job.get('run_seconds'),
+        )
+
+        trace = requests.get(f'{api_url}/traces/{job_id}', timeout=10)
+        if trace.status_code == 200:
+            phases = {}
+            for span in trace.json()['spans']:
+                if span['duration_ms'] is not None:
+                    phases[span['name']] = phases.get(span['name'], 0) + span['duration_ms'] / 1000
+            result['phases'] = phases
+    except requests.RequestException as e:
+        result['error'] = str(e)
+    return result
+
+
+def run(api_url, args):
+    results = []
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            result = send_one(api_url, index, args)
+            with lock:
+                results.append(result)
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(worker)
+    elapsed = time.time() - started
+    return results, elapsed
+
+
+def report(results, elapsed, args):
+    succeeded = [r for r in results if r['status'] == 'succeeded']
+    phase_names = []
+    for r in results:
+        for name in r.get('phases', {}):
+            if name not in phase_names:
+                phase_names.append(name)
+
+    errors = {}
+    for r in results:
+        if r['status'] != 'succeeded':
+            key = r.get('error') or r['status']
+            errors[key] = errors.get(key, 0) + 1
+
+    return {
+        'requests': len(results),
+        'concurrency': args.concurrency,
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'seconds': round(elapsed, 3),
+        'sends_per_second': round(len(succeeded) / elapsed, 3) if elapsed else None,
+        'latency': summarize([r.get('latency') for r in succeeded]),
+        'queue_seconds': summarize([r.get('queue_seconds') for r in succeeded]),
+        'run_seconds': summarize([r.get('run_seconds') for r in succeeded]),
+        'phases': {name: summarize([r['phases'].get(name) for r in succeeded if 'phases' in r]) for name in phase_names},
+        'errors': errors,
+    }
+
+
+def print_report(summary):
+    print("=" * 70)
+    print(f"Requests: {summary['requests']}  concurrency: {summary['concurrency']}  "
+          f"succeeded: {summary['succeeded']}  failed: {summary['failed']}")
+    print(f"Wall time: {summary['seconds']}s  throughput: {summary['sends_per_second']} sends/sec")
+    print("-" * 70)
+    print(f"{'seconds':<24}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    rows = [('end-to-end', summary['latency']), ('queue', summary['queue_seconds']), ('run', summary['run_seconds'])]
+    rows += [(f'  {name}', stats) for name, stats in summary['phases'].items()]
+    for name, stats in rows:
+        if not stats.get('count'):
+            continue
+        print(f"{name:<24}" + ''.join(f"{stats[key]:>9.3f}" for key in ('mean', 'p50', 'p95', 'p99', 'max')))
+    if summary['errors']:
+        print("-" * 70)
+        for error, count in summary['errors'].items():
+            print(f"[ERROR] {count}x {error}")
+    print("=" * 70)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark POST /send throughput and latency')
+    parser.add_argument('--url', default='http://localhost:5001', help='API to benchmark (ignored with --spawn)')
+    parser.add_argument('--spawn', action='store_true', help='Start mock_instagram.py and app.py locally and log in first')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4, help='Sends in flight at the same time')
+    parser.add_argument('--recipients', type=int, default=10, help='Distinct usernames to cycle through')
+    parser.add_argument('--username-prefix', default='bench_user_')
+    parser.add_argument('--message', default='Benchmark message')
+    parser.add_argument('--message-length', type=int, default=0, help='Pad messages to this many characters')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds to wait for one job')
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--json', help='Also write the report to this file')
+    parser.add_argument('--max-error-rate', type=float, default=0.05, help='Exit with status 1 above this failure share')
+    parser.add_argument('--api-port', type=int, default=5061)
+    parser.add_argument('--mock-port', type=int, default=5055)
+    parser.add_argument('--mock-latency-ms', type=float, default=100)
+    parser.add_argument('--mock-send-latency-ms', type=float, default=200)
+    parser.add_argument('--mock-popup-rate', type=float, default=0.3)
+    parser.add_argument('--browser-concurrency', type=int, help='BROWSER_CONCURRENCY for the spawned app.py')
+    parser.add_argument('--input-strategy', choices=['insert', 'fill', 'chunked', 'keystroke'],
+                        help='MESSAGE_INPUT_STRATEGY for the spawned app.py')
+    args = parser.parse_args()
+
+    processes = []
+    api_url = args.url.rstrip('/')
+    workdir = tempfile.mkdtemp(prefix='instabot-bench-')
+    try:
+        if args.spawn:
+            print(f"[BENCH] Starting mock Instagram and app.py in {workdir}...")
+            processes, api_url = spawn_stack(args, workdir)
+
+        print(f"[BENCH] {args.requests} sends at concurrency {args.concurrency} against {api_url}")
+        results, elapsed = run(api_url, args)
+        summary = report(results, elapsed, args)
+        print_report(summary)
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            print(f"[BENCH] Report written to {args.json}")
+    finally:
+        stop_stack(processes)
+
+    error_rate = summary['failed'] / summary['requests'] if summary['requests'] else 1
+    sys.exit(1 if error_rate > args.max_error_rate else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,23 @@
 import os
 import sys
 import time
-from playwright.sync_api import sync_playwright
+import uuid
+import asyncio
+from contextlib import contextmanager
+from playwright.async_api import async_playwright
 from dotenv import load_dotenv
+import readiness
+from selector_resolver import resolver as default_resolver, SELECTOR_TIMEOUT_MS
+from thread_cache import thread_cache as default_thread_cache
+from accounts import default_account, INSTAGRAM_BASE_URL
+from browser_profile import NetworkMonitor, launch_options
+from debug_capture import DebugCapture
+from popups import PopupMonitor
+from failures import exception_reason, page_text_reason, remaining_ms
+from text_input import enter_text, MESSAGE_INPUT_STRATEGY, LOGIN_INPUT_STRATEGY
+from tab_cache import TAB_INPUT_TIMEOUT_MS
+import metrics
+from tracing import tracer
 
 # Ensure UTF-8 encoding for stdout/stderr to handle emojis
 if sys.stdout.encoding != 'utf-8':
@@ -14,96 +29,213 @@ load_dotenv()
 
 
 class InstagramBot:
-    def __init__(self):
-        self.username = os.getenv('IG_USERNAME')
-        self.password = os.getenv('IG_PASSWORD')
-        self.state_file = 'instagram_state.json'
+    def __init__(self, session=None, account=None, resolver=None, thread_cache=None, job_id=None, trace=None,
+                 input_strategy=None, deadline=None):
+        # Warm BrowserSession from browser_pool; when set the browser is reused
+        self.session = session
+        self.account = session.account if session else (account or default_account())
+        self.username = self.account.username
+        self.password = self.account.password
+        self.state_file = self.account.state_file
+        self.resolver = resolver or default_resolver
+        self.thread_cache = thread_cache or default_thread_cache
+        # Names the debug artifact directory if an operation fails
+        self.job_id = job_id or uuid.uuid4().hex
+        self.capture = None
+        # Spans of each operation go to this trace; without one the bot traces on its own
+        self.trace = trace
+        self._own_trace = False
+        self.operation = None
+        self._started = None
         self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
+        self.network = None
+        self.popups = None
+        # Requests/bytes/blocked counts for the last operation
+        self.network_stats = None
+        # Why the last operation failed (e.g. 'not_logged_in'), None if it succeeded
+        self.failure_reason = None
+        # How the DM text is entered (see text_input.py); login fields use LOGIN_INPUT_STRATEGY
+        self.input_strategy = input_strategy or MESSAGE_INPUT_STRATEGY
+        # Unix time by which the operation must finish; every wait is capped by what is left
+        self.deadline = deadline
+        # Set when the page is an open thread tab kept from an earlier send (see tab_cache.py)
+        self.reused_tab = False
+        # Username whose thread tab should stay open after a successful send
+        self._keep_tab_for = None
 
-    def _start_browser(self):
-        """Start browser and load saved state if available"""
-        self.playwright = sync_playwright().start()
-        self.browser = self.playwright.chromium.launch(headless=False)
-        
-        # Try to load saved state (cookies)
-        if os.path.exists(self.state_file):
-            self.context = self.browser.new_context(storage_state=self.state_file)
-        else:
-            self.context = self.browser.new_context()
-        
-        self.page = self.context.new_page()
+    async def _start_browser(self, thread_for=None):
+        """Start browser and load saved state if available (thread_for: reuse that user's open tab)"""
+        if self.session:
+            # Reuse the pool's already running browser and take a warm page
+            self.context = self.session.context
+            if thread_for:
+                self.page = await self.session.acquire_thread_page(thread_for)
+                self.reused_tab = self.page is not None
+            if not self.page:
+                self.page = await self.session.acquire_page()
+            self.popups = self.session.popups
+            self._watch_popups()
+            return
+
+        with metrics.BROWSER_SECONDS.time(action='start'):
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(**launch_options())
+            
+            # Try to load saved state (cookies)
+            if os.path.exists(self.state_file):
+                self.context = await self.browser.new_context(storage_state=self.state_file)
+            else:
+                self.context = await self.browser.new_context()
+            
+            self.network = NetworkMonitor()
+            await self.network.attach(self.context)
+            self.popups = PopupMonitor()
+            await self.popups.attach(self.context)
+            self.page = await self.context.new_page()
+            self.network.start_page(self.page)
+            self._watch_popups()
+
+    def _watch_popups(self):
+        """Record popups the background observer dismisses on our page as trace events"""
+        self.popups.watch(self.page, lambda name: self.trace.event('popup_dismissed', popup=name))
 
-    def _close_browser(self):
+    async def _close_browser(self):
         """Close browser and cleanup"""
-        if self.page:
-            self.page.close()
-        if self.context:
-            self.context.close()
-        if self.browser:
-            self.browser.close()
-        if self.playwright:
-            self.playwright.stop()
+        if self.popups and self.page:
+            self.popups.unwatch(self.page)
+        if self.session:
+            # The pool owns the browser; hand the page back for the next job
+            if self.page:
+                self.network_stats = await self.session.release_page(self.page, self._keep_tab_for)
+                self._print_network_stats()
+            self.context = None
+            self.page = None
+            return
 
-    def _dismiss_popups(self):
-        """Dismiss common Instagram popups that might block interactions"""
-        popup_selectors = [
-            ('button:has-text("Not Now")', "Not Now"),
-            ('button:has-text("Turn On")', "Skip Turn On (clicking nearby)"),
-            ('svg[aria-label="Close"]', "Close button"),
-            ('button[aria-label="Close"]', "Close button"),
-            ('div[role="dialog"] button:has-text("Cancel")', "Cancel"),
-        ]
-        
-        for selector, description in popup_selectors:
-            try:
-                # Special handling for "Turn On" - we want to click "Not Now" instead
-                if "Turn On" in description:
-                    not_now = self.page.wait_for_selector('button:has-text("Not Now")', timeout=2000)
-                    if not_now:
-                        print(f"  [OK] Dismissing popup: {description} -> Clicking Not Now")
-                        not_now.click()
-                        time.sleep(1)
-                else:
-                    element = self.page.wait_for_selector(selector, timeout=2000)
-                    if element:
-                        print(f"  [OK] Dismissing popup: {description}")
-                        element.click()
-                        time.sleep(1)
-            except:
-                # Popup not found, continue
-                pass
+        with metrics.BROWSER_SECONDS.time(action='stop'):
+            if self.page:
+                self.network_stats = self.network.finish_page(self.page)
+                self._print_network_stats()
+                await self.page.close()
+            if self.context:
+                await self.context.close()
+            if self.browser:
+                await self.browser.close()
+            if self.playwright:
+                await self.playwright.stop()
+
+    def _print_network_stats(self):
+        if self.network_stats:
+            print(f"[NET] {self.network_stats['requests']} requests, "
+                  f"{self.network_stats['bytes'] / 1024:.1f} KB transferred, "
+                  f"{self.network_stats['blocked']} blocked")
+
+    def _set_logged_in(self, value):
+        """Tell the pool whether this account's session works, so sends avoid dead accounts"""
+        if self.session:
+            self.session.logged_in = value
+
+    def _timeout(self, timeout=None):
+        """timeout (milliseconds) capped by the remaining deadline; raises DeadlineExceeded once it passed"""
+        return remaining_ms(self.deadline, timeout)
+
+    def _deadline_passed(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    async def _fail(self, reason):
+        """Remember why the operation failed and write debug artifacts"""
+        if self._deadline_passed():
+            # The element wasn't missing, we just ran out of time looking for it
+            reason = 'deadline_exceeded'
+        self.failure_reason = reason
+        await self.capture.failure(self.page, reason)
+
+    async def _page_failure(self):
+        """Failure Instagram shows as page text (user not found, rate limited, ...), or None"""
+        try:
+            text = await self.page.evaluate('() => document.body ? document.body.innerText : ""')
+        except Exception:
+            return None
+        return page_text_reason(text)
 
-    def login(self):
+    def _begin(self, operation):
+        """Start timing and tracing an operation, returns its root span"""
+        self.operation = operation
+        self.failure_reason = None
+        self._own_trace = self.trace is None
+        if self._own_trace:
+            self.trace = tracer.start(operation, trace_id=self.job_id, account=self.account.name)
+        self._started = time.perf_counter()
+        span = self.trace.begin(operation, account=self.account.name)
+        self.trace.start_profiling()
+        return span
+
+    def _finish(self, span):
+        """Record the operation's outcome in metrics and close its trace span"""
+        self.trace.stop_profiling()
+        success = self.failure_reason is None
+        metrics.record_operation(self.operation, time.perf_counter() - self._started, success, self.failure_reason)
+        span.attributes['success'] = success
+        self.trace.end(span, error=self.failure_reason)
+        if self._own_trace:
+            self.trace.finish()
+            self.trace = None
+
+    @contextmanager
+    def _phase(self, name, enforce_deadline=True, **attributes):
+        """Time one step of the current operation in metrics and the trace"""
+        if enforce_deadline:
+            # Don't start another step once the deadline has passed
+            self._timeout()
+        with metrics.phase(self.operation, name), self.trace.span(name, **attributes) as span:
+            yield span
+
+    async def _find_element(self, name, selectors, description, timeout=SELECTOR_TIMEOUT_MS):
+        """Race fallback selectors for an element, preferring the one that won last time"""
+        element, selector = await self.resolver.resolve(self.page, name, selectors, timeout=self._timeout(timeout))
+        if element:
+            print(f"[OK] Found {description} with selector: {selector}")
+        else:
+            print(f"[FAIL] {description} not found with any of {len(selectors)} selectors")
+        return element
+
+    async def login(self):
         """Login to Instagram and save session state"""
+        root = self._begin('login')
         try:
-            self._start_browser()
+            self.capture = DebugCapture(self.job_id, 'login')
+            with self._phase('start_browser'):
+                await self._start_browser()
             
             # Navigate to Instagram
             print("=" * 50)
             print("Navigating to Instagram...")
-            self.page.goto('https://www.instagram.com/')
-            time.sleep(5)
+            with self._phase('navigate'):
+                await self.page.goto(f'{INSTAGRAM_BASE_URL}/', wait_until='domcontentloaded', timeout=self._timeout())
+                # Either the feed (logged in) or the login form shows up, whichever is first
+                await readiness.wait_for_first(
+                    self.page, [readiness.HOME_ICON_SELECTOR, 'input[name="username"]'], self._timeout()
+                )
             
             print(f"Current URL: {self.page.url}")
-            print(f"Page title: {self.page.title()}")
+            print(f"Page title: {await self.page.title()}")
             
-            # Take screenshot for debugging
-            self.page.screenshot(path='debug_1_initial.png')
-            print("Screenshot saved: debug_1_initial.png")
+            await self.capture.step(self.page, 'initial')
             
             # Check if already logged in by looking for specific elements
-            try:
-                # If we can find the home feed or profile icon, we're logged in
-                home_icon = self.page.wait_for_selector('svg[aria-label="Home"]', timeout=3000)
+            # If we can find the home feed or profile icon, we're logged in
+            if await self.page.locator(readiness.HOME_ICON_SELECTOR).first.is_visible():
                 print("Found Home icon - Already logged in!")
-                self._save_state()
+                self._set_logged_in(True)
+                with self._phase('save_state'):
+                    await self._save_state()
                 return True
-            except:
-                # Not logged in, proceed with login
-                print("Home icon not found - proceeding with login...")
+
+            # Not logged in, proceed with login
+            print("Home icon not found - proceeding with login...")
             
             # Look for all input fields on the page
             print("\nSearching for login form...")
@@ -113,27 +245,15 @@ class InstagramBot:
                 'input[name="username"]',
                 'input[aria-label="Phone number, username, or email"]',
                 'input[type="text"]',
-                '//input[@name="username"]',
+                'xpath=//input[@name="username"]',
             ]
             
-            username_field = None
-            for selector in username_selectors:
-                try:
-                    if selector.startswith('//'):
-                        username_field = self.page.wait_for_selector(f'xpath={selector}', timeout=2000)
-                    else:
-                        username_field = self.page.wait_for_selector(selector, timeout=2000)
-                    
-                    if username_field:
-                        print(f"[OK] Found username field with selector: {selector}")
-                        break
-                except:
-                    print(f"[FAIL] Username field not found with: {selector}")
-                    continue
+            with self._phase('find_username'):
+                username_field = await self._find_element('username', username_selectors, 'username field')
             
             if not username_field:
                 print("ERROR: Could not find username field!")
-                self.page.screenshot(path='debug_2_no_username_field.png')
+                await self._fail('no_username_field')
                 return False
             
             # Try multiple possible selectors for password field
@@ -141,112 +261,74 @@ class InstagramBot:
                 'input[name="password"]',
                 'input[aria-label="Password"]',
                 'input[type="password"]',
-                '//input[@name="password"]',
+                'xpath=//input[@name="password"]',
             ]
             
-            password_field = None
-            for selector in password_selectors:
-                try:
-                    if selector.startswith('//'):
-                        password_field = self.page.wait_for_selector(f'xpath={selector}', timeout=2000)
-                    else:
-                        password_field = self.page.wait_for_selector(selector, timeout=2000)
-                    
-                    if password_field:
-                        print(f"[OK] Found password field with selector: {selector}")
-                        break
-                except:
-                    print(f"[FAIL] Password field not found with: {selector}")
-                    continue
+            with self._phase('find_password'):
+                password_field = await self._find_element('password', password_selectors, 'password field')
             
             if not password_field:
                 print("ERROR: Could not find password field!")
-                self.page.screenshot(path='debug_3_no_password_field.png')
+                await self._fail('no_password_field')
                 return False
             
             # Fill the form
-            print(f"\nFilling username: {self.username}")
-            username_field.click()
-            time.sleep(0.5)
-            username_field.type(self.username, delay=100)  # Type with delay to mimic human
-            time.sleep(1)
-            
-            print("Filling password: ***")
-            password_field.click()
-            time.sleep(0.5)
-            password_field.type(self.password, delay=100)
-            time.sleep(1)
-            
-            # Take screenshot before clicking login
-            self.page.screenshot(path='debug_4_filled_form.png')
-            print("Screenshot saved: debug_4_filled_form.png")
+            with self._phase('type_credentials') as span:
+                print(f"\nFilling username: {self.username}")
+                span.attributes['strategy'] = await enter_text(
+                    self.page, username_field, self.username, 'username', LOGIN_INPUT_STRATEGY, self.deadline
+                )
+                
+                print("Filling password: ***")
+                await enter_text(self.page, password_field, self.password, 'password', LOGIN_INPUT_STRATEGY, self.deadline)
+            
+            await self.capture.step(self.page, 'filled_form')
             
             # Find and click login button
             login_button_selectors = [
                 'button[type="submit"]',
                 'button:has-text("Log in")',
                 'button:has-text("Log In")',
-                '//button[@type="submit"]',
+                'xpath=//button[@type="submit"]',
             ]
             
-            login_button = None
-            for selector in login_button_selectors:
-                try:
-                    if selector.startswith('//'):
-                        login_button = self.page.wait_for_selector(f'xpath={selector}', timeout=2000)
-                    else:
-                        login_button = self.page.wait_for_selector(selector, timeout=2000)
-                    
-                    if login_button:
-                        print(f"[OK] Found login button with selector: {selector}")
-                        break
-                except:
-                    continue
-            
-            if login_button:
-                print("Clicking login button...")
-                login_button.click()
-            else:
-                print("WARNING: Could not find login button, trying to press Enter")
-                password_field.press('Enter')
+            with self._phase('submit'):
+                login_button = await self._find_element('login_button', login_button_selectors, 'login button', timeout=2000)
+                
+                if login_button:
+                    print("Clicking login button...")
+                    await login_button.click(timeout=self._timeout())
+                else:
+                    print("WARNING: Could not find login button, trying to press Enter")
+                    await password_field.press('Enter', timeout=self._timeout())
             
-            # Wait for navigation
+            # Wait for navigation and check if login was successful
             print("Waiting for login to complete...")
-            time.sleep(10)
-            
-            print(f"Post-login URL: {self.page.url}")
-            self.page.screenshot(path='debug_5_after_login.png')
-            print("Screenshot saved: debug_5_after_login.png")
-            
-            # Check if login was successful
-            try:
-                self.page.wait_for_selector('svg[aria-label="Home"]', timeout=10000)
+            with self._phase('wait_home'):
+                home_found = await readiness.wait_for_home(self.page, self._timeout())
+            if home_found:
                 print("[SUCCESS] Login successful - Home icon found!")
-            except:
-                print("[WARNING] Warning: Could not verify login success. Check screenshots.")
+                await self.capture.step(self.page, 'after_login')
+            else:
+                reason = await self._page_failure()
+                if reason:
+                    print(f"[ERROR] Login failed: {reason}")
+                    if reason == 'bad_credentials':
+                        self._set_logged_in(False)
+                    await self._fail(reason)
+                    return False
+                print("[WARNING] Warning: Could not verify login success. Check debug artifacts.")
+                await self.capture.failure(self.page, 'login_unverified')
             
-            # Handle dialogs
-            try:
-                save_info_button = self.page.wait_for_selector('button:has-text("Not Now")', timeout=5000)
-                if save_info_button:
-                    print("Clicking 'Not Now' on save login info...")
-                    save_info_button.click()
-                    time.sleep(2)
-            except:
-                pass
+            print(f"Post-login URL: {self.page.url}")
             
-            try:
-                notif_button = self.page.wait_for_selector('button:has-text("Not Now")', timeout=5000)
-                if notif_button:
-                    print("Clicking 'Not Now' on notifications...")
-                    notif_button.click()
-                    time.sleep(2)
-            except:
-                pass
+            # "Save login info" / notification dialogs are dismissed by the popup observer
             
             # Save state
-            self._save_state()
-            print("[SUCCESS] State saved to instagram_state.json!")
+            self._set_logged_in(True)
+            with self._phase('save_state'):
+                await self._save_state()
+            print(f"[SUCCESS] State saved to {self.state_file}!")
             print("=" * 50)
             return True
             
@@ -254,57 +336,80 @@ class InstagramBot:
             print(f"[ERROR] Login error: {e}")
             import traceback
             traceback.print_exc()
+            self.failure_reason = 'deadline_exceeded' if self._deadline_passed() else exception_reason(e)
             try:
-                self.page.screenshot(path='debug_error.png')
-                print("Error screenshot saved: debug_error.png")
+                await self.capture.failure(self.page, f'error: {e}')
             except:
                 pass
             return False
         finally:
-            self._close_browser()
+            with self._phase('close_browser', enforce_deadline=False):
+                await self._close_browser()
+            self._finish(root)
 
 
-    def _save_state(self):
+    async def _save_state(self):
         """Save browser state (cookies) to file"""
-        if self.context:
-            self.context.storage_state(path=self.state_file)
+        if self.session:
+            await self.session.save_state()
+        elif self.context:
+            await self.context.storage_state(path=self.state_file)
+
+    async def _open_thread(self, url):
+        """Navigate to a DM URL, returns 'thread', 'login' or None"""
+        try:
+            await self.page.goto(url, wait_until='commit', timeout=self._timeout())
+        except Exception as e:
+            print(f"[FAIL] Navigation to {url} failed: {e}")
+            return None
+        landed_on = await readiness.wait_for_thread(self.page, self._timeout())
+        await readiness.wait_for_load(self.page, timeout=self._timeout())
+        return landed_on
+
+    async def _thread_cache(self, method, *args):
+        """Run a thread cache call for this account off the browser loop; it reads and commits SQLite"""
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args, self.account.name)
 
-    def send_dm(self, username, message):
+    async def _navigate_to_thread(self, username):
+        """Open username's DM thread, returns (landed_on, from_cache)"""
+        # Navigate straight to a known thread, or via instagram.com/m/username
+        redirect_url = f'{INSTAGRAM_BASE_URL}/m/{username}'
+        dm_url = await self._thread_cache(self.thread_cache.get, username)
+        from_cache = dm_url is not None
+        if not from_cache:
+            dm_url = redirect_url
+        
+        with self._phase('navigate', from_cache=from_cache) as span:
+            print(f"Navigating to: {dm_url}" + (" (cached thread)" if from_cache else ""))
+            landed_on = await self._open_thread(dm_url)
+            
+            if from_cache and landed_on != 'thread':
+                print("[CACHE] Cached thread URL failed, falling back to redirect")
+                await self._thread_cache(self.thread_cache.invalidate, username)
+                from_cache = False
+                landed_on = await self._open_thread(redirect_url)
+                span.attributes['cache_fallback'] = True
+            span.attributes['landed_on'] = landed_on
+        
+        if landed_on == 'thread' and not from_cache:
+            await self._thread_cache(self.thread_cache.put, username, self.page.url)
+        
+        print(f"Current URL: {self.page.url}")
+        await self.capture.step(self.page, 'navigated', landed_on=landed_on, from_cache=from_cache)
+        return landed_on, from_cache
+
+    async def send_dm(self, username, message):
         """Send a direct message to a user"""
+        root = self._begin('send_dm')
         try:
-            self._start_browser()
+            self.capture = DebugCapture(self.job_id, 'send_dm')
+            with self._phase('start_browser'):
+                await self._start_browser(thread_for=username)
             
             print("=" * 50)
-            print(f"Sending DM to: {username}")
+            print(f"Sending DM to: {username} (account: {self.account.name})")
             print(f"Message: {message}")
             
-            # Navigate directly to user's DM using instagram.com/m/username
-            dm_url = f'https://www.instagram.com/m/{username}'
-            print(f"Navigating to: {dm_url}")
-            self.page.goto(dm_url)
-            time.sleep(5)
-            
-            print(f"Current URL: {self.page.url}")
-            self.page.screenshot(path='debug_dm_1_initial.png')
-            print("Screenshot saved: debug_dm_1_initial.png")
-            
-            # Check if we need to login
-            if 'login' in self.page.url:
-                print("[ERROR] Not logged in. Please run login() first.")
-                return False
-            
-            # The URL should redirect to something like:
-            # https://www.instagram.com/direct/t/121747019218188
-            print(f"Redirected to: {self.page.url}")
-            
-            # Wait for the page to load
-            time.sleep(3)
-            
-            # Dismiss any popups that might be blocking the message input
-            print("\nChecking for popups...")
-            self._dismiss_popups()
-            time.sleep(1)
-            
             # Try to find the message input field with multiple selectors
             message_input_selectors = [
                 'div[contenteditable="true"][role="textbox"]',
@@ -315,34 +420,59 @@ class InstagramBot:
             ]
             
             message_input = None
-            for selector in message_input_selectors:
-                try:
-                    message_input = self.page.wait_for_selector(selector, timeout=5000)
-                    if message_input:
-                        print(f"[OK] Found message input with selector: {selector}")
-                        break
-                except:
-                    print(f"[FAIL] Message input not found with: {selector}")
-                    continue
+            if self.reused_tab:
+                # Still on the thread from the last send to this user; skip navigation
+                print(f"[TABS] Reusing open thread tab: {self.page.url}")
+                landed_on, from_cache = 'thread', False
+                with self._phase('find_input', reused_tab=True):
+                    message_input = await self._find_element(
+                        'message_input', message_input_selectors, 'message input', timeout=TAB_INPUT_TIMEOUT_MS
+                    )
+                if not message_input:
+                    print("[TABS] Open tab has no usable composer, navigating again")
+                    self.reused_tab = False
             
             if not message_input:
-                print("[ERROR] Could not find message input field!")
-                self.page.screenshot(path='debug_dm_2_no_input.png')
-                print("Screenshot saved: debug_dm_2_no_input.png")
-                return False
+                landed_on, from_cache = await self._navigate_to_thread(username)
+                
+                # Check if we need to login
+                if landed_on == 'login' or readiness.LOGIN_URL_PATTERN.search(self.page.url):
+                    print("[ERROR] Not logged in. Please run login() first.")
+                    self._set_logged_in(False)
+                    await self._fail('not_logged_in')
+                    return False
+                
+                # The URL should redirect to something like:
+                # https://www.instagram.com/direct/t/121747019218188
+                print(f"Redirected to: {self.page.url}")
+                
+                # Popups blocking the message input are dismissed in the background
+                # by the observer installed on the context (see popups.py)
+                with self._phase('find_input'):
+                    message_input = await self._find_element('message_input', message_input_selectors, 'message input')
             
-            # Click on the input field to focus it
-            print(f"Typing message...")
-            message_input.click()
-            time.sleep(0.5)
+            if not message_input:
+                # Tell "no such user" and rate limiting apart from a page that didn't load
+                reason = await self._page_failure() or ('navigation_failed' if landed_on is None else 'no_message_input')
+                print(f"[ERROR] Could not find message input field! ({reason})")
+                if from_cache:
+                    # The cached thread may be stale; resolve it again next time
+                    await self._thread_cache(self.thread_cache.invalidate, username)
+                await self._fail(reason)
+                return False
             
-            # Type the message
-            message_input.type(message, delay=50)
-            time.sleep(1)
+            with self._phase('type', chars=len(message)) as span:
+                # Make sure the composer accepts input before typing into it
+                if not await readiness.wait_for_editable(message_input, self._timeout()):
+                    print("[WARNING] Message input did not become editable in time")
+                
+                # Focuses the composer and enters the message in one go, in chunks or key by key
+                print(f"Typing message ({self.input_strategy})...")
+                span.attributes['strategy'] = await enter_text(
+                    self.page, message_input, message, 'message', self.input_strategy, self.deadline
+                )
             
-            # Take screenshot before sending
-            self.page.screenshot(path='debug_dm_3_before_send.png')
-            print("Screenshot saved: debug_dm_3_before_send.png")
+            await self.capture.step(self.page, 'typed')
             
             # Try to find and click the send button, or press Enter
             send_button_selectors = [
@@ -351,30 +481,30 @@ class InstagramBot:
                 'div[role="button"]:has-text("Send")',
             ]
             
-            send_button = None
-            for selector in send_button_selectors:
-                try:
-                    send_button = self.page.wait_for_selector(selector, timeout=2000)
-                    if send_button:
-                        print(f"[OK] Found send button with selector: {selector}")
-                        break
-                except:
-                    continue
-            
-            if send_button:
-                print("Clicking send button...")
-                send_button.click()
-            else:
-                print("Send button not found, pressing Enter...")
-                message_input.press('Enter')
+            with self._phase('send'):
+                send_button = await self._find_element('send_button', send_button_selectors, 'send button', timeout=2000)
+                
+                if send_button:
+                    print("Clicking send button...")
+                    await send_button.click(timeout=self._timeout())
+                else:
+                    print("Send button not found, pressing Enter...")
+                    await message_input.press('Enter', timeout=self._timeout())
+                
+                # Instagram clears the composer once the message has gone out
+                cleared = await readiness.wait_for_cleared(self.page, message_input, self._timeout())
             
-            time.sleep(2)
+            self._set_logged_in(True)
+            if not cleared:
+                print("[ERROR] Composer was not cleared, delivery could not be confirmed")
+                await self._fail('send_unconfirmed')
+                return False
             
-            # Take screenshot after sending
-            self.page.screenshot(path='debug_dm_4_after_send.png')
-            print("Screenshot saved: debug_dm_4_after_send.png")
+            await self.capture.step(self.page, 'sent', send_button=bool(send_button))
             
             print(f"[SUCCESS] Message sent to {username}!")
+            # Leave the thread open for the next send to this user
+            self._keep_tab_for = username
             print("=" * 50)
             return True
                 
@@ -382,14 +512,16 @@ class InstagramBot:
             print(f"[ERROR] Error sending DM: {e}")
             import traceback
             traceback.print_exc()
+            self.failure_reason = 'deadline_exceeded' if self._deadline_passed() else exception_reason(e)
             try:
-                self.page.screenshot(path='debug_dm_error.png')
-                print("Error screenshot saved: debug_dm_error.png")
+                await self.capture.failure(self.page, f'error: {e}')
             except:
                 pass
             return False
         finally:
-            self._close_browser()
+            with self._phase('close_browser', enforce_deadline=False):
+                await self._close_browser()
+            self._finish(root)
 
 
 if __name__ == "__main__":
@@ -397,8 +529,8 @@ if __name__ == "__main__":
     bot = InstagramBot()
     
     # First login and save cookies
-    bot.login()
+    asyncio.run(bot.login())
     
     # Then try to send a message
-    # bot.send_dm('target_username', 'Hello from bot!')
+    # asyncio.run(bot.send_dm('target_username', 'Hello from bot!'))
 
@@ -0,0 +1,364 @@
+"""
+Warm browser pool for Instagram Bot API
+Runs one long-lived async Playwright browser with a context per account and drives
+several DM pages concurrently
+"""
+
+import os
+import time
+import asyncio
+import threading
+from playwright.async_api import async_playwright
+from dotenv import load_dotenv
+from accounts import load_accounts
+from browser_profile import NetworkMonitor, launch_options
+from popups import PopupMonitor
+from tab_cache import TabCache
+from metrics import BROWSER_SECONDS, POOL_WAIT_SECONDS
+
+load_dotenv()
+
+# How many pages may run bot operations at the same time (across all accounts)
+BROWSER_CONCURRENCY = int(os.getenv('BROWSER_CONCURRENCY', '3'))
+
+
+class BrowserSession:
+    """One account's context on the shared browser; its pages are leased to concurrent jobs"""
+
+    def __init__(self, account):
+        self.account = account
+        self.state_file = account.state_file
+        self.browser = None
+        self.context = None
+        self.state_mtime = None
+        self.idle_pages = []
+        self.active_pages = 0
+        # Thread pages left open after a send, reused for follow-ups to the same user
+        self.tabs = TabCache()
+        # Request blocking and byte counts; totals survive context reloads
+        self.network = NetworkMonitor()
+        # Background popup dismissal with per-popup counts
+        self.popups = PopupMonitor()
+        # Jobs assigned to this account that are waiting or running
+        self.pending = 0
+        self.jobs_run = 0
+        # None until a login or send tells us whether the saved session works
+        self.logged_in = None
+        # Set while an exclusive job (login) holds or waits for the account
+        self.exclusive = False
+        self.slots = None
+        self.gate = None
+
+    def _state_mtime(self):
+        try:
+            return os.path.getmtime(self.state_file)
+        except OSError:
+            return None
+
+    async def open(self, browser):
+        """Open this account's context on a (new) browser"""
+        self.browser = browser
+        self.context = None
+        await self._open_context()
+
+    async def _open_context(self):
+        """(Re)create the context so it picks up the latest saved cookies"""
+        if self.context:
+            try:
+                await self.context.close()
+            except Exception:
+                pass
+        self.idle_pages = []
+        # Closing the context closed them
+        self.tabs.clear()
+
+        self.state_mtime = self._state_mtime()
+        if self.state_mtime is not None:
+            self.context = await self.browser.new_context(storage_state=self.state_file)
+        else:
+            self.context = await self.browser.new_context()
+        await self.network.attach(self.context)
+        await self.popups.attach(self.context)
+
+        # Pre-warm one page so the first job skips page creation
+        self.idle_pages.append(await self.context.new_page())
+
+    async def _page_ok(self, page):
+        if page.is_closed():
+            return False
+        try:
+            await page.evaluate('1')
+        except Exception:
+            return False
+        return True
+
+    async def acquire_page(self):
+        """Lease a healthy page for one job"""
+        if self.active_pages == 0 and self._state_mtime() != self.state_mtime:
+            # Only rebuild the context while no other job of this account uses it
+            print(f"[POOL] Session state for {self.account.name} changed on disk, reloading context...")
+            with BROWSER_SECONDS.time(action='reload_context'):
+                await self._open_context()
+
+        page = None
+        while self.idle_pages:
+            candidate = self.idle_pages.pop()
+            if await self._page_ok(candidate):
+                page = candidate
+                break
+        if page is None:
+            page = await self.context.new_page()
+
+        self.active_pages += 1
+        self.network.start_page(page)
+        return page
+
+    async def acquire_thread_page(self, username):
+        """Lease the tab left open on username's thread, or None if there is none"""
+        if not self.tabs.enabled or self._state_mtime() != self.state_mtime:
+            # A changed session needs a fresh context; acquire_page() reloads it
+            return None
+        for expired in self.tabs.expire():
+            await self._close_page(expired)
+        page = self.tabs.take(username)
+        if page is None:
+            return None
+        if page.context is not self.context or not await self._page_ok(page):
+            self.tabs.discard(page)
+            await self._close_page(page)
+            return None
+        self.active_pages += 1
+        self.network.start_page(page)
+        return page
+
+    async def release_page(self, page, username=None):
+        """Return a page to the idle list, or keep it open as username's thread tab.
+
+        Returns the job's network counters.
+        """
+        self.active_pages -= 1
+        stats = self.network.finish_page(page)
+        if page.is_closed() or page.context is not self.context:
+            return stats
+        if username and self.tabs.enabled:
+            for evicted in await self.tabs.put(username, page):
+                await self._close_page(evicted)
+        else:
+            self.idle_pages.append(page)
+        return stats
+
+    async def _close_page(self, page):
+        try:
+            await page.close()
+        except Exception:
+            pass
+
+    async def save_state(self):
+        """Save browser state (cookies) and remember the file version we wrote"""
+        await self.context.storage_state(path=self.state_file)
+        self.state_mtime = self._state_mtime()
+
+    def stats(self):
+        return {
+            'username': self.account.username,
+            'logged_in': self.logged_in,
+            'pending': self.pending,
+            'active_pages': self.active_pages,
+            'idle_pages': len(self.idle_pages),
+            'tab_cache': self.tabs.stats(),
+            'jobs_run': self.jobs_run,
+            'network': self.network.stats(),
+            'popups_dismissed': self.popups.stats(),
+        }
+
+
+class BrowserPool:
+    """One warm browser driven by an asyncio loop on a background thread.
+
+    Every account has its own context and storage-state file. Up to
+    `concurrency` jobs run at once, each on its own page, so waits on one page
+    overlap with typing on another. Callers on any thread hand over a function
+    that takes the account's session and returns a coroutine. Exclusive jobs
+    (login) only wait for jobs of the same account.
+    """
+
+    def __init__(self, accounts=None, concurrency=BROWSER_CONCURRENCY):
+        self.accounts = accounts or load_accounts()
+        self.concurrency = max(1, concurrency)
+        self.sessions = {name: BrowserSession(account) for name, account in self.accounts.items()}
+        self.playwright = None
+        self.browser = None
+        self.loop = None
+        self.jobs_run = 0
+        self.running = 0
+        self.restarts = 0
+        self._thread = None
+        self._pages = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the event loop thread and pre-warm the browser"""
+        with self._lock:
+            if self._thread:
+                return
+
+            print(f"[POOL] Pre-warming browser ({len(self.sessions)} account(s), {self.concurrency} concurrent pages)...")
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self.loop.run_forever, name='browser-pool', daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._warm_up(), self.loop).result()
+            print("[POOL] Browser pool ready")
+
+    async def _warm_up(self):
+        self._pages = asyncio.Semaphore(self.concurrency)
+        for session in self.sessions.values():
+            # Per-account slots: an exclusive login only blocks its own account
+            session.slots = asyncio.Semaphore(self.concurrency)
+            session.gate = asyncio.Lock()
+        try:
+            await self._launch()
+        except Exception as e:
+            # Retried by _ensure_browser() when the first job arrives
+            print(f"[POOL] Failed to pre-warm browser: {e}")
+
+    async def _launch(self):
+        """Launch the browser and open a context for every account"""
+        with BROWSER_SECONDS.time(action='start'):
+            if not self.playwright:
+                self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(**launch_options())
+            for session in self.sessions.values():
+                await session.open(self.browser)
+
+    async def _ensure_browser(self):
+        """Relaunch the browser if it died and nothing else is using it"""
+        if self.browser and self.browser.is_connected():
+            return
+        if self.running > 1:
+            return
+        print("[POOL] Browser unhealthy, restarting...")
+        if self.browser:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+        await self._launch()
+        self.restarts += 1
+
+    def healthy(self):
+        return bool(self.browser and self.browser.is_connected())
+
+    def pick_account(self):
+        """Name of the account the dispatcher would use for an unpinned job right now"""
+        return self._pick().account.name
+
+    def _pick_key(self, session):
+        return (session.logged_in is False, session.exclusive, session.pending, session.jobs_run)
+
+    def _pick(self):
+        """Least busy account that isn't logging in or known to be logged out"""
+        return min(self.sessions.values(), key=self._pick_key)
+
+    def available(self, name):
+        """False while an exclusive job (login) holds or waits for the account"""
+        return not self.sessions[name].exclusive
+
+    def candidates(self):
+        """Account names in dispatch preference order, without logged out ones (unless all are)"""
+        sessions = sorted(self.sessions.values(), key=self._pick_key)
+        usable = [s for s in sessions if s.logged_in is not False] or sessions
+        return [s.account.name for s in usable]
+
+    async def _run(self, fn, account, exclusive):
+        session = self.sessions[account] if account else self._pick()
+        slots = self.concurrency if exclusive else 1
+
+        session.pending += 1
+        if exclusive:
+            session.exclusive = True
+        waiting_since = time.perf_counter()
+        try:
+            # The gate keeps an exclusive job from being starved by a stream of sends
+            async with session.gate:
+                for _ in range(slots):
+                    await session.slots.acquire()
+            try:
+                async with self._pages:
+                    POOL_WAIT_SECONDS.observe(time.perf_counter() - waiting_since, exclusive=str(exclusive).lower())
+                    self.running += 1
+                    try:
+                        await self._ensure_browser()
+                        return await fn(session)
+                    finally:
+                        self.running -= 1
+                        self.jobs_run += 1
+                        session.jobs_run += 1
+            finally:
+                for _ in range(slots):
+                    session.slots.release()
+        finally:
+            session.pending -= 1
+            if exclusive:
+                session.exclusive = False
+
+    def submit(self, fn, account=None, exclusive=False):
+        """Schedule fn(session) on the pool, returns a concurrent.futures.Future.
+
+        account pins the job to one account; otherwise the least busy healthy
+        account is chosen when the job starts.
+        """
+        if account is not None and account not in self.sessions:
+            raise ValueError(f'Unknown account: {account}')
+        self.start()
+        return asyncio.run_coroutine_threadsafe(self._run(fn, account, exclusive), self.loop)
+
+    def run(self, fn, account=None, exclusive=False, timeout=None):
+        """Run the coroutine returned by fn(session) on the pool and wait for its result"""
+        return self.submit(fn, account, exclusive).result(timeout)
+
+    def stop(self):
+        """Close the browser and stop the event loop"""
+        with self._lock:
+            if not self._thread:
+                return
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=10)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    async def _shutdown(self):
+        with BROWSER_SECONDS.time(action='stop'):
+            for resource, method in ((self.browser, 'close'), (self.playwright, 'stop')):
+                if resource:
+                    try:
+                        await getattr(resource, method)()
+                    except Exception:
+                        pass
+        self.browser = None
+        self.playwright = None
+
+    def stats(self):
+        """Pool statistics for the health endpoint"""
+        return {
+            'concurrency': self.concurrency,
+            'running': self.running,
+            'healthy': self.healthy(),
+            'jobs_run': self.jobs_run,
+            'restarts': self.restarts,
+            'tab_cache': self.tab_cache_stats(),
+            'accounts': {name: session.stats() for name, session in self.sessions.items()},
+        }
+
+    def tab_cache_stats(self):
+        """Open thread tabs and hit rate across all accounts"""
+        caches = [session.tabs for session in self.sessions.values()]
+        hits = sum(cache.hits for cache in caches)
+        misses = sum(cache.misses for cache in caches)
+        return {
+            'size': sum(len(cache) for cache in caches),
+            'memory_mb': round(sum(cache.memory_bytes() for cache in caches) / 1024 / 1024, 1),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+            'evictions': sum(cache.evictions for cache in caches),
+        }
@@ -0,0 +1,119 @@
+"""
+Browser profile for Instagram Bot
+Headless launch options, network resource blocking and per-request byte accounting
+"""
+
+import os
+from fnmatch import fnmatch
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_list(name, default=''):
+    return [item.strip() for item in os.getenv(name, default).split(',') if item.strip()]
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# 'debug' opens a visible browser and loads everything (useful for the first
+# login / 2FA); 'production' runs headless and blocks page weight we don't need
+BROWSER_PROFILE = os.getenv('BROWSER_PROFILE', 'debug').strip().lower()
+_production = BROWSER_PROFILE == 'production'
+
+BROWSER_HEADLESS = _env_flag('BROWSER_HEADLESS', 'true' if _production else 'false')
+BLOCK_RESOURCES = _env_flag('BLOCK_RESOURCES', 'true' if _production else 'false')
+
+# Playwright resource types that are aborted when blocking is on
+BLOCK_RESOURCE_TYPES = set(_env_list('BLOCK_RESOURCE_TYPES', 'image,media,font'))
+# URL glob patterns that are aborted when blocking is on (analytics/tracking)
+BLOCK_URL_PATTERNS = _env_list(
+    'BLOCK_URL_PATTERNS',
+    '*/logging/*,*/ajax/bz*,*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*,*facebook.com/tr*'
+)
+# URL glob patterns that are never blocked, even if they match the rules above
+ALLOW_URL_PATTERNS = _env_list('ALLOW_URL_PATTERNS')
+
+
+def launch_options():
+    """Keyword arguments for chromium.launch()"""
+    return {'headless': BROWSER_HEADLESS}
+
+
+def should_block(url, resource_type):
+    """Whether a request is dead weight for the DM flows"""
+    if any(fnmatch(url, pattern) for pattern in ALLOW_URL_PATTERNS):
+        return False
+    if resource_type in BLOCK_RESOURCE_TYPES:
+        return True
+    return any(fnmatch(url, pattern) for pattern in BLOCK_URL_PATTERNS)
+
+
+def _new_counters():
+    return {'requests': 0, 'bytes': 0, 'blocked': 0, 'blocked_by_type': {}}
+
+
+class NetworkMonitor:
+    """Blocks unwanted requests on a context and counts transferred bytes.
+
+    Totals are kept for the whole context; counters for a single job are
+    collected per page between start_page() and finish_page().
+    """
+
+    def __init__(self, blocking=BLOCK_RESOURCES):
+        self.blocking = blocking
+        self.totals = _new_counters()
+        self._pages = {}
+
+    async def attach(self, context):
+        """Install routing and byte accounting on a browser context"""
+        if self.blocking:
+            await context.route('**/*', self._route)
+        context.on('requestfinished', self._on_request_finished)
+
+    def _counters_for(self, request):
+        try:
+            return self._pages.get(request.frame.page)
+        except Exception:
+            # Service worker requests have no frame
+            return None
+
+    async def _route(self, route):
+        request = route.request
+        if not should_block(request.url, request.resource_type):
+            await route.continue_()
+            return
+
+        for counters in (self.totals, self._counters_for(request)):
+            if counters is not None:
+                counters['blocked'] += 1
+                by_type = counters['blocked_by_type']
+                by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+        await route.abort()
+
+    async def _on_request_finished(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        size = sum(sizes.get(key, 0) for key in (
+            'requestHeadersSize', 'requestBodySize', 'responseHeadersSize', 'responseBodySize'
+        ))
+
+        for counters in (self.totals, self._counters_for(request)):
+            if counters is not None:
+                counters['requests'] += 1
+                counters['bytes'] += size
+
+    def start_page(self, page):
+        """Start counting requests for a job running on page"""
+        self._pages[page] = _new_counters()
+
+    def finish_page(self, page):
+        """Stop counting for page and return what the job transferred"""
+        return self._pages.pop(page, None)
+
+    def stats(self):
+        return dict(self.totals, blocking=self.blocking)
@@ -0,0 +1,123 @@
+"""
+Failure-only debug capture for Instagram Bot
+Keeps a small in-memory trail of recent steps per job and only writes artifacts
+(screenshot, page HTML, step trail) to disk when a step fails
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import threading
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 'failure' writes artifacts only when something goes wrong, 'off' never writes
+DEBUG_CAPTURE = os.getenv('DEBUG_CAPTURE', 'failure').strip().lower()
+DEBUG_DIR = os.getenv('DEBUG_DIR', 'debug')
+# Steps kept in memory per job
+DEBUG_RING_SIZE = int(os.getenv('DEBUG_RING_SIZE', '20'))
+# Also keep a trimmed DOM snapshot with every step (costs one page.content() per step)
+DEBUG_SNAPSHOT_DOM = os.getenv('DEBUG_SNAPSHOT_DOM', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+DEBUG_SNAPSHOT_CHARS = 20000
+# Eviction limits for DEBUG_DIR
+DEBUG_MAX_MB = float(os.getenv('DEBUG_MAX_MB', '200'))
+DEBUG_MAX_AGE_HOURS = float(os.getenv('DEBUG_MAX_AGE_HOURS', '24'))
+
+_evict_lock = threading.Lock()
+
+
+class DebugCapture:
+    """Ring buffer of the last steps of one bot operation"""
+
+    def __init__(self, job_id, operation):
+        self.job_id = job_id
+        self.operation = operation
+        self.steps = deque(maxlen=DEBUG_RING_SIZE)
+        self.artifact_dir = None
+
+    async def step(self, page, name, **details):
+        """Remember a step; cheap metadata only unless DEBUG_SNAPSHOT_DOM is on"""
+        entry = {'step': name, 'time': time.time(), 'url': page.url if page else None}
+        entry.update(details)
+        if DEBUG_SNAPSHOT_DOM and page:
+            try:
+                entry['dom'] = (await page.content())[:DEBUG_SNAPSHOT_CHARS]
+            except Exception:
+                pass
+        self.steps.append(entry)
+
+    async def failure(self, page, reason):
+        """Write screenshot, HTML and the step trail to DEBUG_DIR/<job_id>"""
+        await self.step(page, 'failure', reason=reason)
+        if DEBUG_CAPTURE == 'off':
+            return None
+
+        self.artifact_dir = os.path.join(DEBUG_DIR, self.job_id)
+        os.makedirs(self.artifact_dir, exist_ok=True)
+
+        if page:
+            try:
+                await page.screenshot(path=os.path.join(self.artifact_dir, 'failure.png'), full_page=True)
+            except Exception:
+                pass
+            try:
+                with open(os.path.join(self.artifact_dir, 'page.html'), 'w', encoding='utf-8') as f:
+                    f.write(await page.content())
+            except Exception:
+                pass
+
+        with open(os.path.join(self.artifact_dir, 'steps.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'job_id': self.job_id,
+                'operation': self.operation,
+                'reason': reason,
+                'steps': list(self.steps),
+            }, f, indent=2)
+
+        print(f"[DEBUG] Failure artifacts saved to: {self.artifact_dir}")
+        # Walking DEBUG_DIR can take a while; keep it off the browser loop
+        asyncio.get_running_loop().run_in_executor(None, evict)
+        return self.artifact_dir
+
+
+def evict(max_mb=DEBUG_MAX_MB, max_age_hours=DEBUG_MAX_AGE_HOURS):
+    """Delete job directories older than max_age_hours, then the oldest until under max_mb.
+
+    Skipped while another eviction is running; the next failure capture runs it again.
+    """
+    if not os.path.isdir(DEBUG_DIR):
+        return
+    if not _evict_lock.acquire(blocking=False):
+        return
+
+    try:
+        now = time.time()
+        entries = []
+        for name in os.listdir(DEBUG_DIR):
+            path = os.path.join(DEBUG_DIR, name)
+            if not os.path.isdir(path):
+                continue
+            size = 0
+            for root, _, files in os.walk(path):
+                for file in files:
+                    try:
+                        size += os.path.getsize(os.path.join(root, file))
+                    except OSError:
+                        pass
+            entries.append((os.path.getmtime(path), size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            too_old = now - mtime > max_age_hours * 3600
+            too_big = total > max_mb * 1024 * 1024
+            if not too_old and not too_big:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+    finally:
+        _evict_lock.release()
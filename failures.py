@@ -0,0 +1,166 @@
+"""
+Failure classification for Instagram Bot
+Maps why a bot operation failed to a failure class and decides whether and how to retry it
+"""
+
+import os
+import time
+import random
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Attempts per operation including the first one (1 disables retries)
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '3'))
+# Backoff before the n-th retry: RETRY_BACKOFF_SECONDS * 2^(n-1) plus up to 25% jitter,
+# capped at RETRY_BACKOFF_MAX_SECONDS
+RETRY_BACKOFF_SECONDS = float(os.getenv('RETRY_BACKOFF_SECONDS', '5'))
+RETRY_BACKOFF_MAX_SECONDS = float(os.getenv('RETRY_BACKOFF_MAX_SECONDS', '60'))
+# Log the account in again (stored credentials) when a send finds its session expired
+RETRY_RELOGIN = os.getenv('RETRY_RELOGIN', 'true').lower() == 'true'
+
+# Failure classes
+TRANSIENT = 'transient'    # retry right away on the same warm page
+BACKOFF = 'backoff'        # retry after an exponential delay
+RELOGIN = 'relogin'        # log in again, then retry
+PERMANENT = 'permanent'    # retrying can't help
+
+# What to do after a failed attempt
+RETRY_NOW = 'retry'
+WAIT = 'backoff'
+LOGIN_THEN_RETRY = 'relogin'
+GIVE_UP = 'give_up'
+
+# reason -> (failure class, message for API callers)
+REASONS = {
+    'navigation_failed': (TRANSIENT, 'Could not open the conversation'),
+    'timeout': (TRANSIENT, 'Timed out waiting for Instagram'),
+    'page_closed': (TRANSIENT, 'The browser page closed during the operation'),
+    'send_unconfirmed': (TRANSIENT, 'Instagram did not clear the composer, delivery is unconfirmed'),
+    'no_message_input': (BACKOFF, 'Message box not found'),
+    'no_username_field': (BACKOFF, 'Username field not found on the login page'),
+    'no_password_field': (BACKOFF, 'Password field not found on the login page'),
+    'rate_limited': (BACKOFF, 'Instagram asked to try again later'),
+    'exception': (BACKOFF, 'Unexpected error'),
+    'not_logged_in': (RELOGIN, 'Account is not logged in'),
+    'deadline_exceeded': (PERMANENT, 'Deadline exceeded before the operation could finish'),
+    'user_not_found': (PERMANENT, 'User not found'),
+    'bad_credentials': (PERMANENT, 'Instagram rejected the username or password'),
+}
+UNKNOWN = (BACKOFF, 'Operation failed')
+
+# Text Instagram shows on the page for failures that have no selector of their own
+PAGE_TEXT_REASONS = (
+    ("Sorry, this page isn't available", 'user_not_found'),
+    ('Try Again Later', 'rate_limited'),
+    ('Please wait a few minutes before you try again', 'rate_limited'),
+    ('Sorry, your password was incorrect', 'bad_credentials'),
+    ("The username you entered doesn't belong to an account", 'bad_credentials'),
+)
+
+
+def classify(reason):
+    """Failure class of a reason; unknown reasons are retried with backoff"""
+    return REASONS.get(reason, UNKNOWN)[0]
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed before the operation finished"""
+
+
+def remaining_ms(deadline, timeout=None):
+    """timeout (milliseconds) capped by what is left until deadline (unix time).
+
+    With no deadline the timeout is returned unchanged; raises DeadlineExceeded
+    once the deadline has passed.
+    """
+    if deadline is None:
+        return timeout
+    remaining = (deadline - time.time()) * 1000
+    if remaining <= 0:
+        raise DeadlineExceeded(f'Deadline passed {-remaining / 1000:.1f}s ago')
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def exception_reason(error):
+    """Failure reason for an exception raised during a bot operation"""
+    if isinstance(error, DeadlineExceeded):
+        return 'deadline_exceeded'
+    text = str(error)
+    if type(error).__name__ == 'TimeoutError' or ('Timeout' in text and 'exceeded' in text):
+        return 'timeout'
+    if 'has been closed' in text or 'Target closed' in text:
+        return 'page_closed'
+    return 'exception'
+
+
+def page_text_reason(text):
+    """Failure reason for an error Instagram shows in the page text, or None"""
+    for needle, reason in PAGE_TEXT_REASONS:
+        if needle in text:
+            return reason
+    return None
+
+
+class BotFailure(Exception):
+    """A bot operation failed for a known reason (see REASONS)"""
+
+    def __init__(self, reason, detail=None, attempts=1):
+        self.reason = reason
+        self.failure_class = classify(reason)
+        self.attempts = attempts
+        super().__init__(detail or REASONS.get(reason, UNKNOWN)[1])
+
+    @property
+    def retryable(self):
+        return self.failure_class != PERMANENT
+
+    def to_dict(self):
+        return {
+            'reason': self.reason,
+            'class': self.failure_class,
+            'retryable': self.retryable,
+            'message': str(self),
+            'attempts': self.attempts,
+        }
+
+
+class RetryPolicy:
+    """Per-class retry decisions, bounded by max_attempts per operation"""
+
+    def __init__(self, max_attempts=RETRY_MAX_ATTEMPTS, backoff=RETRY_BACKOFF_SECONDS,
+                 backoff_max=RETRY_BACKOFF_MAX_SECONDS, relogin=RETRY_RELOGIN):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.relogin = relogin
+
+    def backoff_seconds(self, attempts):
+        delay = min(self.backoff_max, self.backoff * 2 ** (attempts - 1))
+        return delay * (1 + random.random() * 0.25)
+
+    def next_action(self, reason, attempts, relogged=False, deadline=None):
+        """(action, delay in seconds) after `attempts` attempts failed, the last one for reason.
+
+        Gives up when the next attempt couldn't start before deadline (unix time).
+        """
+        failure_class = classify(reason)
+        if failure_class == PERMANENT or attempts >= self.max_attempts:
+            return GIVE_UP, 0
+        if deadline is not None and time.time() >= deadline:
+            return GIVE_UP, 0
+        if failure_class == RELOGIN:
+            # One re-login per operation; if that didn't help, more won't
+            if not self.relogin or relogged:
+                return GIVE_UP, 0
+            return LOGIN_THEN_RETRY, 0
+        if failure_class == TRANSIENT:
+            return RETRY_NOW, 0
+        delay = self.backoff_seconds(attempts)
+        if deadline is not None and time.time() + delay >= deadline:
+            return GIVE_UP, 0
+        return WAIT, delay
+
+
+# Shared by the send workers and /login
+retry_policy = RetryPolicy()
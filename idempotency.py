@@ -0,0 +1,91 @@
+"""
+Idempotency keys for Instagram Bot API
+Maps a client-supplied key to the send it created, so retried requests get the
+recorded or in-progress outcome instead of a second message
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds a key is remembered (default 24 hours)
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', str(24 * 3600)))
+# Most keys kept in memory; the oldest are dropped first
+IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', '10000'))
+# Longest key accepted
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class IdempotencyConflict(ValueError):
+    """The key was already used for a different request"""
+
+
+def fingerprint(username, message, account=None):
+    """Stable hash of what a send request asks for"""
+    payload = json.dumps([username, message, account], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore:
+    """Bounded, expiring map of idempotency key -> (job id, request fingerprint).
+
+    lookup(key, since) is an optional fallback (e.g. the outbox) consulted for
+    keys that are no longer in memory, such as those from before a restart.
+    """
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL, max_keys=IDEMPOTENCY_MAX_KEYS, lookup=None):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.lookup = lookup
+        self.replays = 0
+        self.conflicts = 0
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _find(self, key):
+        entry = self._keys.get(key)
+        if entry and time.time() - entry[2] <= self.ttl:
+            return entry[0], entry[1]
+        if entry:
+            del self._keys[key]
+        if self.lookup:
+            return self.lookup(key, time.time() - self.ttl)
+        return None
+
+    def claim(self, key, request_fingerprint, create):
+        """Job id already recorded for key, or the id returned by create() for a new one.
+
+        Returns (job_id, created). Runs create() under the store lock so two
+        concurrent retries with the same key can't both start a send. Raises
+        IdempotencyConflict if the key was used for a different request.
+        """
+        with self._lock:
+            found = self._find(key)
+            if found:
+                job_id, stored_fingerprint = found
+                if stored_fingerprint != request_fingerprint:
+                    self.conflicts += 1
+                    raise IdempotencyConflict(f'Idempotency key {key!r} was already used for a different request')
+                self.replays += 1
+                return job_id, False
+
+            job_id = create()
+            self._keys[key] = (job_id, request_fingerprint, time.time())
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+            return job_id, True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._keys),
+                'ttl': self.ttl,
+                'replays': self.replays,
+                'conflicts': self.conflicts,
+            }
@@ -9,11 +9,32 @@ a = Analysis(
     datas=[
         ('app.py', '.'),
         ('bot.py', '.'),
+        ('browser_pool.py', '.'),
+        ('readiness.py', '.'),
+        ('selector_resolver.py', '.'),
+        ('thread_cache.py', '.'),
+        ('jobs.py', '.'),
+        ('accounts.py', '.'),
+        ('browser_profile.py', '.'),
+        ('debug_capture.py', '.'),
+        ('popups.py', '.'),
+        ('session_probe.py', '.'),
+        ('metrics.py', '.'),
+        ('tracing.py', '.'),
+        ('outbox.py', '.'),
+        ('idempotency.py', '.'),
+        ('scheduler.py', '.'),
+        ('failures.py', '.'),
+        ('text_input.py', '.'),
+        ('tab_cache.py', '.'),
+        ('admission.py', '.'),
+        ('webhooks.py', '.'),
+        ('supervisor.py', '.'),
     ],
     hiddenimports=[
         'flask',
         'playwright',
-        'playwright.sync_api',
+        'playwright.async_api',
         'dotenv',
     ],
     hookspath=[],
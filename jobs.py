@@ -0,0 +1,303 @@
+"""
+Background job queue for Instagram Bot API
+Accepts send requests immediately and runs them on a worker thread
+"""
+
+import os
+import time
+import uuid
+import queue
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from metrics import QUEUE_WAIT_SECONDS
+from failures import BotFailure
+from tracing import tracer
+
+load_dotenv()
+
+# How many finished jobs are kept for GET /jobs/<id>
+JOB_HISTORY = int(os.getenv('JOB_HISTORY', '1000'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class Job:
+    """A single queued bot operation and its timings"""
+
+    def __init__(self, username, message, account=None, on_done=None, profile=None, job_id=None,
+                 idempotency_key=None, send_at=None, deadline=None, callback_url=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.username = username
+        self.message = message
+        # Pinned account, or the one the scheduler/dispatcher picked once the job runs
+        self.account = account
+        self.pinned = account is not None
+        # Requests/bytes/blocked counts recorded by the browser for this send
+        self.network = None
+        # Where failure artifacts were written, if any
+        self.debug_dir = None
+        self.status = QUEUED
+        self.error = None
+        # Reason, class and retryability of the final failure (see failures.py)
+        self.failure = None
+        # Bot attempts made so far and the retries that followed failed ones
+        self.attempts = 0
+        self.retries = []
+        self.created_at = time.time()
+        # Set when a retry puts the job back in the queue
+        self.requeued_at = None
+        # Not sent before this unix time (None = as soon as the rate limits allow)
+        self.send_at = send_at
+        # Unix time the caller needs a result by; the send is abandoned once it passes
+        self.deadline = deadline
+        self.started_at = None
+        self.finished_at = None
+        # Called with the job once it has succeeded or failed
+        self.on_done = on_done
+        # Client key that retries of the same request reuse
+        self.idempotency_key = idempotency_key
+        # Where the result is POSTed once finished (None = the global webhook, if any)
+        self.callback_url = callback_url
+        # Spans from queueing to the last browser step, readable at /traces/<id>
+        self.trace = tracer.start('send_dm', trace_id=self.id, profile=profile, username=username)
+
+    @classmethod
+    def restore(cls, row):
+        """Rebuild a job the outbox kept across a restart"""
+        job = cls(row['username'], row['message'], row['account'], job_id=row['id'],
+                  idempotency_key=row.get('idempotency_key'), send_at=row.get('send_at'),
+                  deadline=row.get('deadline'), callback_url=row.get('callback_url'))
+        job.created_at = row['created_at']
+        job.trace.attributes['resumed'] = True
+        return job
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'username': self.username,
+            'account': self.account,
+            'created_at': self.created_at,
+            'send_at': self.send_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'queue_seconds': None,
+            'run_seconds': None,
+        }
+        if self.started_at:
+            data['queue_seconds'] = round(self.started_at - self.created_at, 3)
+        if self.started_at and self.finished_at:
+            data['run_seconds'] = round(self.finished_at - self.started_at, 3)
+        if self.network:
+            data['network'] = self.network
+        if self.debug_dir:
+            data['debug_dir'] = self.debug_dir
+        if self.deadline:
+            data['deadline'] = self.deadline
+        if self.callback_url:
+            data['callback_url'] = self.callback_url
+        if self.error:
+            data['error'] = self.error
+        if self.failure:
+            data['failure'] = self.failure
+        if self.attempts:
+            data['attempts'] = self.attempts
+        if self.retries:
+            data['retries'] = self.retries
+        return data
+
+
+class RetryLater(Exception):
+    """Raised by a runner to put the job back in the queue and run it again after delay seconds"""
+
+    def __init__(self, delay, reason=None):
+        super().__init__(f'Retrying in {delay:.1f}s ({reason})')
+        self.delay = delay
+        self.reason = reason
+
+
+class JobQueue:
+    """FIFO of send jobs drained by background workers.
+
+    runner(job) performs the actual work and returns True on success. Each
+    worker runs one job at a time, so `workers` bounds how many jobs are in
+    flight together. With a store (see outbox.py) every job and status change
+    is persisted, and jobs a previous process left unfinished are resumed on
+    start(). A notifier (see webhooks.py) is told about every finished job.
+    """
+
+    def __init__(self, runner, workers=1, history=JOB_HISTORY, store=None, scheduler=None, notifier=None):
+        self.runner = runner
+        self.store = store
+        self.scheduler = scheduler
+        self.notifier = notifier
+        self.workers = max(1, workers)
+        self.history = history
+        self.jobs = OrderedDict()
+        # A scheduler (see scheduler.py) paces jobs per account and honours send_at
+        self._queue = scheduler or queue.Queue()
+        self._lock = threading.Lock()
+        self._worker_threads = []
+
+    def start(self):
+        """Start the background workers (idempotent)"""
+        with self._lock:
+            if self._worker_threads:
+                return
+            if self.store:
+                self._resume()
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'job-worker-{index}', daemon=True)
+                self._worker_threads.append(thread)
+                thread.start()
+
+    def _resume(self):
+        rows = self.store.unfinished()
+        if rows:
+            print(f"[OUTBOX] Resuming {len(rows)} unfinished send(s) from the last run")
+        for row in rows:
+            job = Job.restore(row)
+            self.jobs[job.id] = job
+            self._queue.put(job)
+
+    def submit(self, username, message, account=None, on_done=None, profile=None, idempotency_key=None,
+               send_at=None, deadline=None, callback_url=None):
+        """Queue a send and return its Job right away (profile names a profiler to run on it)"""
+        self.start()
+        job = Job(username, message, account, on_done, profile, idempotency_key=idempotency_key, send_at=send_at,
+                  deadline=deadline, callback_url=callback_url)
+        if self.store:
+            # Only accepted once it is on disk; raises if it can't be recorded
+            self.store.add(job)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._trim()
+        self._queue.put(job)
+        return job
+
+    def submit_many(self, items, account=None, on_done=None, send_at=None, deadline=None, callback_url=None):
+        """Queue (username, message) pairs together, recording them in one outbox commit"""
+        self.start()
+        jobs = [Job(username, message, account, on_done, send_at=send_at, deadline=deadline,
+                    callback_url=callback_url)
+                for username, message in items]
+        if self.store:
+            self.store.add_many(jobs)
+        with self._lock:
+            for job in jobs:
+                self.jobs[job.id] = job
+            self._trim()
+        for job in jobs:
+            self._queue.put(job)
+        return jobs
+
+    def _trim(self):
+        # Forget the oldest finished jobs once history is full
+        excess = len(self.jobs) - self.history
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self.jobs.values() if j.status in (SUCCEEDED, FAILED)][:excess]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def recent(self, status=None, limit=100):
+        """Most recent jobs first, optionally filtered by status"""
+        with self._lock:
+            jobs = [j for j in reversed(self.jobs.values()) if status is None or j.status == status]
+        return jobs[:limit]
+
+    def stats(self):
+        """Queue depth and job counts per status"""
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+        stats = {'depth': self._queue.qsize(), 'counts': counts}
+        if self.scheduler:
+            stats['schedule'] = self.scheduler.projection(self.workers, self._average_run_seconds())
+            stats['rate_limits'] = self.scheduler.stats()
+        return stats
+
+    def _average_run_seconds(self, sample=50):
+        """Mean run time of the most recent finished jobs, for drain projections"""
+        with self._lock:
+            runs = [j.finished_at - j.started_at for j in reversed(self.jobs.values())
+                    if j.status == SUCCEEDED and j.started_at and j.finished_at][:sample]
+        return sum(runs) / len(runs) if runs else 0
+
+    def _worker(self):
+        while True:
+            try:
+                job = self._queue.get()
+            except Exception as e:
+                # Keep the worker alive; one bad job must not stop the whole queue
+                print(f"[ERROR] Job worker could not take the next job: {e}")
+                time.sleep(1)
+                continue
+            job.status = RUNNING
+            job.started_at = time.time()
+            queued_at = job.requeued_at or job.created_at
+            # Scheduled sends only start waiting once they are due
+            QUEUE_WAIT_SECONDS.observe(max(0, job.started_at - max(queued_at, job.send_at or 0)))
+            job.trace.record('queue_wait', queued_at, job.started_at)
+            try:
+                self._persist(job)
+                success = self.runner(job)
+                job.status = SUCCEEDED if success else FAILED
+                if not success:
+                    job.error = 'Failed to send message'
+            except RetryLater as e:
+                self._requeue(job, e)
+                continue
+            except BotFailure as e:
+                job.status = FAILED
+                job.error = str(e)
+                job.failure = e.to_dict()
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+
+            job.finished_at = time.time()
+            job.trace.finish(status=job.status, account=job.account, error=job.error)
+            self._persist(job)
+            if job.on_done:
+                try:
+                    job.on_done(job)
+                except Exception as e:
+                    print(f"[WARNING] Job completion callback failed: {e}")
+            if self.notifier:
+                try:
+                    self.notifier.job_finished(job)
+                except Exception as e:
+                    print(f"[WARNING] Could not queue the webhook for job {job.id}: {e}")
+
+    def _requeue(self, job, retry):
+        """Queue a job again for another attempt once retry.delay has passed"""
+        job.status = QUEUED
+        job.requeued_at = time.time()
+        job.send_at = job.requeued_at + retry.delay
+        if not job.pinned:
+            # Let the scheduler pick whichever account can send soonest
+            job.account = None
+        self._persist(job, detail=str(retry))
+        if self.scheduler:
+            self._queue.put(job)
+        else:
+            timer = threading.Timer(retry.delay, self._queue.put, (job,))
+            timer.daemon = True
+            timer.start()
+
+    def _persist(self, job, detail=None):
+        if not self.store:
+            return
+        try:
+            self.store.update(job, detail)
+        except Exception as e:
+            print(f"[WARNING] Could not record job {job.id} in the outbox: {e}")
@@ -0,0 +1,187 @@
+"""
+Prometheus metrics for Instagram Bot
+Minimal counters/histograms/gauges rendered in the Prometheus text exposition format
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+# Seconds; covers fast page steps up to slow logins
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}' for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time"""
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def _samples(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f'{self.name} {_number(value)}']
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block (also around awaits)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total) in self._values.items():
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, ("le", _number(bound)))} {count}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {counts[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(float(total))}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+PHASE_SECONDS = Histogram(
+    'instabot_phase_seconds', 'Duration of each phase of a bot operation', ('operation', 'phase')
+)
+OPERATION_SECONDS = Histogram(
+    'instabot_operation_seconds', 'End-to-end duration of a bot operation', ('operation',)
+)
+OPERATIONS_TOTAL = Counter(
+    'instabot_operations_total', 'Bot operations by outcome and failure reason', ('operation', 'result', 'reason')
+)
+RETRIES_TOTAL = Counter(
+    'instabot_retries_total', 'Retries of failed bot operations by failure reason and action', ('operation', 'reason', 'action')
+)
+INPUT_SECONDS = Histogram(
+    'instabot_input_seconds', 'Time to enter text into a field, by input strategy', ('field', 'strategy')
+)
+TAB_CACHE_TOTAL = Counter(
+    'instabot_tab_cache_total', 'Open thread tab lookups by result (hit, miss, stale)', ('result',)
+)
+ADMISSION_REJECTED_TOTAL = Counter(
+    'instabot_admission_rejected_total', 'Requests turned away with 429/503 by reason', ('reason',)
+)
+WEBHOOK_EVENTS_TOTAL = Counter(
+    'instabot_webhook_events_total', 'Job results sent to callback URLs by delivery result', ('result',)
+)
+BROWSER_SECONDS = Histogram(
+    'instabot_browser_seconds', 'Browser lifecycle actions (start, stop, context reload)', ('action',)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'instabot_queue_wait_seconds', 'Time a send job waited in the queue before a worker picked it up'
+)
+POOL_WAIT_SECONDS = Histogram(
+    'instabot_pool_wait_seconds', 'Time an operation waited for a free browser page', ('exclusive',)
+)
+SELECTOR_FALLBACK_DEPTH = Histogram(
+    'instabot_selector_fallback_depth',
+    'Position of the winning selector in the preferred order (0 = learned winner, len = not found)',
+    ('element',),
+    buckets=(0, 1, 2, 3, 4, 5)
+)
+
+
+def phase(operation, name):
+    """Time one phase of a bot operation"""
+    return PHASE_SECONDS.time(operation=operation, phase=name)
+
+
+def record_operation(operation, seconds, success, reason=None):
+    OPERATION_SECONDS.observe(seconds, operation=operation)
+    OPERATIONS_TOTAL.inc(
+        operation=operation,
+        result='success' if success else 'failure',
+        reason='' if success else (reason or 'unknown')
+    )
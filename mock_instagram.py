@@ -0,0 +1,341 @@
+"""
+Local mock of the Instagram pages the bot uses
+Login form, Home icon, /m/<user> -> /direct/t/<id> redirect, DM composer and random
+"Not Now" dialogs with configurable latency, for offline runs and benchmarks, plus a
+receiver for the bot's completion webhooks
+"""
+
+import os
+import sys
+import hmac
+import time
+import uuid
+import random
+import hashlib
+import argparse
+import threading
+from flask import Flask, request, redirect, jsonify, make_response
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MOCK_PORT = int(os.getenv('MOCK_PORT', '5055'))
+# Added to every page response (milliseconds), plus up to MOCK_JITTER_MS at random
+MOCK_LATENCY_MS = float(os.getenv('MOCK_LATENCY_MS', '100'))
+MOCK_JITTER_MS = float(os.getenv('MOCK_JITTER_MS', '50'))
+# How long the "send message" request takes before the composer clears
+MOCK_SEND_LATENCY_MS = float(os.getenv('MOCK_SEND_LATENCY_MS', '200'))
+# Share of pages that pop up a "Not Now" dialog, and the latest it appears (milliseconds)
+MOCK_POPUP_RATE = float(os.getenv('MOCK_POPUP_RATE', '0.3'))
+MOCK_POPUP_DELAY_MS = float(os.getenv('MOCK_POPUP_DELAY_MS', '1500'))
+# Share of webhook deliveries /mock/webhook answers with 503, to exercise retries
+MOCK_WEBHOOK_FAIL_RATE = float(os.getenv('MOCK_WEBHOOK_FAIL_RATE', '0'))
+# Checks X-Instabot-Signature against this secret (the bot's WEBHOOK_SECRET by default)
+MOCK_WEBHOOK_SECRET = os.getenv('MOCK_WEBHOOK_SECRET', os.getenv('WEBHOOK_SECRET', ''))
+
+app = Flask(__name__)
+
+settings = {
+    'latency_ms': MOCK_LATENCY_MS,
+    'jitter_ms': MOCK_JITTER_MS,
+    'send_latency_ms': MOCK_SEND_LATENCY_MS,
+    'popup_rate': MOCK_POPUP_RATE,
+    'popup_delay_ms': MOCK_POPUP_DELAY_MS,
+    'webhook_fail_rate': MOCK_WEBHOOK_FAIL_RATE,
+}
+
+_lock = threading.Lock()
+sessions = {}
+messages = []
+webhooks = []
+counters = {'logins': 0, 'redirects': 0, 'threads': 0, 'messages': 0, 'popups': 0, 'probes': 0,
+            'webhook_posts': 0, 'webhook_rejected': 0}
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>%(title)s</title>
+<style>
+  body { font-family: sans-serif; margin: 0; }
+  nav { padding: 8px; border-bottom: 1px solid #ddd; }
+  main { padding: 16px; }
+  [role="dialog"] { position: fixed; inset: 0; background: rgba(0, 0, 0, .5);
+                    display: flex; align-items: center; justify-content: center; }
+  [role="dialog"] > div { background: #fff; padding: 24px; border-radius: 12px; }
+  [role="textbox"] { border: 1px solid #ccc; border-radius: 20px; padding: 8px 12px; min-height: 20px; }
+</style></head>
+<body>%(body)s
+<script>
+  const popupRate = %(popup_rate)s, popupDelay = %(popup_delay)s;
+  if (Math.random() < popupRate) {
+    setTimeout(() => {
+      const dialog = document.createElement('div');
+      dialog.setAttribute('role', 'dialog');
+      dialog.innerHTML = '<div><h3>Turn on Notifications</h3><button>Turn On</button> <button>Not Now</button></div>';
+      dialog.querySelectorAll('button').forEach((button) => button.addEventListener('click', () => dialog.remove()));
+      document.body.appendChild(dialog);
+      fetch('/mock/popup', {method: 'POST'});
+    }, Math.random() * popupDelay);
+  }
+</script>
+%(script)s
+</body></html>"""
+
+NOT_FOUND_BODY = """<main>
+  <h2>Sorry, this page isn't available.</h2>
+  <p>The link you followed may be broken, or the page may have been removed.</p>
+</main>"""
+
+# Recipients starting with this don't exist (to exercise the user_not_found failure)
+MISSING_PREFIX = 'missing'
+
+NAV = '<nav><a href="/"><svg aria-label="Home" width="24" height="24"><circle cx="12" cy="12" r="10"/></svg></a></nav>'
+
+LOGIN_BODY = """<main>
+  <form method="post" action="/accounts/login/">
+    <input name="username" aria-label="Phone number, username, or email" type="text"><br>
+    <input name="password" aria-label="Password" type="password"><br>
+    <button type="submit">Log in</button>
+  </form>
+</main>"""
+
+THREAD_BODY = NAV + """<main>
+  <h2>%(username)s</h2>
+  <div contenteditable="true" role="textbox" aria-label="Message"></div>
+  <button type="button" id="send" style="display: none">Send</button>
+</main>"""
+
+THREAD_SCRIPT = """<script>
+  const box = document.querySelector('[role="textbox"]');
+  const sendButton = document.getElementById('send');
+  box.addEventListener('input', () => {
+    sendButton.style.display = box.innerText.trim() ? '' : 'none';
+  });
+  const send = async () => {
+    const text = box.innerText.trim();
+    if (!text) return;
+    await fetch('/api/v1/direct_v2/threads/broadcast/text/', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({thread_id: '%(thread_id)s', text: text})
+    });
+    box.innerHTML = '';
+    sendButton.style.display = 'none';
+  };
+  sendButton.addEventListener('click', send);
+  box.addEventListener('keydown', (event) => {
+    if (event.key === 'Enter' && !event.shiftKey) {
+      event.preventDefault();
+      send();
+    }
+  });
+</script>"""
+
+
+def _delay(base_ms=None):
+    base_ms = settings['latency_ms'] if base_ms is None else base_ms
+    time.sleep((base_ms + random.random() * settings['jitter_ms']) / 1000)
+
+
+def _page(title, body, script='', popups=True):
+    return PAGE % {
+        'title': title,
+        'body': body,
+        'script': script,
+        'popup_rate': settings['popup_rate'] if popups else 0,
+        'popup_delay': settings['popup_delay_ms'],
+    }
+
+
+def _session():
+    """Username of the logged in mock session, or None"""
+    with _lock:
+        return sessions.get(request.cookies.get('sessionid'))
+
+
+def _thread_id(username):
+    return str(int(hashlib.sha1(username.lower().encode('utf-8')).hexdigest()[:15], 16))
+
+
+def _to_login():
+    return redirect(f'/accounts/login/?next={request.path}')
+
+
+@app.route('/')
+def home():
+    _delay()
+    if not _session():
+        return _page('Instagram', LOGIN_BODY, popups=False)
+    return _page('Instagram', NAV + '<main><p>Feed</p></main>')
+
+
+@app.route('/accounts/login/', methods=['GET', 'POST'])
+def accounts_login():
+    _delay()
+    if request.method == 'GET':
+        return _page('Login • Instagram', LOGIN_BODY, popups=False)
+
+    username = request.form.get('username', '')
+    if not username or not request.form.get('password'):
+        return _page('Login • Instagram', LOGIN_BODY, popups=False), 400
+
+    token = uuid.uuid4().hex
+    with _lock:
+        sessions[token] = username
+        counters['logins'] += 1
+    response = make_response(redirect('/'))
+    response.set_cookie('sessionid', token, max_age=30 * 24 * 3600)
+    response.set_cookie('csrftoken', uuid.uuid4().hex, max_age=30 * 24 * 3600)
+    return response
+
+
+@app.route('/m/<username>')
+def message_redirect(username):
+    _delay()
+    if not _session():
+        return _to_login()
+    if username.lower().startswith(MISSING_PREFIX):
+        return _page('Page not found • Instagram', NAV + NOT_FOUND_BODY, popups=False), 404
+    with _lock:
+        counters['redirects'] += 1
+    return redirect(f'/direct/t/{_thread_id(username)}/')
+
+
+@app.route('/direct/t/<thread_id>/')
+def thread(thread_id):
+    _delay()
+    if not _session():
+        return _to_login()
+    with _lock:
+        counters['threads'] += 1
+    return _page(
+        'Direct • Instagram',
+        THREAD_BODY % {'username': f'thread {thread_id}'},
+        THREAD_SCRIPT % {'thread_id': thread_id}
+    )
+
+
+@app.route('/api/v1/direct_v2/threads/broadcast/text/', methods=['POST'])
+def broadcast_text():
+    _delay(settings['send_latency_ms'])
+    sender = _session()
+    if not sender:
+        return jsonify({'status': 'fail', 'message': 'login_required'}), 403
+    data = request.get_json(silent=True) or {}
+    with _lock:
+        counters['messages'] += 1
+        messages.append({
+            'sender': sender,
+            'thread_id': data.get('thread_id'),
+            'text': data.get('text'),
+            'time': time.time(),
+        })
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/api/v1/accounts/edit/web_form_data/')
+def web_form_data():
+    """Answers the session probe like the real endpoint does"""
+    with _lock:
+        counters['probes'] += 1
+    username = _session()
+    if not username:
+        return jsonify({'message': 'login_required', 'status': 'fail'}), 401
+    return jsonify({'form_data': {'username': username}, 'status': 'ok'})
+
+
+@app.route('/mock/popup', methods=['POST'])
+def popup_shown():
+    with _lock:
+        counters['popups'] += 1
+    return '', 204
+
+
+@app.route('/mock/messages', methods=['GET'])
+def list_messages():
+    """Messages the mock received, newest last"""
+    limit = request.args.get('limit', 100, type=int)
+    with _lock:
+        return jsonify({'total': len(messages), 'messages': messages[-limit:]})
+
+
+@app.route('/mock/webhook', methods=['POST'])
+def receive_webhook():
+    """Callback URL for the bot (callback_url=http://127.0.0.1:<port>/mock/webhook)"""
+    if random.random() < settings['webhook_fail_rate']:
+        with _lock:
+            counters['webhook_rejected'] += 1
+        return jsonify({'status': 'unavailable'}), 503
+    data = request.get_json(silent=True) or {}
+    signature = request.headers.get('X-Instabot-Signature')
+    # None when there is no secret to check against
+    signature_valid = None
+    if MOCK_WEBHOOK_SECRET:
+        expected = 'sha256=' + hmac.new(MOCK_WEBHOOK_SECRET.encode(), request.get_data(), hashlib.sha256).hexdigest()
+        signature_valid = bool(signature) and hmac.compare_digest(signature, expected)
+    with _lock:
+        counters['webhook_posts'] += 1
+        for event in data.get('events', []):
+            webhooks.append(dict(event, received_at=time.time(), signature=signature,
+                                 signature_valid=signature_valid))
+    return jsonify({'status': 'ok', 'received': len(data.get('events', []))})
+
+
+@app.route('/mock/webhooks', methods=['GET'])
+def list_webhooks():
+    """Webhook events the mock received, newest last"""
+    limit = request.args.get('limit', 100, type=int)
+    with _lock:
+        return jsonify({'total': len(webhooks), 'events': webhooks[-limit:]})
+
+
+@app.route('/mock/stats', methods=['GET'])
+def stats():
+    with _lock:
+        return jsonify({'settings': settings, 'counters': counters, 'sessions': len(sessions)})
+
+
+@app.route('/mock/settings', methods=['POST'])
+def update_settings():
+    """Change latencies/popup rate at runtime, e.g. {"latency_ms": 300}"""
+    data = request.get_json(silent=True) or {}
+    for key, value in data.items():
+        if key in settings:
+            settings[key] = float(value)
+    return jsonify(settings)
+
+
+@app.route('/mock/reset', methods=['POST'])
+def reset():
+    """Forget received messages, webhooks and counters (sessions stay logged in)"""
+    with _lock:
+        messages.clear()
+        webhooks.clear()
+        for key in counters:
+            counters[key] = 0
+    return jsonify({'status': 'success'})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock Instagram server for offline runs and benchmarks')
+    parser.add_argument('--port', type=int, default=MOCK_PORT)
+    parser.add_argument('--latency-ms', type=float, default=MOCK_LATENCY_MS)
+    parser.add_argument('--jitter-ms', type=float, default=MOCK_JITTER_MS)
+    parser.add_argument('--send-latency-ms', type=float, default=MOCK_SEND_LATENCY_MS)
+    parser.add_argument('--popup-rate', type=float, default=MOCK_POPUP_RATE)
+    parser.add_argument('--popup-delay-ms', type=float, default=MOCK_POPUP_DELAY_MS)
+    args = parser.parse_args()
+
+    settings.update(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        send_latency_ms=args.send_latency_ms,
+        popup_rate=args.popup_rate,
+        popup_delay_ms=args.popup_delay_ms,
+    )
+    print(f"[MOCK] Mock Instagram on http://127.0.0.1:{args.port} ({settings})")
+    print(f"[MOCK] Run the bot against it with INSTAGRAM_BASE_URL=http://127.0.0.1:{args.port}")
+    sys.stdout.flush()
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""
+Durable send outbox for Instagram Bot API
+Records every accepted send and its state transitions in SQLite (WAL) so a restart
+resumes unfinished jobs instead of losing them
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OUTBOX_DB = os.getenv('OUTBOX_DB', 'outbox.db')
+# Finished sends older than this are pruned on startup (days)
+OUTBOX_RETENTION_DAYS = float(os.getenv('OUTBOX_RETENTION_DAYS', '7'))
+# A send that was interrupted this many times (e.g. it crashes the process) is given up on
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '3'))
+
+UNFINISHED = ('queued', 'running')
+
+
+class _Flush:
+    """Outcome of one group commit, shared by every caller whose rows it carried"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class Outbox:
+    """SQLite table of accepted sends plus a log of their status changes.
+
+    Inserts from concurrent callers are group-committed: whoever takes the
+    write lock first commits every row waiting at that moment in one
+    transaction, so a burst of sends costs a handful of fsyncs instead of one
+    per message, and no caller returns before its own row is on disk. If that
+    commit fails, every caller whose rows it carried gets the error.
+    """
+
+    def __init__(self, path=OUTBOX_DB, retention_days=OUTBOX_RETENTION_DAYS, max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_attempts = max_attempts
+        self.inserts = 0
+        self.commits = 0
+        self._lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending = []
+        self._flush = _Flush()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets readers (GET /jobs) run alongside the writer; NORMAL sync is
+        # still durable across process crashes, only an OS crash can lose the tail
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            ' id TEXT PRIMARY KEY,'
+            ' username TEXT NOT NULL,'
+            ' message TEXT NOT NULL,'
+            ' account TEXT,'
+            ' pinned INTEGER NOT NULL DEFAULT 0,'
+            ' status TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' error TEXT,'
+            ' network TEXT,'
+            ' debug_dir TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' started_at REAL,'
+            ' finished_at REAL,'
+            ' updated_at REAL NOT NULL,'
+            ' idempotency_key TEXT,'
+            ' send_at REAL,'
+            ' failure TEXT,'
+            ' retries INTEGER NOT NULL DEFAULT 0,'
+            ' deadline REAL,'
+            ' callback_url TEXT,'
+            ' interruptions INTEGER NOT NULL DEFAULT 0'
+            ')'
+        )
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(outbox)')]
+        for column, column_type in (('idempotency_key', 'TEXT'), ('send_at', 'REAL'), ('failure', 'TEXT'),
+                                    ('retries', 'INTEGER NOT NULL DEFAULT 0'), ('deadline', 'REAL'),
+                                    ('callback_url', 'TEXT'), ('interruptions', 'INTEGER NOT NULL DEFAULT 0')):
+            if column not in columns:
+                self._conn.execute(f'ALTER TABLE outbox ADD COLUMN {column} {column_type}')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_idempotency_key ON outbox (idempotency_key)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS outbox_events ('
+            ' job_id TEXT NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' at REAL NOT NULL,'
+            ' detail TEXT'
+            ')'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_events_job ON outbox_events (job_id)')
+        self._conn.commit()
+
+    def add(self, job):
+        """Durably record a newly accepted job (status queued)"""
+        self.add_many([job])
+
+    def add_many(self, jobs):
+        rows = [
+            (job.id, job.username, job.message, job.account, int(job.account is not None),
+             job.status, job.created_at, job.created_at, job.idempotency_key, job.send_at, job.deadline,
+             job.callback_url)
+            for job in jobs
+        ]
+        with self._pending_lock:
+            self._pending.extend(rows)
+            flush = self._flush
+        with self._lock:
+            with self._pending_lock:
+                if flush is self._flush:
+                    rows, self._pending = self._pending, []
+                    self._flush = _Flush()
+                else:
+                    # Another caller's commit took our rows; its outcome is ours
+                    rows = None
+            if rows:
+                try:
+                    self._conn.executemany(
+                        'INSERT OR IGNORE INTO outbox '
+                        '(id, username, message, account, pinned, status, created_at, updated_at, idempotency_key, '
+                        'send_at, deadline, callback_url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        rows
+                    )
+                    self._conn.executemany(
+                        'INSERT INTO outbox_events (job_id, status, at) VALUES (?, ?, ?)',
+                        [(row[0], row[5], row[6]) for row in rows]
+                    )
+                    self._conn.commit()
+                    self.inserts += len(rows)
+                    self.commits += 1
+                except Exception as e:
+                    flush.error = e
+                    self._conn.rollback()
+                    raise
+                finally:
+                    flush.done.set()
+        flush.done.wait()
+        if flush.error:
+            raise flush.error
+
+    def update(self, job, detail=None):
+        """Record the job's current status (and its results once finished)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'UPDATE outbox SET status = ?, account = ?, error = ?, network = ?, debug_dir = ?, '
+                'started_at = ?, finished_at = ?, updated_at = ?, send_at = ?, failure = ?, retries = ?, '
+                'attempts = attempts + (CASE WHEN ? = \'running\' THEN 1 ELSE 0 END) '
+                'WHERE id = ?',
+                (job.status, job.account, job.error, json.dumps(job.network) if job.network else None,
+                 job.debug_dir, job.started_at, job.finished_at, now, job.send_at,
+                 json.dumps(job.failure) if job.failure else None, len(job.retries), job.status, job.id)
+            )
+            self._conn.execute(
+                'INSERT INTO outbox_events (job_id, status, at, detail) VALUES (?, ?, ?, ?)',
+                (job.id, job.status, now, detail or job.error)
+            )
+            self._conn.commit()
+
+    def unfinished(self):
+        """Rows a previous process accepted but never finished, oldest first.
+
+        A row still running when the process stopped counts as an interruption
+        (runs that ended in a deliberate retry left it queued, so they don't);
+        rows interrupted max_attempts times are marked failed instead, so a send
+        that keeps crashing the process can't loop forever.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, username, message, account, pinned, status, '
+                'interruptions + (CASE WHEN status = \'running\' THEN 1 ELSE 0 END), created_at, '
+                'idempotency_key, send_at, deadline, callback_url FROM outbox WHERE status IN (?, ?) '
+                'ORDER BY created_at',
+                UNFINISHED
+            ).fetchall()
+
+            resumable = []
+            for (job_id, username, message, account, pinned, status, interruptions, created_at, key, send_at,
+                 deadline, callback_url) in rows:
+                if interruptions >= self.max_attempts:
+                    error = f'Interrupted {interruptions} times, giving up'
+                    self._conn.execute(
+                        'UPDATE outbox SET status = ?, error = ?, finished_at = ?, updated_at = ?, interruptions = ? '
+                        'WHERE id = ?',
+                        ('failed', error, now, now, interruptions, job_id)
+                    )
+                    self._conn.execute(
+                        'INSERT INTO outbox_events (job_id, status, at, detail) VALUES (?, ?, ?, ?)',
+                        (job_id, 'failed', now, error)
+                    )
+                    continue
+                self._conn.execute(
+                    'UPDATE outbox SET status = ?, interruptions = ?, updated_at = ? WHERE id = ?',
+                    ('queued', interruptions, now, job_id)
+                )
+                self._conn.execute(
+                    'INSERT INTO outbox_events (job_id, status, at, detail) VALUES (?, ?, ?, ?)',
+                    (job_id, 'queued', now, f'resumed after restart (was {status})')
+                )
+                resumable.append({
+                    'id': job_id,
+                    'username': username,
+                    'message': message,
+                    # Only pinned jobs keep their account; others go back to the dispatcher
+                    'account': account if pinned else None,
+                    'created_at': created_at,
+                    'idempotency_key': key,
+                    'send_at': send_at,
+                    'deadline': deadline,
+                    'callback_url': callback_url,
+                })
+            self._conn.commit()
+        return resumable
+
+    def get(self, job_id):
+        """A job as GET /jobs/<id> shows it, for jobs no longer held in memory"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, status, username, account, created_at, started_at, finished_at, '
+                'network, debug_dir, error, attempts, send_at, failure, retries FROM outbox WHERE id = ?',
+                (job_id,)
+            ).fetchone()
+        if not row:
+            return None
+        (job_id, status, username, account, created_at, started_at, finished_at,
+         network, debug_dir, error, attempts, send_at, failure, retries) = row
+        data = {
+            'id': job_id,
+            'status': status,
+            'username': username,
+            'account': account,
+            'created_at': created_at,
+            'send_at': send_at,
+            'started_at': started_at,
+            'finished_at': finished_at,
+            'queue_seconds': round(started_at - created_at, 3) if started_at else None,
+            'run_seconds': round(finished_at - started_at, 3) if started_at and finished_at else None,
+            'attempts': attempts,
+        }
+        if network:
+            data['network'] = json.loads(network)
+        if debug_dir:
+            data['debug_dir'] = debug_dir
+        if error:
+            data['error'] = error
+        if failure:
+            data['failure'] = json.loads(failure)
+        if retries:
+            data['retries'] = retries
+        return data
+
+    def find_idempotency_key(self, key, since):
+        """Most recent send created with key after since, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, username, message, account, pinned FROM outbox '
+                'WHERE idempotency_key = ? AND created_at >= ? ORDER BY created_at DESC LIMIT 1',
+                (key, since)
+            ).fetchone()
+        if not row:
+            return None
+        job_id, username, message, account, pinned = row
+        return {'id': job_id, 'username': username, 'message': message, 'account': account if pinned else None}
+
+    def recent_starts(self, since):
+        """account -> start times of sends started after since (to restore rate limits)"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT account, started_at FROM outbox WHERE started_at >= ? AND account IS NOT NULL',
+                (since,)
+            ).fetchall()
+        starts = {}
+        for account, started_at in rows:
+            starts.setdefault(account, []).append(started_at)
+        return starts
+
+    def transitions(self, job_id):
+        """Every status change of a job, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT status, at, detail FROM outbox_events WHERE job_id = ? ORDER BY at, rowid',
+                (job_id,)
+            ).fetchall()
+        return [
+            dict({'status': status, 'at': at}, **({'detail': detail} if detail else {}))
+            for status, at, detail in rows
+        ]
+
+    def prune(self, retention_days=None):
+        """Delete finished sends (and their events) older than the retention period"""
+        retention_days = self.retention_days if retention_days is None else retention_days
+        cutoff = time.time() - retention_days * 86400
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM outbox_events WHERE job_id IN ('
+                ' SELECT id FROM outbox WHERE status NOT IN (?, ?) AND updated_at < ?)',
+                UNFINISHED + (cutoff,)
+            )
+            cursor = self._conn.execute(
+                'DELETE FROM outbox WHERE status NOT IN (?, ?) AND updated_at < ?',
+                UNFINISHED + (cutoff,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self):
+        """Row counts per status and group-commit efficiency"""
+        with self._lock:
+            counts = dict(self._conn.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall())
+        return {
+            'counts': counts,
+            'inserts': self.inserts,
+            'commits': self.commits,
+        }
+
+
+# Shared by every request in the process
+outbox = Outbox()
@@ -0,0 +1,93 @@
+"""
+Background popup handling for Instagram Bot
+An in-page observer dismisses "Not Now"/Close/Cancel dialogs as soon as they appear,
+so the bot never has to scan for them and pays nothing when there are none
+"""
+
+import json
+import threading
+
+# name -> CSS selector and (optional) exact button text; dialogs only, so we
+# never click an unrelated Close/Cancel control on the DM page
+POPUP_RULES = [
+    {'name': 'not_now', 'selector': '[role="dialog"] button, [role="dialog"] div[role="button"]', 'text': 'Not Now'},
+    {'name': 'close', 'selector': 'div[role="dialog"] svg[aria-label="Close"]', 'text': None},
+    {'name': 'close_button', 'selector': 'div[role="dialog"] button[aria-label="Close"]', 'text': None},
+    {'name': 'cancel', 'selector': 'div[role="dialog"] button', 'text': 'Cancel'},
+]
+
+BINDING_NAME = '__instabotPopupDismissed'
+
+OBSERVER_SCRIPT = """
+(() => {
+  if (window.__instabotPopupObserver) return;
+  window.__instabotPopupObserver = true;
+  const rules = %s;
+  let scheduled = false;
+
+  const visible = (el) => el.getClientRects().length > 0;
+  const check = () => {
+    scheduled = false;
+    for (const rule of rules) {
+      for (const el of document.querySelectorAll(rule.selector)) {
+        if (el.dataset.instabotDismissed) continue;
+        if (rule.text && (el.innerText || '').trim() !== rule.text) continue;
+        if (!visible(el)) continue;
+        el.dataset.instabotDismissed = '1';
+        // SVG icons have no click(); a bubbling event reaches the button's handler either way
+        el.dispatchEvent(new MouseEvent('click', {bubbles: true, cancelable: true, view: window}));
+        if (window.%s) window.%s(rule.name);
+      }
+    }
+  };
+  // Batch bursts of DOM mutations into one check (timers, unlike animation
+  // frames, also fire on pages that aren't in the foreground)
+  const schedule = () => {
+    if (scheduled) return;
+    scheduled = true;
+    setTimeout(check, 50);
+  };
+
+  const start = () => {
+    new MutationObserver(schedule).observe(document.documentElement, {childList: true, subtree: true});
+    schedule();
+  };
+  if (document.documentElement) start();
+  else document.addEventListener('DOMContentLoaded', start);
+})();
+""" % (json.dumps(POPUP_RULES), BINDING_NAME, BINDING_NAME)
+
+
+class PopupMonitor:
+    """Registers the popup observer on a context and counts dismissals per popup type"""
+
+    def __init__(self):
+        self.counts = {}
+        # The binding counts on the browser loop while stats() copies from Flask threads
+        self._lock = threading.Lock()
+        # page -> callback(name) of the job currently using that page
+        self._watchers = {}
+
+    async def attach(self, context):
+        """Install the observer on every current and future page of context"""
+        await context.expose_binding(BINDING_NAME, self._on_dismissed)
+        await context.add_init_script(OBSERVER_SCRIPT)
+
+    def _on_dismissed(self, source, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+        print(f"  [OK] Dismissed popup: {name}")
+        callback = self._watchers.get(source.get('page'))
+        if callback:
+            callback(name)
+
+    def watch(self, page, callback):
+        """Call callback(name) for every popup dismissed on page until unwatch()"""
+        self._watchers[page] = callback
+
+    def unwatch(self, page):
+        self._watchers.pop(page, None)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
@@ -0,0 +1,100 @@
+"""
+Readiness waits for Instagram Bot
+Waits on concrete page signals instead of fixed sleeps, bounded by a configurable timeout
+"""
+
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upper bound for any single readiness wait (milliseconds)
+READY_TIMEOUT_MS = int(os.getenv('READY_TIMEOUT_MS', '15000'))
+
+HOME_ICON_SELECTOR = 'svg[aria-label="Home"]'
+THREAD_URL_PATTERN = re.compile(r'/direct/t/')
+# Path of the login page only, so /m/login_fan or a ?next=/accounts/login/ query doesn't count
+LOGIN_URL_PATTERN = re.compile(r'^[a-z]+://[^/]+/accounts/login/')
+
+
+def _timeout(timeout):
+    # Callers with a deadline pass what is left of it; never wait longer than READY_TIMEOUT_MS
+    return READY_TIMEOUT_MS if timeout is None else min(timeout, READY_TIMEOUT_MS)
+
+
+async def wait_for_load(page, state='domcontentloaded', timeout=None):
+    """Wait for a page load state, returns False on timeout"""
+    try:
+        await page.wait_for_load_state(state, timeout=_timeout(timeout))
+        return True
+    except Exception:
+        return False
+
+
+async def wait_for_url(page, pattern, timeout=None):
+    """Wait until the page URL matches pattern (regex), returns False on timeout"""
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+    try:
+        await page.wait_for_url(pattern, wait_until='commit', timeout=_timeout(timeout))
+        return True
+    except Exception:
+        return False
+
+
+async def wait_for_thread(page, timeout=None):
+    """Wait for the /m/<username> redirect to land on /direct/t/ or the login page.
+
+    Returns 'thread', 'login' or None when neither happened in time.
+    """
+    either = re.compile(f'{THREAD_URL_PATTERN.pattern}|{LOGIN_URL_PATTERN.pattern}')
+    if not await wait_for_url(page, either, timeout):
+        return None
+    return 'login' if LOGIN_URL_PATTERN.search(page.url) else 'thread'
+
+
+async def wait_for_first(page, selectors, timeout=None, state='visible'):
+    """Wait until any of selectors is present, returns the matching selector or None"""
+    locator = page.locator(selectors[0])
+    for selector in selectors[1:]:
+        locator = locator.or_(page.locator(selector))
+    try:
+        await locator.first.wait_for(state=state, timeout=_timeout(timeout))
+    except Exception:
+        return None
+
+    for selector in selectors:
+        try:
+            if await page.locator(selector).first.is_visible():
+                return selector
+        except Exception:
+            continue
+    return None
+
+
+async def wait_for_home(page, timeout=None):
+    """Wait for the Home icon that is only shown to logged in users"""
+    return await wait_for_first(page, [HOME_ICON_SELECTOR], timeout) is not None
+
+
+async def wait_for_editable(element, timeout=None):
+    """Wait until an element (e.g. the message textbox) accepts input"""
+    try:
+        await element.wait_for_element_state('editable', timeout=_timeout(timeout))
+        return True
+    except Exception:
+        return False
+
+
+async def wait_for_cleared(page, element, timeout=None):
+    """Wait until Instagram empties the composer, which it does once a message is sent"""
+    try:
+        await page.wait_for_function(
+            '(el) => !(el.innerText || el.value || "").trim()',
+            arg=element,
+            timeout=_timeout(timeout)
+        )
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,268 @@
+"""
+Send scheduler for Instagram Bot API
+Paces sends per account with token buckets (per minute/hour/day), holds scheduled
+sends until their send_at time and projects when the queue will be drained
+"""
+
+import os
+import re
+import time
+import heapq
+import bisect
+import itertools
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Default sends per account per window; 0 means unlimited. Override per account
+# with IG_<NAME>_RATE_PER_MINUTE / _HOUR / _DAY
+RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', '0'))
+RATE_LIMIT_PER_HOUR = float(os.getenv('RATE_LIMIT_PER_HOUR', '0'))
+RATE_LIMIT_PER_DAY = float(os.getenv('RATE_LIMIT_PER_DAY', '0'))
+
+WINDOWS = {'minute': 60, 'hour': 3600, 'day': 86400}
+# How often jobs held back because their account is unavailable (e.g. logging in) are looked at again
+UNAVAILABLE_RECHECK_SECONDS = 0.5
+# Longest single wait in get(); far-future send_at times are reached in steps, since
+# Condition.wait() overflows past threading.TIMEOUT_MAX
+MAX_WAIT_SECONDS = 60
+_DEFAULT_LIMITS = {'minute': RATE_LIMIT_PER_MINUTE, 'hour': RATE_LIMIT_PER_HOUR, 'day': RATE_LIMIT_PER_DAY}
+
+
+def account_limits(name):
+    """Sends allowed per window for an account, from the environment"""
+    key = re.sub(r'[^A-Za-z0-9]', '_', name).upper()
+    return {
+        window: float(os.getenv(f'IG_{key}_RATE_PER_{window.upper()}', str(default)))
+        for window, default in _DEFAULT_LIMITS.items()
+    }
+
+
+class TokenBucket:
+    """`limit` tokens per `window` seconds; starts full, so a burst of `limit` is allowed"""
+
+    def __init__(self, limit, window, now=None):
+        self.capacity = limit
+        self.rate = limit / window
+        self.tokens = float(limit)
+        self.updated = now or time.time()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available"""
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def refund(self, now):
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def copy(self):
+        bucket = TokenBucket.__new__(TokenBucket)
+        bucket.__dict__.update(self.__dict__)
+        return bucket
+
+
+class RateLimiter:
+    """All token buckets of one account; a send needs a token from each"""
+
+    def __init__(self, limits, now=None):
+        self.limits = {window: limit for window, limit in limits.items() if limit > 0}
+        self.buckets = {window: TokenBucket(limit, WINDOWS[window], now) for window, limit in self.limits.items()}
+
+    def wait_time(self, now):
+        return max([bucket.wait_time(now) for bucket in self.buckets.values()] + [0])
+
+    def take(self, now):
+        for bucket in self.buckets.values():
+            bucket.take(now)
+
+    def refund(self, now):
+        """Give back the tokens of a send that didn't happen on this account"""
+        for bucket in self.buckets.values():
+            bucket.refund(now)
+
+    def seed(self, times, now=None):
+        """Spend the tokens that sends at the given times (e.g. before a restart) used up"""
+        now = now or time.time()
+        for window, bucket in self.buckets.items():
+            used = sum(1 for t in times if now - t < WINDOWS[window])
+            bucket.tokens = max(0.0, bucket.capacity - used)
+            bucket.updated = now
+
+    def copy(self):
+        limiter = RateLimiter.__new__(RateLimiter)
+        limiter.limits = self.limits
+        limiter.buckets = {window: bucket.copy() for window, bucket in self.buckets.items()}
+        return limiter
+
+    def stats(self, now):
+        return {
+            window: {
+                'limit': bucket.capacity,
+                'available': round(min(bucket.capacity, bucket.tokens + (now - bucket.updated) * bucket.rate), 2),
+            }
+            for window, bucket in self.buckets.items()
+        }
+
+
+class Scheduler:
+    """Drop-in replacement for the job queue's FIFO that releases a job only when
+    it is due (send_at) and its account has a token.
+
+    Jobs are kept in due order, but a job blocked by its account's limits
+    doesn't hold back jobs for other accounts. Unpinned jobs take the first
+    account from candidates() that can send soonest; the chosen account is
+    written to job.account. Accounts for which available(account) is False
+    (e.g. logging in) get no jobs, so no worker blocks waiting for them.
+    """
+
+    def __init__(self, candidates, limits_for=account_limits, available=None):
+        self.candidates = candidates
+        self.limits_for = limits_for
+        self.available = available or (lambda account: True)
+        self.limiters = {}
+        self._jobs = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _limiter(self, account):
+        if account not in self.limiters:
+            self.limiters[account] = RateLimiter(self.limits_for(account))
+        return self.limiters[account]
+
+    def seed(self, account, times):
+        """Account for sends made before a restart so limits hold across it"""
+        with self._cond:
+            self._limiter(account).seed(times)
+
+    def put(self, job):
+        due = job.send_at or job.created_at
+        with self._cond:
+            bisect.insort(self._jobs, (due, next(self._seq), job), key=lambda item: item[:2])
+            self._cond.notify_all()
+
+    def qsize(self):
+        with self._cond:
+            return len(self._jobs)
+
+    def refund(self, account):
+        """Return the tokens get() took for a job that is moving to another account"""
+        with self._cond:
+            self._limiter(account).refund(time.time())
+            self._cond.notify_all()
+
+    def _choose(self, job, now, limiters, available=None):
+        """(account, seconds until it can send) for job (None: a new unpinned job).
+
+        With available, unavailable accounts are skipped; (None, None) if none is left.
+        """
+        available = available or (lambda account: True)
+        if job is not None and job.account:
+            if not available(job.account):
+                return None, None
+            return job.account, limiters(job.account).wait_time(now)
+        best = (None, None)
+        for account in self.candidates():
+            if not available(account):
+                continue
+            wait = limiters(account).wait_time(now)
+            if best[0] is None or wait < best[1]:
+                best = (account, wait)
+            if wait <= 0:
+                break
+        return best
+
+    def get(self):
+        """Block until some job may run now, take its tokens and return it"""
+        with self._cond:
+            while True:
+                now = time.time()
+                wake = None
+                for index, (due, _, job) in enumerate(self._jobs):
+                    deadline = getattr(job, 'deadline', None)
+                    if deadline is not None and deadline <= now:
+                        # Too late to send; let the worker report it right away, without a token
+                        del self._jobs[index]
+                        return job
+                    if due > now:
+                        # Everything after this is due even later
+                        wake = due if wake is None else min(wake, due)
+                        break
+                    account, wait = self._choose(job, now, self._limiter, self.available)
+                    if account is None:
+                        # Nothing frees the account from here, so look again shortly
+                        wait = UNAVAILABLE_RECHECK_SECONDS
+                    elif wait <= 0:
+                        del self._jobs[index]
+                        self._limiter(account).take(now)
+                        job.account = account
+                        return job
+                    wake = now + wait if wake is None else min(wake, now + wait)
+                    if deadline is not None:
+                        wake = min(wake, deadline)
+                self._cond.wait(None if wake is None else min(MAX_WAIT_SECONDS, max(0.01, wake - now)))
+
+    def _simulate(self, jobs, now, limiters, workers, run_seconds):
+        """(start time, held back by a rate limit) of each (due, seq, job) entry, in order"""
+        limiters = {account: limiter.copy() for account, limiter in limiters.items()}
+
+        def limiter(account):
+            if account not in limiters:
+                limiters[account] = RateLimiter(self.limits_for(account), now)
+            return limiters[account]
+
+        slots = [now] * max(1, workers)
+        starts = []
+        for due, _, job in jobs:
+            start = max(due, slots[0])
+            account, wait = self._choose(job, start, limiter)
+            start += max(0, wait)
+            limiter(account).take(start)
+            heapq.heapreplace(slots, start + run_seconds)
+            starts.append((start, wait > 0))
+        return starts
+
+    def projection(self, workers=1, run_seconds=0):
+        """Simulate the current queue: when each job can start given the limits,
+        send_at times, `workers` parallel slots and `run_seconds` per send.
+
+        wait_seconds is how long an unpinned send submitted now would wait,
+        which (unlike drain_seconds) isn't stretched by sends scheduled far ahead.
+        """
+        with self._cond:
+            now = time.time()
+            jobs = list(self._jobs)
+            limiters = {account: limiter.copy() for account, limiter in self.limiters.items()}
+
+        starts = self._simulate(jobs, now, limiters, workers, run_seconds)
+        drained = max([start + run_seconds for start, _ in starts] + [now])
+
+        # A new job is due now, so it queues behind everything already due
+        position = bisect.bisect_right([due for due, _, _ in jobs], now)
+        probe = jobs[:position] + [(now, None, None)]
+        wait = self._simulate(probe, now, limiters, workers, run_seconds)[-1][0] - now
+
+        return {
+            'waiting': len(jobs),
+            'scheduled': sum(1 for due, _, job in jobs if job.send_at and due > now),
+            'rate_limited': sum(1 for _, limited in starts if limited),
+            'run_seconds': round(run_seconds, 3),
+            'wait_seconds': round(wait, 3),
+            'drain_seconds': round(drained - now, 3),
+            'drain_at': drained,
+        }
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            return {account: limiter.stats(now) for account, limiter in self.limiters.items() if limiter.limits}
@@ -0,0 +1,171 @@
+"""
+Selector resolution for Instagram Bot
+Races all fallback selectors for an element at once and learns which one wins
+"""
+
+import os
+import json
+import time
+import atexit
+import asyncio
+import threading
+from dotenv import load_dotenv
+from metrics import SELECTOR_FALLBACK_DEPTH
+
+load_dotenv()
+
+SELECTOR_STATS_FILE = os.getenv('SELECTOR_STATS_FILE', 'selector_stats.json')
+SELECTOR_TIMEOUT_MS = int(os.getenv('SELECTOR_TIMEOUT_MS', '5000'))
+
+# Selectors that failed this many times in a row are tried last
+DEMOTE_AFTER_FAILURES = 3
+# Minimum seconds between writes of the stats file
+SAVE_INTERVAL = 30
+
+
+class SelectorResolver:
+    """Resolves logical elements (e.g. 'message_input') from a list of candidate selectors.
+
+    All candidates are raced in a single wait. When several match, the one that
+    won most recently is preferred, and selectors that keep losing are demoted.
+    Stats survive restarts through a small JSON file.
+    """
+
+    def __init__(self, stats_file=SELECTOR_STATS_FILE):
+        self.stats_file = stats_file
+        self.elements = {}
+        self._lock = threading.Lock()
+        # Writes run on an executor thread; never two at once on the same .tmp file
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.stats_file, 'r', encoding='utf-8') as f:
+                self.elements = json.load(f)
+        except (OSError, ValueError):
+            self.elements = {}
+
+    def _due(self, force=False):
+        """Stats as JSON if a save is due (rate limited unless force=True), else None"""
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._last_save < SAVE_INTERVAL):
+                return None
+            self._dirty = False
+            self._last_save = time.time()
+            return json.dumps(self.elements, indent=2)
+
+    def _write(self, data):
+        tmp_file = f'{self.stats_file}.tmp'
+        with self._write_lock:
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_file, self.stats_file)
+            except OSError as e:
+                print(f"[WARNING] Could not save selector stats: {e}")
+
+    def save(self, force=False):
+        """Persist stats to disk (rate limited unless force=True)"""
+        data = self._due(force)
+        if data is not None:
+            self._write(data)
+
+    def _element(self, name):
+        return self.elements.setdefault(name, {'hits': 0, 'misses': 0, 'not_found': 0, 'selectors': {}})
+
+    def order(self, name, selectors):
+        """Candidate selectors sorted by preference: recent winner first, demoted last"""
+        with self._lock:
+            stats = self._element(name)['selectors']
+
+            def key(item):
+                index, selector = item
+                s = stats.get(selector, {})
+                demoted = s.get('consecutive_failures', 0) >= DEMOTE_AFTER_FAILURES
+                return (demoted, -s.get('last_win', 0), index)
+
+            return [selector for _, selector in sorted(enumerate(selectors), key=key)]
+
+    def _record(self, name, ordered, winner):
+        with self._lock:
+            element = self._element(name)
+            stats = element['selectors']
+
+            if winner is None:
+                element['not_found'] += 1
+            elif winner == ordered[0]:
+                element['hits'] += 1
+            else:
+                element['misses'] += 1
+
+            for selector in ordered:
+                s = stats.setdefault(selector, {'wins': 0, 'failures': 0, 'consecutive_failures': 0, 'last_win': 0})
+                if selector == winner:
+                    s['wins'] += 1
+                    s['consecutive_failures'] = 0
+                    s['last_win'] = time.time()
+                    break
+                # Every preferred selector ahead of the winner (or all, if none matched) lost
+                s['failures'] += 1
+                s['consecutive_failures'] += 1
+
+            self._dirty = True
+
+    async def resolve(self, page, name, selectors, timeout=SELECTOR_TIMEOUT_MS, state='visible'):
+        """Wait for the first of selectors to match; returns (element_handle, selector) or (None, None)"""
+        ordered = self.order(name, selectors)
+
+        # Race every candidate in a single wait instead of one timeout per selector
+        combined = page.locator(ordered[0])
+        for selector in ordered[1:]:
+            combined = combined.or_(page.locator(selector))
+
+        winner = None
+        handle = None
+        try:
+            await combined.first.wait_for(state=state, timeout=timeout)
+            # Several may match; take the most preferred one
+            for selector in ordered:
+                locator = page.locator(selector).first
+                try:
+                    if await locator.count() and (state != 'visible' or await locator.is_visible()):
+                        handle = await locator.element_handle(timeout=timeout)
+                        winner = selector
+                        break
+                except Exception:
+                    continue
+        except Exception:
+            pass
+
+        self._record(name, ordered, winner)
+        data = self._due()
+        if data is not None:
+            # Written on the default executor so the loop never waits on the disk
+            asyncio.get_running_loop().run_in_executor(None, self._write, data)
+        SELECTOR_FALLBACK_DEPTH.observe(ordered.index(winner) if winner else len(ordered), element=name)
+        return handle, winner
+
+    def report(self):
+        """Hit/miss counts per logical element"""
+        with self._lock:
+            return {
+                name: {
+                    'hits': element['hits'],
+                    'misses': element['misses'],
+                    'not_found': element['not_found'],
+                    'preferred': max(
+                        element['selectors'].items(),
+                        key=lambda item: item[1].get('last_win', 0),
+                        default=(None, None)
+                    )[0],
+                }
+                for name, element in self.elements.items()
+            }
+
+
+# Shared by every InstagramBot in the process
+resolver = SelectorResolver()
+atexit.register(resolver.save, True)
@@ -0,0 +1,135 @@
+"""
+Browserless session health probe for Instagram Bot
+Checks the cookies saved in an account's storage-state file with a plain HTTP request
+"""
+
+import os
+import json
+import time
+import threading
+import requests
+from dotenv import load_dotenv
+from accounts import INSTAGRAM_BASE_URL
+
+load_dotenv()
+
+SESSION_PROBE_ENABLED = os.getenv('SESSION_PROBE', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+# Seconds a probe result is reused before asking Instagram again
+SESSION_PROBE_TTL = int(os.getenv('SESSION_PROBE_TTL', '60'))
+SESSION_PROBE_TIMEOUT = float(os.getenv('SESSION_PROBE_TIMEOUT', '3'))
+
+# Small JSON endpoint that only answers for logged in sessions
+PROBE_URL = f'{INSTAGRAM_BASE_URL}/api/v1/accounts/edit/web_form_data/'
+# Public web app id the instagram.com frontend sends with API calls
+IG_APP_ID = '936619743392459'
+
+
+def _load_cookies(state_file):
+    """Cookies from a Playwright storage-state file, or None if there is none"""
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('cookies', [])
+    except (OSError, ValueError):
+        return None
+
+
+class SessionProbe:
+    """Cached per-account answer to "is this saved session still logged in?".
+
+    valid is True/False when Instagram gave a clear answer and None when it
+    couldn't be determined (network error, rate limit), which callers should
+    treat as "try the browser".
+    """
+
+    def __init__(self, ttl=SESSION_PROBE_TTL, timeout=SESSION_PROBE_TIMEOUT, enabled=SESSION_PROBE_ENABLED):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.enabled = enabled
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def _state_mtime(self, account):
+        try:
+            return os.path.getmtime(account.state_file)
+        except OSError:
+            return None
+
+    def check(self, account, force=False):
+        """Probe result for account, reusing a cached one while fresh"""
+        mtime = self._state_mtime(account)
+        with self._lock:
+            cached_mtime, cached = self._results.get(account.name, (None, None))
+        # A new login rewrites the state file, so its mtime is part of the cache key
+        if (cached and not force and cached_mtime == mtime
+                and time.time() - cached['checked_at'] < self.ttl):
+            return cached
+
+        result = self._probe(account)
+        with self._lock:
+            self._results[account.name] = (mtime, result)
+        return result
+
+    def _probe(self, account):
+        started = time.time()
+        result = {'valid': None, 'reason': None, 'checked_at': started, 'latency_ms': 0}
+
+        if not self.enabled:
+            result['reason'] = 'disabled'
+            return result
+
+        cookies = _load_cookies(account.state_file)
+        if cookies is None:
+            result.update(valid=False, reason='no_state_file')
+            return result
+
+        session_cookie = next((c for c in cookies if c.get('name') == 'sessionid'), None)
+        if not session_cookie or not session_cookie.get('value'):
+            result.update(valid=False, reason='no_session_cookie')
+            return result
+        expires = session_cookie.get('expires', -1)
+        if expires not in (None, -1) and expires < time.time():
+            result.update(valid=False, reason='session_cookie_expired')
+            return result
+
+        http = requests.Session()
+        csrf_token = ''
+        for cookie in cookies:
+            http.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+            if cookie['name'] == 'csrftoken':
+                csrf_token = cookie['value']
+
+        try:
+            response = http.get(
+                PROBE_URL,
+                headers={
+                    'X-IG-App-ID': IG_APP_ID,
+                    'X-CSRFToken': csrf_token,
+                    'X-Requested-With': 'XMLHttpRequest',
+                    'Referer': f'{INSTAGRAM_BASE_URL}/',
+                },
+                allow_redirects=False,
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            result['reason'] = f'probe_error: {e.__class__.__name__}'
+            return result
+        finally:
+            result['latency_ms'] = round((time.time() - started) * 1000, 1)
+            http.close()
+
+        location = response.headers.get('Location', '')
+        if response.status_code == 200 and 'form_data' in response.text:
+            result.update(valid=True, reason='ok')
+        elif response.status_code in (401, 403) or 'login' in location or 'login_required' in response.text:
+            result.update(valid=False, reason='login_required')
+        else:
+            result['reason'] = f'http_{response.status_code}'
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {name: result for name, (_, result) in self._results.items()}
+
+
+# Shared by every request in the process
+session_probe = SessionProbe()
@@ -14,6 +14,7 @@ import re
 import platform
 import urllib.request
 import stat
+import argparse
 import requests
 from threading import Thread
 from pathlib import Path
@@ -28,6 +29,11 @@ if sys.stderr.encoding != 'utf-8':
 # Load environment variables
 load_dotenv()
 
+# Port app.py listens on (see PORT in app.py)
+PORT = int(os.getenv('PORT', '5001'))
+# Run this many app.py workers behind supervisor.py instead of a single app.py (0 = off)
+SUPERVISOR_WORKERS = int(os.getenv('SUPERVISOR_WORKERS', '0'))
+
 # Import auto-update module
 try:
     from auto_update import check_and_update
@@ -38,6 +44,7 @@ except ImportError:
 # Track processes for cleanup
 flask_process = None
 tunnel_process = None
+workers = SUPERVISOR_WORKERS
 
 def get_cloudflared_path():
     """Get or download cloudflared binary"""
@@ -157,11 +164,16 @@ def copy_to_clipboard(text):
         return False
 
 def run_flask():
-    """Run Flask server"""
+    """Run Flask server (or the supervisor and its workers)"""
     global flask_process
-    print("[START] Starting Flask server...")
+    if workers:
+        print(f"[START] Starting supervisor with {workers} workers...")
+        command = ['python', 'supervisor.py', '--workers', str(workers), '--port', str(PORT)]
+    else:
+        print("[START] Starting Flask server...")
+        command = ['python', 'app.py']
     flask_process = subprocess.Popen(
-        ['python', 'app.py'],
+        command,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         text=True,
@@ -187,7 +199,7 @@ def start_tunnel():
         
         # Start cloudflared tunnel
         tunnel_process = subprocess.Popen(
-            [cloudflared, 'tunnel', '--url', 'http://localhost:5001'],
+            [cloudflared, 'tunnel', '--url', f'http://localhost:{PORT}'],
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -240,10 +252,18 @@ def start_tunnel():
                     except Exception as webhook_error:
                         print(f"[WARNING] Webhook registration failed: {webhook_error}")
                     
+                    # app.py POSTs send results here when a request has no callback_url of its own
+                    if os.getenv('WEBHOOK_URL'):
+                        print(f"[WEBHOOK] Send results will be POSTed to {os.getenv('WEBHOOK_URL')}")
+                    
                     print(f"\n[API] API Endpoints:")
                     print(f"   • POST {url}/login")
                     print(f"   • POST {url}/send")
+                    print(f"   • GET  {url}/jobs/<job_id>")
                     print(f"   • GET  {url}/health")
+                    if workers:
+                        print(f"   • GET  {url}/workers")
+                    print(f"   • PUT  {url}/webhook")
                     print(f"\n{'='*60}\n")
                     print(f"\n[TUNNEL] Tunnel is active. Press Ctrl+C to stop.\n")
             
@@ -259,7 +279,7 @@ def start_tunnel():
         print(f"\n[HELP] Troubleshooting:")
         print(f"   1. Check internet connection")
         print(f"   2. Try running: python app.py (to test Flask alone)")
-        print(f"\n   You can still access the API locally at: http://localhost:5001\n")
+        print(f"\n   You can still access the API locally at: http://localhost:{PORT}\n")
 
 def cleanup(signum=None, frame=None):
     """Cleanup processes on exit"""
@@ -279,7 +299,8 @@ def cleanup(signum=None, frame=None):
         print("Stopping Flask server...")
         flask_process.terminate()
         try:
-            flask_process.wait(timeout=2)
+            # The supervisor stops its workers before exiting
+            flask_process.wait(timeout=10 if workers else 2)
         except:
             flask_process.kill()
     
@@ -288,6 +309,12 @@ def cleanup(signum=None, frame=None):
 
 def main():
     """Main entry point"""
+    global workers
+    parser = argparse.ArgumentParser(description='Start the Instagram Bot API behind a Cloudflare tunnel')
+    parser.add_argument('--workers', type=int, default=SUPERVISOR_WORKERS,
+                        help='run N app.py workers behind one load-balancing supervisor (0 = single process)')
+    workers = parser.parse_args().workers
+    
     # Check for updates first
     if AUTO_UPDATE_AVAILABLE:
         try:
@@ -0,0 +1,675 @@
+"""
+Multi-process supervisor for Instagram Bot API
+Runs several app.py workers, each with its own browser and optionally its own accounts,
+restarts them when they crash or stop answering, and load-balances the API across them
+on one port (the one the tunnel points at)
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import signal
+import argparse
+import threading
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from flask import Flask, Response, request, jsonify, stream_with_context
+from dotenv import load_dotenv
+from accounts import load_accounts
+
+load_dotenv()
+
+# Port the supervisor listens on; worker i listens on PORT + 1 + i
+PORT = int(os.getenv('PORT', '5001'))
+# Worker processes to run (start.py runs a single app.py when this is 0)
+SUPERVISOR_WORKERS = int(os.getenv('SUPERVISOR_WORKERS', '0'))
+# Give each worker its own share of IG_ACCOUNTS instead of every worker running every account
+SUPERVISOR_SPLIT_ACCOUNTS = os.getenv('SUPERVISOR_SPLIT_ACCOUNTS', 'true').lower() == 'true'
+# How often workers are checked (seconds) and how many missed checks in a row restart one
+SUPERVISOR_CHECK_SECONDS = float(os.getenv('SUPERVISOR_CHECK_SECONDS', '5'))
+SUPERVISOR_MAX_FAILED_CHECKS = int(os.getenv('SUPERVISOR_MAX_FAILED_CHECKS', '3'))
+# Time a new worker gets to launch its browser before missed checks count (seconds)
+SUPERVISOR_START_GRACE_SECONDS = float(os.getenv('SUPERVISOR_START_GRACE_SECONDS', '60'))
+# Longest wait before restarting a worker that keeps crashing (doubles from 1s per crash)
+SUPERVISOR_RESTART_MAX_SECONDS = float(os.getenv('SUPERVISOR_RESTART_MAX_SECONDS', '60'))
+# Timeout for requests forwarded to a worker (seconds); /login can take minutes
+SUPERVISOR_PROXY_TIMEOUT_SECONDS = float(os.getenv('SUPERVISOR_PROXY_TIMEOUT_SECONDS', '300'))
+
+# job id -> worker entries kept for routing GET /jobs/<id> and /traces/<id>
+JOB_ROUTES = 100000
+
+# Not passed through the proxy in either direction
+HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-length', 'content-encoding', 'host'}
+
+app = Flask(__name__)
+
+
+def python_command():
+    """Interpreter for app.py; in the PyInstaller build sys.executable is the bundled binary, not Python"""
+    if getattr(sys, 'frozen', False) or not sys.executable:
+        return 'python'
+    return sys.executable
+
+
+def worker_path(path, index):
+    """Per-worker file name: worker 0 keeps the configured one so a single-process outbox is resumed"""
+    if index == 0:
+        return path
+    base, ext = os.path.splitext(path)
+    return f'{base}_{index}{ext}'
+
+
+class Worker:
+    """One app.py process and what the supervisor knows about it"""
+
+    def __init__(self, index, port, accounts=None):
+        self.index = index
+        self.port = port
+        # Accounts this worker runs (None = every configured account)
+        self.accounts = accounts
+        self.url = f'http://127.0.0.1:{port}'
+        self.process = None
+        self.started_at = None
+        self.restarts = 0
+        # Crashes since the worker last passed a check, for the restart backoff
+        self.crashes = 0
+        self.restart_at = None
+        self.alive = False
+        self.ready = False
+        self.failed_checks = 0
+        self.last_check = None
+        # Last /ready answer: in flight, waiting, projected wait, ...
+        self.load = {}
+        # Sends routed here since the last check, so a burst doesn't all pick the same worker
+        self.routed_since_check = 0
+        self.routed = 0
+        self.proxy_errors = 0
+        # Version of the supervisor's webhook setting this process has applied
+        self.webhook_version = 0
+
+    def serves(self, account):
+        return account is None or self.accounts is None or account in self.accounts
+
+    def env(self):
+        env = dict(os.environ, PORT=str(self.port), PYTHONUNBUFFERED='1')
+        env['OUTBOX_DB'] = worker_path(os.getenv('OUTBOX_DB', 'outbox.db'), self.index)
+        env['TRACE_FILE'] = worker_path(os.getenv('TRACE_FILE', 'traces.jsonl'), self.index)
+        env['THREAD_CACHE_DB'] = worker_path(os.getenv('THREAD_CACHE_DB', 'thread_cache.db'), self.index)
+        env['SELECTOR_STATS_FILE'] = worker_path(os.getenv('SELECTOR_STATS_FILE', 'selector_stats.json'), self.index)
+        env['DEBUG_DIR'] = worker_path(os.getenv('DEBUG_DIR', 'debug'), self.index)
+        if self.accounts is not None:
+            env['IG_ACCOUNTS'] = ','.join(self.accounts)
+        return env
+
+    def score(self):
+        """Lower is better: ready workers first, then the shortest projected wait and queue"""
+        return (
+            not self.ready,
+            self.load.get('projected_wait_seconds', 0),
+            self.load.get('waiting', 0) + self.load.get('in_flight', 0) + self.routed_since_check,
+        )
+
+    def stats(self):
+        return {
+            'index': self.index,
+            'url': self.url,
+            'pid': self.process.pid if self.process else None,
+            'accounts': self.accounts,
+            'alive': self.alive,
+            'ready': self.ready,
+            'uptime_seconds': round(time.time() - self.started_at, 1) if self.started_at and self.alive else None,
+            'restarts': self.restarts,
+            'failed_checks': self.failed_checks,
+            'last_check': self.last_check,
+            'load': self.load,
+            'routed': self.routed,
+            'proxy_errors': self.proxy_errors,
+        }
+
+
+class Supervisor:
+    """Starts, checks and restarts the workers and picks one for each request"""
+
+    def __init__(self, count, port=PORT, split_accounts=SUPERVISOR_SPLIT_ACCOUNTS):
+        self.port = port
+        self.workers = [
+            Worker(index, port + 1 + index, accounts)
+            for index, accounts in enumerate(self._assign_accounts(count, split_accounts))
+        ]
+        self.jobs = OrderedDict()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(4, count), pool_maxsize=32)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._stopping = False
+        # Last accepted PUT /webhook, replayed to workers that (re)start after it
+        self.webhook = None
+        self.webhook_version = 0
+
+    def _assign_accounts(self, count, split_accounts):
+        names = [n.strip() for n in os.getenv('IG_ACCOUNTS', '').split(',') if n.strip()]
+        if not split_accounts or not names:
+            if count > 1:
+                print(f"[WARNING] {count} workers share {', '.join(load_accounts())}: "
+                      f"rate limits apply per worker, so each account may send up to {count}x as fast")
+            return [None] * count
+        if len(names) < count:
+            print(f"[WARNING] {len(names)} account(s) for {count} workers; some workers share an account")
+            return [[names[index % len(names)]] for index in range(count)]
+        return [names[index::count] for index in range(count)]
+
+    # -- processes -------------------------------------------------------
+
+    def start(self):
+        for worker in self.workers:
+            self._spawn(worker)
+        threading.Thread(target=self._monitor, name='supervisor-monitor', daemon=True).start()
+
+    def _spawn(self, worker):
+        accounts = ', '.join(worker.accounts) if worker.accounts else 'all accounts'
+        print(f"[SUPERVISOR] Starting worker {worker.index} on port {worker.port} ({accounts})")
+        worker.process = subprocess.Popen(
+            [python_command(), 'app.py'],
+            env=worker.env(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+        worker.started_at = time.time()
+        worker.restart_at = None
+        worker.alive = True
+        worker.ready = False
+        worker.failed_checks = 0
+        worker.webhook_version = 0
+        threading.Thread(target=self._pipe_output, args=(worker, worker.process), daemon=True).start()
+
+    def _pipe_output(self, worker, process):
+        for line in process.stdout:
+            print(f"[Worker {worker.index}] {line.rstrip()}")
+
+    def _kill(self, worker):
+        process = worker.process
+        if not process or process.poll() is not None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    def _schedule_restart(self, worker, why):
+        delay = min(SUPERVISOR_RESTART_MAX_SECONDS, 2 ** worker.crashes)
+        worker.crashes += 1
+        worker.alive = False
+        worker.ready = False
+        worker.restart_at = time.time() + delay
+        print(f"[SUPERVISOR] Worker {worker.index} {why}; restarting in {delay:.0f}s")
+
+    def _monitor(self):
+        while not self._stopping:
+            for worker in self.workers:
+                if self._stopping:
+                    break
+                self._check(worker)
+            time.sleep(SUPERVISOR_CHECK_SECONDS)
+
+    def _check(self, worker):
+        now = time.time()
+        if worker.restart_at is not None:
+            if now >= worker.restart_at:
+                worker.restarts += 1
+                self._spawn(worker)
+            return
+        code = worker.process.poll()
+        if code is not None:
+            self._schedule_restart(worker, f'exited with code {code}')
+            return
+
+        worker.last_check = now
+        try:
+            # /ready is the cheap check: 200 accepting, 429/503 alive but overloaded
+            response = self.session.get(f'{worker.url}/ready', timeout=SUPERVISOR_CHECK_SECONDS)
+            data = response.json()
+        except (requests.RequestException, ValueError):
+            worker.ready = False
+            if now - worker.started_at < SUPERVISOR_START_GRACE_SECONDS:
+                return
+            worker.failed_checks += 1
+            if worker.failed_checks >= SUPERVISOR_MAX_FAILED_CHECKS:
+                self._kill(worker)
+                self._schedule_restart(worker, f'missed {worker.failed_checks} health checks')
+            return
+        worker.failed_checks = 0
+        worker.crashes = 0
+        worker.ready = response.status_code == 200
+        worker.routed_since_check = 0
+        if worker.ready:
+            worker.load = {key: data.get(key) for key in ('in_flight', 'waiting', 'projected_wait_seconds')}
+            self._sync_webhook(worker)
+
+    def set_webhook(self, incoming, results):
+        """Remember a PUT /webhook that workers accepted; those that answered 2xx have it"""
+        if not any(response is not None and response.ok for _, response in results):
+            return
+        with self._lock:
+            self.webhook_version += 1
+            self.webhook = incoming
+            for worker, response in results:
+                if response is not None and response.ok:
+                    worker.webhook_version = self.webhook_version
+                else:
+                    worker.webhook_version = 0
+
+    def _sync_webhook(self, worker):
+        """Send the last webhook setting to a worker that hasn't applied it (e.g. after a restart)"""
+        with self._lock:
+            incoming, version = self.webhook, self.webhook_version
+        if incoming is None or worker.webhook_version == version:
+            return
+        try:
+            response = self.forward(worker, incoming, timeout=SUPERVISOR_CHECK_SECONDS)
+        except requests.RequestException:
+            return
+        if response.ok:
+            print(f"[SUPERVISOR] Restored webhook setting on worker {worker.index}")
+            worker.webhook_version = version
+
+    def stop(self):
+        self._stopping = True
+        for worker in self.workers:
+            if worker.process and worker.process.poll() is None:
+                worker.process.terminate()
+        for worker in self.workers:
+            if worker.process:
+                try:
+                    worker.process.wait(timeout=3)
+                except subprocess.TimeoutExpired:
+                    worker.process.kill()
+
+    # -- routing ---------------------------------------------------------
+
+    def candidates(self, account=None, key=None):
+        """Live workers for a request, best first.
+
+        A request with an Idempotency-Key only goes to its home worker, since
+        only that worker remembers the key; none while the home worker is down.
+        """
+        if key:
+            home = self.home(account, key)
+            return [home] if home and home.alive else []
+        return sorted([w for w in self.workers if w.alive and w.serves(account)], key=Worker.score)
+
+    def home(self, account, key):
+        """The one worker that handles an Idempotency-Key, from those running the account"""
+        serving = [w for w in self.workers if w.serves(account)]
+        if not serving:
+            return None
+        return serving[zlib.crc32(key.encode()) % len(serving)]
+
+    def login_targets(self, account=None):
+        """One live worker per set of accounts to log in; the others reload the saved session from disk"""
+        groups = OrderedDict()
+        for worker in self.workers:
+            if worker.serves(account):
+                key = tuple(worker.accounts) if worker.accounts is not None else None
+                groups.setdefault(key, []).append(worker)
+        if account:
+            # Every worker running the account shares its state file, so one login is enough
+            groups = {account: [w for group in groups.values() for w in group]}
+        targets = []
+        for group in groups.values():
+            alive = sorted([w for w in group if w.alive], key=Worker.score)
+            if alive:
+                targets.append(alive[0])
+        return targets
+
+    def remember(self, job_ids, worker):
+        with self._lock:
+            for job_id in job_ids:
+                self.jobs[job_id] = worker.index
+                self.jobs.move_to_end(job_id)
+            while len(self.jobs) > JOB_ROUTES:
+                self.jobs.popitem(last=False)
+
+    def worker_for(self, job_id):
+        with self._lock:
+            index = self.jobs.get(job_id)
+        return self.workers[index] if index is not None else None
+
+    def forward(self, worker, incoming=None, stream=False, timeout=SUPERVISOR_PROXY_TIMEOUT_SECONDS):
+        """Send the current Flask request (or an incoming() snapshot of it) on to a worker.
+
+        Raises requests.RequestException if the worker can't be reached.
+        """
+        incoming = incoming or outgoing_request()
+        try:
+            return self.session.request(
+                incoming['method'], worker.url + incoming['path'], params=incoming['params'],
+                data=incoming['data'], headers=incoming['headers'], stream=stream, timeout=timeout
+            )
+        except requests.RequestException:
+            worker.proxy_errors += 1
+            raise
+
+    def stats(self):
+        with self._lock:
+            routes = len(self.jobs)
+        return {
+            'port': self.port,
+            'workers': [worker.stats() for worker in self.workers],
+            'alive': sum(worker.alive for worker in self.workers),
+            'ready': sum(worker.ready for worker in self.workers),
+            'job_routes': routes,
+        }
+
+
+supervisor = None
+
+
+def outgoing_request():
+    """What forward() sends for the current Flask request (usable from other threads)"""
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+    headers['X-Forwarded-For'] = request.remote_addr or ''
+    return {
+        'method': request.method,
+        'path': request.path,
+        'params': [(k, v) for k, v in request.args.items(multi=True) if k != 'worker'],
+        'data': request.get_data(),
+        'headers': headers,
+    }
+
+
+def relay(response, worker):
+    """Flask response for a worker's answer"""
+    headers = [(k, v) for k, v in response.headers.items() if k.lower() not in HOP_HEADERS]
+    headers.append(('X-Instabot-Worker', str(worker.index)))
+    return Response(response.content, status=response.status_code, headers=headers)
+
+
+def unavailable(message='No worker is available'):
+    response = jsonify({'status': 'error', 'message': message})
+    response.headers['Retry-After'] = str(int(SUPERVISOR_CHECK_SECONDS))
+    return response, 503
+
+
+def request_json():
+    """The JSON body ({} without one), or None when it isn't an object with a string account"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return None
+    account = data.get('account')
+    if account is not None and not isinstance(account, str):
+        return None
+    return data
+
+
+def invalid_json():
+    return jsonify({
+        'status': 'error',
+        'message': 'JSON body must be an object and account a string'
+    }), 400
+
+
+def job_ids_of(response):
+    try:
+        data = response.json()
+    except ValueError:
+        return []
+    if data.get('job_id'):
+        return [data['job_id']]
+    return data.get('job_ids') or []
+
+
+@app.route('/send', methods=['POST'])
+def send_dm():
+    """Queue a send on the least loaded worker, moving on to the next one while workers refuse it"""
+    data = request_json()
+    if data is None:
+        return invalid_json()
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if key is not None and not isinstance(key, str):
+        # The worker rejects it, without any routing by key
+        key = None
+    workers = supervisor.candidates(data.get('account'), key)
+    if key and not workers:
+        return unavailable('The worker for this Idempotency-Key is not running; retry with the same key')
+    last = None
+    for worker in workers:
+        try:
+            response = supervisor.forward(worker)
+        except requests.RequestException:
+            if key:
+                # The worker may have accepted it; another worker wouldn't know the key
+                return unavailable(f'Worker {worker.index} did not answer; retry with the same Idempotency-Key')
+            continue
+        worker.routed += 1
+        worker.routed_since_check += 1
+        if response.status_code in (429, 503) and not key:
+            last = (response, worker)
+            continue
+        supervisor.remember(job_ids_of(response), worker)
+        return relay(response, worker)
+    if last:
+        return relay(*last)
+    return unavailable()
+
+
+@app.route('/send/batch', methods=['POST'])
+def send_batch():
+    """Queue a batch on one worker, moving on while workers refuse it; streamed results are passed through"""
+    data = request_json()
+    if data is None:
+        return invalid_json()
+    workers = supervisor.candidates(data.get('account'))
+    last = None
+    for worker in workers:
+        try:
+            response = supervisor.forward(worker, stream=True)
+        except requests.RequestException:
+            continue
+        worker.routed += 1
+        worker.routed_since_check += 1
+        if response.status_code in (429, 503):
+            if last:
+                last[0].close()
+            last = (response, worker)
+            continue
+        if response.headers.get('Content-Type', '').startswith('application/json'):
+            # Errors, or a batch with a callback_url that was answered right away
+            supervisor.remember(job_ids_of(response), worker)
+            return relay(response, worker)
+
+        def stream(response=response, worker=worker):
+            lines = response.iter_lines()
+            for line in lines:
+                # The first line lists the accepted job ids
+                supervisor.remember(json.loads(line).get('job_ids', []), worker)
+                yield line + b'\n'
+                break
+            for line in lines:
+                yield line + b'\n'
+
+        return Response(stream_with_context(stream()), status=response.status_code,
+                        mimetype='application/x-ndjson', headers={'X-Instabot-Worker': str(worker.index)})
+    if last:
+        return relay(*last)
+    return unavailable()
+
+
+def broadcast(workers, incoming=None):
+    """Forward the request to several workers in parallel; (worker, response or None) pairs"""
+    incoming = incoming or outgoing_request()
+
+    def call(worker):
+        try:
+            return worker, supervisor.forward(worker, incoming)
+        except requests.RequestException:
+            return worker, None
+
+    if not workers:
+        return []
+    with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+        return list(pool.map(call, workers))
+
+
+def merged(results):
+    """One answer for a broadcast: each worker's JSON, status of the first failure (200 if none)"""
+    status = 200
+    answers = {}
+    for worker, response in results:
+        if response is None:
+            answers[worker.index] = {'status': 'error', 'message': 'Worker did not answer'}
+            status = 502 if status == 200 else status
+            continue
+        try:
+            answers[worker.index] = response.json()
+        except ValueError:
+            answers[worker.index] = {'status': 'error', 'message': response.text[:200]}
+        if response.status_code >= 400 and status == 200:
+            status = response.status_code
+    return jsonify({'status': 'success' if status == 200 else 'error', 'workers': answers}), status
+
+
+@app.route('/login', methods=['POST'])
+def login():
+    """Log each account in on one worker that runs it (all accounts if none is given).
+
+    Workers running the same account share its session file and reload it
+    when it changes, so they pick up the new login without one of their own.
+    """
+    data = request_json()
+    if data is None:
+        return invalid_json()
+    workers = supervisor.login_targets(data.get('account'))
+    if not workers:
+        return unavailable()
+    return merged(broadcast(workers))
+
+
+@app.route('/webhook', methods=['PUT'])
+def set_webhook():
+    """Change the default callback URL on every worker; restarted workers get it once they are up"""
+    incoming = outgoing_request()
+    results = broadcast([w for w in supervisor.workers if w.alive], incoming)
+    supervisor.set_webhook(incoming, results)
+    return merged(results)
+
+
+@app.route('/threads', methods=['DELETE'])
+@app.route('/threads/<username>', methods=['DELETE'])
+def broadcast_change(username=None):
+    """Caches every worker keeps for itself"""
+    return merged(broadcast([w for w in supervisor.workers if w.alive]))
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@app.route('/traces/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Ask the worker that accepted the job; unknown ids (e.g. after a restart) are looked up on every worker"""
+    worker = supervisor.worker_for(job_id)
+    workers = [worker] if worker else [w for w in supervisor.workers if w.alive]
+    for worker in workers:
+        try:
+            response = supervisor.forward(worker)
+        except requests.RequestException:
+            continue
+        if response.status_code != 404:
+            supervisor.remember([job_id], worker)
+            return relay(response, worker)
+    return jsonify({'status': 'error', 'message': f'Unknown job: {job_id}'}), 404
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Recent jobs of every worker, newest first"""
+    limit = request.args.get('limit', 100, type=int)
+    jobs = []
+    queues = {}
+    for worker, response in broadcast([w for w in supervisor.workers if w.alive]):
+        if response is None or response.status_code != 200:
+            continue
+        data = response.json()
+        queues[worker.index] = data['queue']
+        jobs.extend(dict(job, worker=worker.index) for job in data['jobs'])
+    jobs.sort(key=lambda job: job['created_at'], reverse=True)
+    return jsonify({'queues': queues, 'jobs': jobs[:limit]})
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Supervisor state plus each worker's own /health"""
+    answers = {}
+    for worker, response in broadcast([w for w in supervisor.workers if w.alive]):
+        try:
+            answers[worker.index] = response.json() if response is not None else None
+        except ValueError:
+            answers[worker.index] = None
+    stats = supervisor.stats()
+    for worker in stats['workers']:
+        worker['health'] = answers.get(worker['index'])
+    return jsonify(dict(stats, status='ok' if stats['alive'] else 'error'))
+
+
+@app.route('/workers', methods=['GET'])
+def list_workers():
+    """Per-worker process, load and routing stats (no calls to the workers)"""
+    return jsonify(supervisor.stats())
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    ready_workers = [w.index for w in supervisor.workers if w.ready]
+    if not ready_workers:
+        return unavailable('No worker is accepting sends')
+    return jsonify({'status': 'ok', 'ready_workers': ready_workers})
+
+
+@app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE'])
+def proxy(path):
+    """Anything else goes to ?worker=<index>, or the best live worker"""
+    index = request.args.get('worker', type=int)
+    if index is not None:
+        if not 0 <= index < len(supervisor.workers):
+            return jsonify({'status': 'error', 'message': f'Unknown worker: {index}'}), 400
+        workers = [supervisor.workers[index]]
+    else:
+        workers = supervisor.candidates()
+    for worker in workers:
+        try:
+            return relay(supervisor.forward(worker), worker)
+        except requests.RequestException:
+            continue
+    return unavailable()
+
+
+def main():
+    global supervisor
+    parser = argparse.ArgumentParser(description='Run several Instagram Bot API workers behind one port')
+    parser.add_argument('--workers', type=int, default=SUPERVISOR_WORKERS or 2)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+
+    supervisor = Supervisor(max(1, args.workers), args.port)
+
+    def shutdown(signum=None, frame=None):
+        print("[SUPERVISOR] Stopping workers...")
+        supervisor.stop()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    supervisor.start()
+    print(f"[SUPERVISOR] Load-balancing {len(supervisor.workers)} workers on http://0.0.0.0:{args.port}")
+    sys.stdout.flush()
+    app.run(host='0.0.0.0', port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
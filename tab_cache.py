@@ -0,0 +1,142 @@
+"""
+Open DM tab cache for Instagram Bot
+Keeps recently used thread pages open in the warm context so a follow-up to the same user
+skips navigation and goes straight to the composer
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from metrics import TAB_CACHE_TOTAL
+
+load_dotenv()
+
+# Open thread tabs kept per account (0 disables the cache)
+TAB_CACHE_SIZE = int(os.getenv('TAB_CACHE_SIZE', '5'))
+# JS heap all cached tabs of an account may use together (MB)
+TAB_CACHE_MAX_MB = float(os.getenv('TAB_CACHE_MAX_MB', '300'))
+# Tabs unused for this long are closed instead of reused (seconds)
+TAB_CACHE_IDLE_SECONDS = float(os.getenv('TAB_CACHE_IDLE_SECONDS', '900'))
+
+# How long a reused tab gets to show its composer before the bot navigates again (milliseconds)
+TAB_INPUT_TIMEOUT_MS = int(os.getenv('TAB_INPUT_TIMEOUT_MS', '2000'))
+
+HEAP_SIZE_JS = '() => (performance.memory && performance.memory.usedJSHeapSize) || 0'
+
+
+class TabCache:
+    """LRU of username -> open thread page for one browser context.
+
+    A taken tab is removed until it is put back, so two concurrent sends never
+    share a page. put() returns the pages evicted to stay within the count
+    and memory limits; the caller closes them. The loop thread changes the
+    cache while Flask threads read its stats, so both go through _lock.
+    """
+
+    def __init__(self, capacity=TAB_CACHE_SIZE, max_mb=TAB_CACHE_MAX_MB, idle_seconds=TAB_CACHE_IDLE_SECONDS):
+        self.capacity = capacity
+        self.max_bytes = max_mb * 1024 * 1024
+        self.idle_seconds = idle_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # username -> (page, heap bytes, last used)
+        self._tabs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def _key(self, username):
+        return username.lower()
+
+    def take(self, username):
+        """The cached page for username (removed from the cache), or None"""
+        with self._lock:
+            entry = self._tabs.pop(self._key(username), None)
+            if entry and not entry[0].is_closed():
+                self.hits += 1
+                TAB_CACHE_TOTAL.inc(result='hit')
+                return entry[0]
+            self.misses += 1
+        TAB_CACHE_TOTAL.inc(result='miss')
+        return None
+
+    def expire(self):
+        """Drop tabs unused for idle_seconds; returns their pages for the caller to close"""
+        with self._lock:
+            return self._expire()
+
+    def _expire(self):
+        cutoff = time.time() - self.idle_seconds
+        expired = [key for key, entry in self._tabs.items() if entry[2] < cutoff]
+        pages = [self._tabs.pop(key)[0] for key in expired]
+        self.evictions += len(pages)
+        return pages
+
+    def discard(self, page):
+        """Count a page from take() that turned out to be unusable as a miss (the caller closes it)"""
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+        TAB_CACHE_TOTAL.inc(result='stale')
+
+    async def put(self, username, page):
+        """Cache page as username's open thread; returns the evicted pages"""
+        try:
+            heap = await page.evaluate(HEAP_SIZE_JS)
+        except Exception:
+            heap = 0
+
+        evicted = []
+        with self._lock:
+            previous = self._tabs.pop(self._key(username), None)
+            if previous and previous[0] is not page:
+                evicted.append(previous[0])
+            self._tabs[self._key(username)] = (page, heap, time.time())
+
+            evicted.extend(self._expire())
+            # Least recently used first; the new tab itself goes if it alone exceeds the memory budget
+            while self._tabs and (len(self._tabs) > self.capacity or self._memory_bytes() > self.max_bytes):
+                _, (oldest, _, _) = self._tabs.popitem(last=False)
+                evicted.append(oldest)
+                self.evictions += 1
+        return evicted
+
+    def clear(self):
+        """Forget every tab (e.g. their context was closed); returns the pages"""
+        with self._lock:
+            pages = [entry[0] for entry in self._tabs.values()]
+            self._tabs.clear()
+        return pages
+
+    def _memory_bytes(self):
+        return sum(entry[1] for entry in self._tabs.values())
+
+    def memory_bytes(self):
+        with self._lock:
+            return self._memory_bytes()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tabs)
+
+    def stats(self):
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+            size, memory, usernames = len(self._tabs), self._memory_bytes(), list(self._tabs)
+        lookups = hits + misses
+        return {
+            'size': size,
+            'capacity': self.capacity,
+            'memory_mb': round(memory / 1024 / 1024, 1),
+            'max_mb': round(self.max_bytes / 1024 / 1024, 1),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 3) if lookups else None,
+            'evictions': evictions,
+            'usernames': usernames,
+        }
@@ -0,0 +1,53 @@
+"""
+Shared test setup
+Points every file the app writes at a temporary directory and fixes the settings the
+modules read at import time, so tests never touch a real outbox, session or browser
+"""
+
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Set before any module reads them; the app's .env (if any) doesn't override these
+WORKDIR = tempfile.mkdtemp(prefix='instabot-tests-')
+os.environ.update({
+    'OUTBOX_DB': os.path.join(WORKDIR, 'outbox.db'),
+    'TRACE_FILE': os.path.join(WORKDIR, 'traces.jsonl'),
+    'THREAD_CACHE_DB': os.path.join(WORKDIR, 'thread_cache.db'),
+    'SELECTOR_STATS_FILE': os.path.join(WORKDIR, 'selector_stats.json'),
+    'DEBUG_DIR': os.path.join(WORKDIR, 'debug'),
+    'IG_ACCOUNTS': '',
+    'IG_USERNAME': 'tester',
+    'IG_PASSWORD': 'secret',
+    'WEBHOOK_URL': '',
+    'WEBHOOK_SECRET': '',
+    'RATE_LIMIT_PER_MINUTE': '0',
+    'RATE_LIMIT_PER_HOUR': '0',
+    'RATE_LIMIT_PER_DAY': '0',
+})
+# Session files are relative to the working directory
+os.chdir(WORKDIR)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """app.py's Flask test client, with sends handled by a fake runner instead of the browser.
+
+    The fake runner appends each job it runs to api.sent.
+    """
+    import app
+
+    class Api:
+        client = app.app.test_client()
+        sent = []
+
+    def runner(job):
+        Api.sent.append(job)
+        return True
+
+    monkeypatch.setattr(app.send_queue, 'runner', runner)
+    return Api
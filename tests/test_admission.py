@@ -0,0 +1,85 @@
+import json
+import pytest
+from admission import AdmissionController, Overloaded
+
+
+def queue(depth=0, wait_seconds=0, run_seconds=2):
+    return lambda: {'depth': depth, 'counts': {}, 'schedule': {'wait_seconds': wait_seconds, 'run_seconds': run_seconds}}
+
+
+def test_sends_are_accepted_below_the_limits():
+    AdmissionController(queue(depth=9), max_queue=10, max_wait=60).check()
+
+
+def test_full_queue_is_429_with_retry_after():
+    admission = AdmissionController(queue(depth=10), workers=2, max_queue=10, max_wait=0)
+    with pytest.raises(Overloaded) as error:
+        admission.check(count=3)
+    assert error.value.status == 429
+    assert error.value.reason == 'queue_full'
+    # 3 sends too many, a worker slot frees up every 2s / 2 workers
+    assert error.value.retry_after == 3
+    assert admission.stats()['rejected'] == {'queue_full': 1}
+
+
+def test_long_projected_wait_is_503():
+    admission = AdmissionController(queue(depth=1, wait_seconds=700), max_queue=0, max_wait=600)
+    with pytest.raises(Overloaded) as error:
+        admission.check()
+    assert error.value.status == 503
+    assert error.value.reason == 'wait_too_long'
+    assert error.value.retry_after == 100
+
+
+def test_check_without_record_does_not_count_rejections():
+    admission = AdmissionController(queue(depth=5), max_queue=1)
+    with pytest.raises(Overloaded):
+        admission.check(record=False)
+    assert admission.stats()['rejected'] == {}
+
+
+def test_blocking_requests_are_capped():
+    admission = AdmissionController(queue(), max_blocking=1)
+    with admission.blocking_request():
+        assert admission.stats()['in_flight'] == 1
+        with pytest.raises(Overloaded) as error:
+            with admission.blocking_request():
+                pass
+        assert error.value.status == 503
+        assert error.value.reason == 'blocking_full'
+    assert admission.blocking == 0
+
+
+def test_send_answers_429_and_503_with_retry_after(api, monkeypatch):
+    import app
+    monkeypatch.setattr(app.admission, 'queue_stats', queue(depth=10))
+    monkeypatch.setattr(app.admission, 'max_queue', 10)
+    response = api.client.post('/send', json={'username': 'alice', 'message': 'hi'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert response.json['reason'] == 'queue_full'
+
+    monkeypatch.setattr(app.admission, 'queue_stats', queue(depth=1, wait_seconds=900))
+    monkeypatch.setattr(app.admission, 'max_queue', 0)
+    monkeypatch.setattr(app.admission, 'max_wait', 600)
+    response = api.client.post('/send/batch', json={'recipients': ['alice', 'bob'], 'message': 'hi'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '300'
+    assert response.json['reason'] == 'wait_too_long'
+    assert api.sent == []
+
+
+def test_streamed_batch_holds_a_blocking_slot(api, monkeypatch):
+    import app
+    monkeypatch.setattr(app.admission, 'max_blocking', 1)
+    with app.admission.blocking_request():
+        response = api.client.post('/send/batch', json={'recipients': ['alice'], 'message': 'hi'})
+        assert response.status_code == 503
+        assert response.json['reason'] == 'blocking_full'
+
+    response = api.client.post('/send/batch', json={'recipients': ['alice'], 'message': 'hi'})
+    lines = response.get_data(as_text=True).splitlines()
+    response.close()
+    assert response.status_code == 200
+    assert [json.loads(line)['type'] for line in lines] == ['accepted', 'result', 'summary']
+    assert app.admission.blocking == 0
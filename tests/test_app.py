@@ -0,0 +1,59 @@
+import time
+import threading
+import pytest
+
+
+@pytest.mark.parametrize('body', [
+    {'send_at': 1e300},
+    {'send_at': '2400-01-01T00:00:00Z'},
+    {'deadline': 1e300},
+    {'send_at': float('nan')},
+])
+def test_send_rejects_times_too_far_ahead(api, body):
+    response = api.client.post('/send', json=dict(body, username='alice', message='hi'))
+    assert response.status_code == 400
+    assert api.sent == []
+
+
+@pytest.mark.parametrize('timeout', ['1e308', 'inf', 'nan', '-1'])
+def test_send_rejects_unreasonable_timeouts(api, timeout):
+    response = api.client.post('/send', json={'username': 'alice', 'message': 'hi'},
+                               headers={'X-Request-Timeout': timeout})
+    assert response.status_code == 400
+    assert 'timeout' in response.json['message']
+
+
+def test_send_accepts_a_schedule_within_the_limit(api):
+    send_at = time.time() + 86400
+    response = api.client.post('/send', json={'username': 'alice', 'message': 'hi', 'send_at': send_at},
+                               headers={'X-Request-Timeout': str(2 * 86400)})
+    assert response.status_code == 202
+    job = api.client.get(f"/jobs/{response.json['job_id']}").json
+    assert job['status'] == 'queued'
+    assert job['send_at'] == send_at
+
+
+@pytest.mark.parametrize('body', [['main'], {'account': ['main']}, {'account': 'nobody'}])
+def test_login_rejects_bad_bodies(api, body):
+    response = api.client.post('/login', json=body)
+    assert response.status_code == 400
+
+
+def test_health_reports_cached_sessions_without_probing(api, monkeypatch):
+    import app
+    probed = threading.Event()
+    release = threading.Event()
+
+    def slow_check(account, force=False):
+        probed.set()
+        release.wait(5)
+        return {'valid': True, 'reason': 'ok', 'checked_at': time.time(), 'latency_ms': 0}
+
+    monkeypatch.setattr(app.session_probe, 'check', slow_check)
+    started = time.time()
+    response = api.client.get('/health')
+    assert response.status_code == 200
+    assert time.time() - started < 1
+    # The probe runs in the background instead
+    assert probed.wait(2)
+    release.set()
@@ -0,0 +1,84 @@
+import time
+import pytest
+from failures import (
+    RetryPolicy, BotFailure, DeadlineExceeded, classify, exception_reason, page_text_reason, remaining_ms,
+    TRANSIENT, BACKOFF, RELOGIN, PERMANENT, RETRY_NOW, WAIT, LOGIN_THEN_RETRY, GIVE_UP,
+)
+
+
+@pytest.fixture
+def policy():
+    return RetryPolicy(max_attempts=4, backoff=1, backoff_max=3)
+
+
+def test_reasons_are_classified():
+    assert classify('timeout') == TRANSIENT
+    assert classify('send_unconfirmed') == TRANSIENT
+    assert classify('rate_limited') == BACKOFF
+    assert classify('not_logged_in') == RELOGIN
+    assert classify('user_not_found') == PERMANENT
+    # Unknown reasons are retried carefully rather than given up on
+    assert classify('something_new') == BACKOFF
+
+
+def test_transient_failures_retry_right_away(policy):
+    assert policy.next_action('navigation_failed', 1) == (RETRY_NOW, 0)
+
+
+def test_permanent_failures_are_never_retried(policy):
+    assert policy.next_action('user_not_found', 1) == (GIVE_UP, 0)
+    assert not BotFailure('bad_credentials').retryable
+
+
+def test_backoff_doubles_up_to_the_cap(policy):
+    delays = [policy.next_action('rate_limited', attempts) for attempts in (1, 2, 3)]
+    assert [action for action, _ in delays] == [WAIT] * 3
+    # Up to 25% jitter on top of 1s, 2s and the 3s cap
+    for (_, delay), base in zip(delays, (1, 2, 3)):
+        assert base <= delay <= base * 1.25
+
+
+def test_attempts_are_bounded(policy):
+    assert policy.next_action('timeout', 4) == (GIVE_UP, 0)
+    assert policy.next_action('rate_limited', 4) == (GIVE_UP, 0)
+
+
+def test_relogin_happens_once(policy):
+    assert policy.next_action('not_logged_in', 1) == (LOGIN_THEN_RETRY, 0)
+    assert policy.next_action('not_logged_in', 2, relogged=True) == (GIVE_UP, 0)
+    assert RetryPolicy(relogin=False).next_action('not_logged_in', 1) == (GIVE_UP, 0)
+
+
+def test_deadline_stops_retries(policy):
+    assert policy.next_action('timeout', 1, deadline=time.time() - 1) == (GIVE_UP, 0)
+    # A backoff that would end after the deadline isn't worth waiting for
+    assert policy.next_action('rate_limited', 1, deadline=time.time() + 0.5) == (GIVE_UP, 0)
+    assert policy.next_action('rate_limited', 1, deadline=time.time() + 60)[0] == WAIT
+
+
+def test_exceptions_and_page_text_map_to_reasons():
+    assert exception_reason(DeadlineExceeded('late')) == 'deadline_exceeded'
+    assert exception_reason(Exception('Timeout 30000ms exceeded.')) == 'timeout'
+    assert exception_reason(Exception('Target closed')) == 'page_closed'
+    assert exception_reason(ValueError('boom')) == 'exception'
+    assert page_text_reason("Sorry, this page isn't available.") == 'user_not_found'
+    assert page_text_reason('Try Again Later') == 'rate_limited'
+    assert page_text_reason('All good') is None
+
+
+def test_remaining_ms_caps_timeouts_by_the_deadline():
+    assert remaining_ms(None, 5000) == 5000
+    assert remaining_ms(time.time() + 1, 5000) <= 1000
+    with pytest.raises(DeadlineExceeded):
+        remaining_ms(time.time() - 1, 5000)
+
+
+def test_bot_failure_reports_its_class():
+    failure = BotFailure('not_logged_in', 'Please run /login first.', attempts=2)
+    assert failure.to_dict() == {
+        'reason': 'not_logged_in',
+        'class': RELOGIN,
+        'retryable': True,
+        'message': 'Please run /login first.',
+        'attempts': 2,
+    }
@@ -0,0 +1,98 @@
+import time
+import threading
+import pytest
+from idempotency import IdempotencyStore, IdempotencyConflict, fingerprint
+
+
+def wait_until(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end, 'timed out'
+        time.sleep(0.01)
+
+
+def test_replay_returns_the_first_job_without_creating_another():
+    store = IdempotencyStore()
+    created = []
+    create = lambda: created.append(1) or f'job{len(created)}'
+    assert store.claim('k', fingerprint('alice', 'hi'), create) == ('job1', True)
+    assert store.claim('k', fingerprint('alice', 'hi'), create) == ('job1', False)
+    assert len(created) == 1
+    assert store.stats()['replays'] == 1
+
+
+def test_reusing_a_key_for_another_request_is_a_conflict():
+    store = IdempotencyStore()
+    store.claim('k', fingerprint('alice', 'hi'), lambda: 'job1')
+    with pytest.raises(IdempotencyConflict):
+        store.claim('k', fingerprint('alice', 'bye'), lambda: 'job2')
+    with pytest.raises(IdempotencyConflict):
+        store.claim('k', fingerprint('alice', 'hi', 'backup'), lambda: 'job2')
+    assert store.stats()['conflicts'] == 2
+
+
+def test_expired_keys_start_a_new_send():
+    store = IdempotencyStore(ttl=0.05)
+    store.claim('k', 'fp', lambda: 'job1')
+    time.sleep(0.1)
+    assert store.claim('k', 'fp', lambda: 'job2') == ('job2', True)
+
+
+def test_keys_from_before_a_restart_come_from_the_lookup():
+    store = IdempotencyStore(lookup=lambda key, since: ('old-job', 'fp') if key == 'k' else None)
+    assert store.claim('k', 'fp', lambda: 'new-job') == ('old-job', False)
+    assert store.claim('other', 'fp', lambda: 'new-job') == ('new-job', True)
+
+
+def test_oldest_keys_are_dropped_first():
+    store = IdempotencyStore(max_keys=2)
+    for index in range(3):
+        store.claim(f'k{index}', 'fp', lambda index=index: f'job{index}')
+    assert store.stats()['keys'] == 2
+    assert store.claim('k0', 'fp', lambda: 'again') == ('again', True)
+
+
+def test_concurrent_retries_create_one_send():
+    store = IdempotencyStore()
+    created = []
+
+    def create():
+        time.sleep(0.05)
+        created.append(1)
+        return 'job1'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(store.claim('k', 'fp', create))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert sorted(new for _, new in results) == [False, False, False, True]
+
+
+def test_send_replays_a_retried_request(api):
+    body = {'username': 'alice', 'message': 'hi'}
+    first = api.client.post('/send', json=body, headers={'Idempotency-Key': 'send-1'})
+    assert first.status_code == 202
+    job_id = first.json['job_id']
+    wait_until(lambda: api.client.get(f'/jobs/{job_id}').json['status'] == 'succeeded')
+
+    retry = api.client.post('/send', json=body, headers={'Idempotency-Key': 'send-1'})
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.json['job_id'] == job_id
+    assert retry.json['status'] == 'succeeded'
+    assert [job.id for job in api.sent].count(job_id) == 1
+
+
+def test_send_rejects_a_key_reused_for_another_message(api):
+    api.client.post('/send', json={'username': 'alice', 'message': 'hi'}, headers={'Idempotency-Key': 'send-2'})
+    conflict = api.client.post('/send', json={'username': 'alice', 'message': 'bye'},
+                               headers={'Idempotency-Key': 'send-2'})
+    assert conflict.status_code == 422
+
+
+def test_send_rejects_an_oversized_key(api):
+    response = api.client.post('/send', json={'username': 'alice', 'message': 'hi', 'idempotency_key': 'x' * 300})
+    assert response.status_code == 400
@@ -0,0 +1,147 @@
+import time
+import threading
+import pytest
+from jobs import Job, RUNNING, SUCCEEDED
+from outbox import Outbox
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'outbox.db')
+
+
+def run(outbox, job):
+    job.status = RUNNING
+    job.started_at = time.time()
+    outbox.update(job)
+
+
+def test_unfinished_jobs_are_resumed_after_a_restart(path):
+    outbox = Outbox(path)
+    queued = Job('alice', 'hi', idempotency_key='k1', send_at=time.time() + 60)
+    pinned = Job('bob', 'hey', account='main')
+    done = Job('carol', 'yo')
+    outbox.add_many([queued, pinned, done])
+    run(outbox, pinned)
+    run(outbox, done)
+    done.status = SUCCEEDED
+    done.finished_at = time.time()
+    outbox.update(done)
+
+    rows = {row['id']: row for row in Outbox(path).unfinished()}
+    assert set(rows) == {queued.id, pinned.id}
+    assert rows[queued.id]['idempotency_key'] == 'k1'
+    assert rows[queued.id]['send_at'] == queued.send_at
+    assert rows[pinned.id]['account'] == 'main'
+
+    restored = Job.restore(rows[queued.id])
+    assert (restored.id, restored.username, restored.message) == (queued.id, 'alice', 'hi')
+
+
+def test_unpinned_jobs_go_back_to_the_dispatcher(path):
+    outbox = Outbox(path)
+    job = Job('alice', 'hi')
+    outbox.add(job)
+    job.account = 'main'
+    run(outbox, job)
+    [row] = Outbox(path).unfinished()
+    assert row['account'] is None
+
+
+def test_a_send_interrupted_too_often_is_given_up(path):
+    job = Job('alice', 'hi')
+    Outbox(path, max_attempts=2).add(job)
+    for _ in range(2):
+        # Each process picks it up, marks it running and dies
+        outbox = Outbox(path, max_attempts=2)
+        assert [row['id'] for row in outbox.unfinished()] == [job.id]
+        run(outbox, job)
+
+    outbox = Outbox(path, max_attempts=2)
+    assert outbox.unfinished() == []
+    row = outbox.get(job.id)
+    assert row['status'] == 'failed'
+    assert 'giving up' in row['error']
+
+
+def test_deliberate_retries_do_not_count_as_interruptions(path):
+    job = Job('alice', 'hi')
+    outbox = Outbox(path, max_attempts=2)
+    outbox.add(job)
+    for _ in range(3):
+        run(outbox, job)
+        job.retries.append({'reason': 'rate_limited'})
+        job.status = 'queued'
+        outbox.update(job)
+    assert [row['id'] for row in Outbox(path, max_attempts=2).unfinished()] == [job.id]
+
+
+def test_idempotency_key_is_found_after_a_restart(path):
+    job = Job('alice', 'hi', account='main', idempotency_key='key-1')
+    Outbox(path).add(job)
+    outbox = Outbox(path)
+    row = outbox.find_idempotency_key('key-1', time.time() - 60)
+    assert row['id'] == job.id
+    assert outbox.find_idempotency_key('key-1', time.time() + 60) is None
+
+
+def test_group_commit_failure_reaches_every_caller(path):
+    outbox = Outbox(path)
+    real = outbox._conn
+
+    class FailingConnection:
+        def __getattr__(self, name):
+            return getattr(real, name)
+
+        def executemany(self, *args):
+            time.sleep(0.1)
+            raise RuntimeError('disk full')
+
+    outbox._conn = FailingConnection()
+    errors = []
+
+    def add(index):
+        try:
+            outbox.add(Job(f'user{index}', 'hi'))
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add, args=(index,)) for index in range(5)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 5
+    assert outbox.inserts == 0
+
+
+def test_retries_before_a_restart_do_not_count_as_interruptions(path):
+    job = Job('alice', 'hi')
+    outbox = Outbox(path, max_attempts=3)
+    outbox.add(job)
+    for _ in range(2):
+        run(outbox, job)
+        job.retries.append({'reason': 'rate_limited'})
+        job.status = 'queued'
+        outbox.update(job)
+    run(outbox, job)
+
+    for _ in range(2):
+        # Restored jobs start without the retries; each process runs it and dies
+        outbox = Outbox(path, max_attempts=3)
+        [row] = outbox.unfinished()
+        run(outbox, Job.restore(row))
+
+    outbox = Outbox(path, max_attempts=3)
+    assert outbox.unfinished() == []
+    assert outbox.get(job.id)['error'] == 'Interrupted 3 times, giving up'
+
+
+def test_resumed_jobs_are_only_interrupted_again_once_they_run(path):
+    job = Job('alice', 'hi')
+    Outbox(path, max_attempts=2).add(job)
+    run(Outbox(path, max_attempts=2), job)
+    for _ in range(3):
+        # Restarts before the resumed job runs again don't count
+        assert len(Outbox(path, max_attempts=2).unfinished()) == 1
@@ -0,0 +1,113 @@
+import time
+import threading
+from scheduler import TokenBucket, RateLimiter, Scheduler
+
+
+class FakeJob:
+    def __init__(self, account=None, send_at=None, deadline=None):
+        self.account = account
+        self.send_at = send_at
+        self.deadline = deadline
+        self.created_at = time.time()
+
+
+def limits(per_minute):
+    return lambda account: {'minute': per_minute, 'hour': 0, 'day': 0}
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(2, 60, now=1000)
+    assert bucket.wait_time(1000) == 0
+    bucket.take(1000)
+    bucket.take(1000)
+    assert bucket.wait_time(1000) == 30
+    assert bucket.wait_time(1030) == 0
+
+
+def test_refund_gives_the_token_back_up_to_capacity():
+    limiter = RateLimiter({'minute': 1}, now=1000)
+    limiter.take(1000)
+    assert limiter.wait_time(1000) == 60
+    limiter.refund(1000)
+    assert limiter.wait_time(1000) == 0
+    limiter.refund(1000)
+    assert limiter.buckets['minute'].tokens == 1
+
+
+def test_seed_counts_sends_from_before_a_restart():
+    limiter = RateLimiter({'minute': 2, 'hour': 3}, now=1000)
+    limiter.seed([950, 990, 400], now=1000)
+    assert limiter.buckets['minute'].tokens == 0
+    assert limiter.buckets['hour'].tokens == 0
+    assert limiter.wait_time(1000) > 0
+
+
+def test_unlimited_account_is_never_held_back():
+    scheduler = Scheduler(lambda: ['a'], limits_for=limits(0))
+    for _ in range(5):
+        scheduler.put(FakeJob())
+    assert [scheduler.get().account for _ in range(5)] == ['a'] * 5
+
+
+def test_throttled_account_does_not_hold_back_other_accounts():
+    scheduler = Scheduler(lambda: ['a', 'b'], limits_for=limits(1))
+    first, second, third = FakeJob('a'), FakeJob('a'), FakeJob('b')
+    for job in (first, second, third):
+        scheduler.put(job)
+    assert scheduler.get() is first
+    # 'a' has no token left for a minute; the later job for 'b' goes ahead
+    assert scheduler.get() is third
+    projection = scheduler.projection()
+    assert projection['waiting'] == 1
+    assert projection['rate_limited'] == 1
+    assert 59 < projection['drain_seconds'] <= 60
+
+
+def test_unpinned_jobs_go_to_the_account_with_a_token():
+    scheduler = Scheduler(lambda: ['a', 'b'], limits_for=limits(1))
+    scheduler.put(FakeJob())
+    scheduler.put(FakeJob())
+    assert sorted(scheduler.get().account for _ in range(2)) == ['a', 'b']
+    assert scheduler.projection()['wait_seconds'] > 59
+
+
+def test_scheduled_job_waits_for_send_at():
+    scheduler = Scheduler(lambda: ['a'], limits_for=limits(0))
+    job = FakeJob(send_at=time.time() + 0.2)
+    scheduler.put(job)
+    started = time.time()
+    assert scheduler.get() is job
+    assert time.time() - started >= 0.15
+
+
+def test_expired_job_is_released_without_a_token():
+    scheduler = Scheduler(lambda: ['a'], limits_for=limits(1))
+    scheduler.put(FakeJob('a'))
+    scheduler.get()
+    late = FakeJob('a', deadline=time.time() - 1)
+    scheduler.put(late)
+    assert scheduler.get() is late
+
+
+def test_unavailable_account_gets_no_jobs_until_it_is_free():
+    busy = {'a'}
+    scheduler = Scheduler(lambda: ['a', 'b'], limits_for=limits(0), available=lambda account: account not in busy)
+    pinned = FakeJob('a')
+    scheduler.put(pinned)
+    scheduler.put(FakeJob())
+    assert scheduler.get().account == 'b'
+    threading.Timer(0.1, busy.clear).start()
+    assert scheduler.get() is pinned
+
+
+def test_far_future_send_at_does_not_break_get():
+    scheduler = Scheduler(lambda: ['a'], limits_for=limits(0))
+    scheduler.put(FakeJob(send_at=1e300))
+    soon = FakeJob()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(scheduler.get()), daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    scheduler.put(soon)
+    thread.join(timeout=2)
+    assert result == [soon]
@@ -0,0 +1,63 @@
+import json
+import pytest
+import supervisor
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode()
+        self.headers = {'Content-Type': 'application/json'}
+        self.closed = False
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def proxy(monkeypatch):
+    """The supervisor's test client with two live workers; proxy.answers[i] is what worker i replies"""
+    running = supervisor.Supervisor(2, split_accounts=False)
+    for worker in running.workers:
+        worker.alive = True
+    monkeypatch.setattr(supervisor, 'supervisor', running)
+
+    class Proxy:
+        client = supervisor.app.test_client()
+        answers = {}
+        calls = []
+
+    def forward(worker, incoming=None, stream=False, **options):
+        Proxy.calls.append(worker.index)
+        return Proxy.answers[worker.index]
+
+    monkeypatch.setattr(running, 'forward', forward)
+    return Proxy
+
+
+@pytest.mark.parametrize('path', ['/send', '/send/batch', '/login'])
+@pytest.mark.parametrize('body', [['alice'], {'account': ['a']}])
+def test_bad_bodies_are_rejected_before_routing(proxy, path, body):
+    response = proxy.client.post(path, json=body)
+    assert response.status_code == 400
+    assert proxy.calls == []
+
+
+def test_batch_moves_on_from_an_overloaded_worker(proxy):
+    proxy.answers = {0: FakeResponse(429, {'reason': 'queue_full'}), 1: FakeResponse(202, {'job_ids': ['j1']})}
+    response = proxy.client.post('/send/batch', json={'recipients': ['alice'], 'message': 'hi'})
+    assert response.status_code == 202
+    assert sorted(proxy.calls) == [0, 1]
+    assert supervisor.supervisor.worker_for('j1').index == int(response.headers['X-Instabot-Worker'])
+
+
+def test_batch_relays_the_last_refusal_when_every_worker_is_full(proxy):
+    proxy.answers = {0: FakeResponse(503, {'reason': 'wait_too_long'}), 1: FakeResponse(429, {'reason': 'queue_full'})}
+    response = proxy.client.post('/send/batch', json={'recipients': ['alice'], 'message': 'hi'})
+    assert response.status_code in (429, 503)
+    assert sorted(proxy.calls) == [0, 1]
+    first = proxy.answers[proxy.calls[0]]
+    assert first.closed
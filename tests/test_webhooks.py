@@ -0,0 +1,122 @@
+import time
+import threading
+import pytest
+from werkzeug.serving import make_server
+import mock_instagram
+from jobs import Job, SUCCEEDED
+from webhooks import WebhookDispatcher
+
+SECRET = 'test-secret'
+
+
+def wait_until(condition, timeout=10):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end, 'timed out'
+        time.sleep(0.01)
+
+
+@pytest.fixture(scope='module')
+def receiver():
+    """mock_instagram.py on a free port; yields its /mock/webhook URL"""
+    server = make_server('127.0.0.1', 0, mock_instagram.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/mock/webhook'
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def reset_mock(monkeypatch):
+    monkeypatch.setattr(mock_instagram, 'MOCK_WEBHOOK_SECRET', SECRET)
+    mock_instagram.app.test_client().post('/mock/reset')
+    fail_rate(0)
+    yield
+    fail_rate(0)
+
+
+def fail_rate(rate):
+    """Share of deliveries the mock answers with 503"""
+    mock_instagram.app.test_client().post('/mock/settings', json={'webhook_fail_rate': rate})
+
+
+def dispatcher(**options):
+    settings = dict(secret=SECRET, batch_size=3, window_ms=50, backoff=0.1, backoff_max=0.4, max_attempts=4)
+    settings.update(options)
+    return WebhookDispatcher(**settings)
+
+
+def received():
+    return mock_instagram.app.test_client().get('/mock/webhooks').json['events']
+
+
+def counters():
+    return mock_instagram.app.test_client().get('/mock/stats').json['counters']
+
+
+def test_results_are_batched_per_url(receiver):
+    webhooks = dispatcher()
+    for index in range(5):
+        webhooks.enqueue(receiver, {'type': 'test', 'index': index})
+    wait_until(lambda: webhooks.delivered == 5)
+    # 5 results with batch_size 3: one full batch and one sent when the window ended
+    assert webhooks.posts == 2
+    assert counters()['webhook_posts'] == 2
+    assert [event['index'] for event in received()] == [0, 1, 2, 3, 4]
+
+
+def test_failed_deliveries_are_retried(receiver):
+    fail_rate(1)
+    webhooks = dispatcher()
+    webhooks.enqueue(receiver, {'type': 'test', 'index': 0})
+    # The batch is only counted as retrying between attempts, not while one is in flight
+    wait_until(lambda: counters()['webhook_rejected'] >= 2 and webhooks.stats()['retrying'] == 1)
+    assert webhooks.last_error.endswith('HTTP 503')
+
+    fail_rate(0)
+    wait_until(lambda: webhooks.delivered == 1)
+    assert webhooks.failed == 0
+    assert [event['index'] for event in received()] == [0]
+
+
+def test_retries_back_off_then_give_up(receiver):
+    fail_rate(1)
+    webhooks = dispatcher(max_attempts=3, backoff=0.2, backoff_max=1)
+    started = time.time()
+    webhooks.enqueue(receiver, {'type': 'test', 'index': 0})
+    wait_until(lambda: webhooks.failed == 1)
+    # Waits of 0.2s and then 0.4s between the three attempts
+    assert time.time() - started >= 0.6
+    assert counters()['webhook_rejected'] == 3
+    assert webhooks.delivered == 0
+    assert webhooks.stats()['retrying'] == 0
+
+
+def test_deliveries_are_signed(receiver):
+    webhooks = dispatcher(batch_size=1)
+    job = Job('alice', 'hi', callback_url=receiver)
+    job.status = SUCCEEDED
+    webhooks.job_finished(job)
+    wait_until(lambda: webhooks.delivered == 1)
+
+    [event] = received()
+    assert event['type'] == 'job.finished'
+    assert event['job_id'] == job.id
+    assert event['job']['status'] == SUCCEEDED
+    assert event['signature'].startswith('sha256=')
+    assert event['signature_valid'] is True
+
+
+def test_a_wrong_secret_fails_verification(receiver):
+    webhooks = dispatcher(secret='other-secret', batch_size=1)
+    webhooks.enqueue(receiver, {'type': 'test'})
+    wait_until(lambda: webhooks.delivered == 1)
+    assert received()[0]['signature_valid'] is False
+
+
+def test_unsigned_without_a_secret(receiver):
+    webhooks = dispatcher(secret='', batch_size=1)
+    webhooks.enqueue(receiver, {'type': 'test'})
+    wait_until(lambda: webhooks.delivered == 1)
+    assert received()[0]['signature'] is None
+    assert received()[0]['signature_valid'] is False
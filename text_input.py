@@ -0,0 +1,90 @@
+"""
+Text input strategies for Instagram Bot
+Puts text into the DM composer and login fields by fill, bulk insert, chunked insert or keystrokes
+"""
+
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+from metrics import INPUT_SECONDS
+from failures import remaining_ms
+
+load_dotenv()
+
+# How the DM text is entered: 'insert' (one input event), 'fill', 'chunked' or 'keystroke'
+MESSAGE_INPUT_STRATEGY = os.getenv('MESSAGE_INPUT_STRATEGY', 'insert')
+# How the username/password are entered (same choices)
+LOGIN_INPUT_STRATEGY = os.getenv('LOGIN_INPUT_STRATEGY', 'fill')
+# 'chunked': characters per insert and pause between chunks (milliseconds)
+INPUT_CHUNK_SIZE = int(os.getenv('INPUT_CHUNK_SIZE', '80'))
+INPUT_CHUNK_DELAY_MS = float(os.getenv('INPUT_CHUNK_DELAY_MS', '30'))
+# 'keystroke': pause between key presses (milliseconds), the old per-character typing
+INPUT_KEY_DELAY_MS = float(os.getenv('INPUT_KEY_DELAY_MS', '50'))
+
+
+async def _fill(page, element, text, deadline):
+    await element.fill(text, timeout=remaining_ms(deadline))
+
+
+async def _insert(page, element, text, deadline):
+    await element.click(timeout=remaining_ms(deadline))
+    await page.keyboard.insert_text(text)
+
+
+async def _chunked(page, element, text, deadline):
+    await element.click(timeout=remaining_ms(deadline))
+    size = max(1, INPUT_CHUNK_SIZE)
+    for start in range(0, len(text), size):
+        if start:
+            # Raises once the deadline has passed
+            await asyncio.sleep(remaining_ms(deadline, INPUT_CHUNK_DELAY_MS) / 1000)
+        await page.keyboard.insert_text(text[start:start + size])
+
+
+async def _keystroke(page, element, text, deadline):
+    await element.click(timeout=remaining_ms(deadline))
+    delay = INPUT_KEY_DELAY_MS
+    if deadline is not None and text:
+        # Type faster rather than run past the deadline (at most half the remaining time)
+        delay = min(delay, remaining_ms(deadline) / 2 / len(text))
+    await element.type(text, delay=delay, timeout=remaining_ms(deadline))
+
+
+STRATEGIES = {
+    'fill': _fill,
+    'insert': _insert,
+    'chunked': _chunked,
+    'keystroke': _keystroke,
+}
+
+
+def strategy_name(value, default='insert'):
+    """Known strategy name for value, falling back to default for unknown ones"""
+    if value in STRATEGIES:
+        return value
+    if value:
+        print(f"[WARNING] Unknown input strategy '{value}', using '{default}'")
+    return default
+
+
+async def enter_text(page, element, text, field, strategy=None, deadline=None):
+    """Put text into element with the given strategy; returns the strategy used.
+
+    Falls back to keystrokes if the faster strategy left the field empty
+    (e.g. an editor that ignores programmatic input). Waits and pauses are
+    cut short by deadline (unix time).
+    """
+    strategy = strategy_name(strategy, 'insert')
+    started = time.perf_counter()
+    await STRATEGIES[strategy](page, element, text, deadline)
+    if strategy != 'keystroke' and text.strip():
+        entered = await element.evaluate('(el) => el.value !== undefined ? el.value : el.innerText')
+        if not (entered or '').strip():
+            print(f"[WARNING] {field}: '{strategy}' input had no effect, typing instead")
+            INPUT_SECONDS.observe(time.perf_counter() - started, field=field, strategy=strategy)
+            started = time.perf_counter()
+            strategy = 'keystroke'
+            await STRATEGIES[strategy](page, element, text, deadline)
+    INPUT_SECONDS.observe(time.perf_counter() - started, field=field, strategy=strategy)
+    return strategy
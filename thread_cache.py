@@ -0,0 +1,144 @@
+"""
+Username -> DM thread URL cache for Instagram Bot
+Lets send_dm() open /direct/t/<id> directly instead of going through the /m/<username> redirect
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from accounts import DEFAULT_ACCOUNT, INSTAGRAM_BASE_URL
+
+load_dotenv()
+
+THREAD_CACHE_DB = os.getenv('THREAD_CACHE_DB', 'thread_cache.db')
+# Seconds before a cached thread URL is considered stale (default 7 days)
+THREAD_CACHE_TTL = int(os.getenv('THREAD_CACHE_TTL', str(7 * 24 * 3600)))
+
+THREAD_ID_PATTERN = re.compile(r'/direct/t/([^/?#]+)')
+
+
+def thread_url_from(url):
+    """Canonical thread URL from a page URL, or None if it isn't a DM thread"""
+    match = THREAD_ID_PATTERN.search(url or '')
+    if not match:
+        return None
+    return f'{INSTAGRAM_BASE_URL}/direct/t/{match.group(1)}/'
+
+
+class ThreadCache:
+    """SQLite-backed map of (account, username) to DM thread URL with a TTL.
+
+    Thread ids differ per sending account, so entries are kept per account.
+    """
+
+    def __init__(self, path=THREAD_CACHE_DB, ttl=THREAD_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(threads)')]
+        if columns and 'account' not in columns:
+            # Single-account cache from an older version; it's only a cache, rebuild it
+            self._conn.execute('DROP TABLE threads')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS threads ('
+            ' account TEXT NOT NULL,'
+            ' username TEXT NOT NULL,'
+            ' thread_url TEXT NOT NULL,'
+            ' updated_at REAL NOT NULL,'
+            ' uses INTEGER NOT NULL DEFAULT 0,'
+            ' PRIMARY KEY (account, username)'
+            ')'
+        )
+        self._conn.commit()
+
+    def get(self, username, account=DEFAULT_ACCOUNT):
+        """Cached thread URL for username, or None if missing/expired"""
+        key = (account, username.lower())
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT thread_url, updated_at FROM threads WHERE account = ? AND username = ?', key
+            ).fetchone()
+
+            if row and time.time() - row[1] <= self.ttl:
+                self._conn.execute('UPDATE threads SET uses = uses + 1 WHERE account = ? AND username = ?', key)
+                self._conn.commit()
+                self.hits += 1
+                return row[0]
+
+            if row:
+                self._conn.execute('DELETE FROM threads WHERE account = ? AND username = ?', key)
+                self._conn.commit()
+            self.misses += 1
+            return None
+
+    def put(self, username, url, account=DEFAULT_ACCOUNT):
+        """Remember the thread a redirect landed on; ignores non-thread URLs"""
+        thread_url = thread_url_from(url)
+        if not thread_url:
+            return None
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO threads (account, username, thread_url, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(account, username) DO UPDATE SET '
+                'thread_url = excluded.thread_url, updated_at = excluded.updated_at',
+                (account, username.lower(), thread_url, time.time())
+            )
+            self._conn.commit()
+        return thread_url
+
+    def invalidate(self, username, account=None):
+        """Drop cached entries for username (for one account, or all), returns True if any existed"""
+        with self._lock:
+            if account is None:
+                cursor = self._conn.execute('DELETE FROM threads WHERE username = ?', (username.lower(),))
+            else:
+                cursor = self._conn.execute(
+                    'DELETE FROM threads WHERE account = ? AND username = ?', (account, username.lower())
+                )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def clear(self):
+        """Drop every cached entry, returns how many were removed"""
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM threads')
+            self._conn.commit()
+            return cursor.rowcount
+
+    def entries(self, limit=100, offset=0, account=None):
+        """Cached entries, most recently updated first"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT account, username, thread_url, updated_at, uses FROM threads '
+                'WHERE ? IS NULL OR account = ? '
+                'ORDER BY updated_at DESC LIMIT ? OFFSET ?',
+                (account, account, limit, offset)
+            ).fetchall()
+        return [
+            {
+                'account': account_name,
+                'username': username,
+                'thread_url': thread_url,
+                'updated_at': updated_at,
+                'expires_in': max(0, int(self.ttl - (now - updated_at))),
+                'uses': uses,
+            }
+            for account_name, username, thread_url, updated_at, uses in rows
+        ]
+
+    def stats(self):
+        """Size and hit/miss counters"""
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM threads').fetchone()[0]
+        return {'size': size, 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses}
+
+
+# Shared by every InstagramBot in the process
+thread_cache = ThreadCache()
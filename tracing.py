@@ -0,0 +1,328 @@
+"""
+Structured tracing for Instagram Bot
+Nested, timed spans per job/request written as JSON lines, with pluggable profiler hooks
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import threading
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Finished traces are appended here as one JSON object per line ('' disables the file)
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+# The file is rotated to <TRACE_FILE>.1 once it grows past this size
+TRACE_MAX_MB = float(os.getenv('TRACE_MAX_MB', '50'))
+# How many finished traces GET /traces keeps in memory
+TRACE_HISTORY = int(os.getenv('TRACE_HISTORY', '500'))
+# Profiler used when a request asks for profiling without naming one
+PROFILER = os.getenv('PROFILER', 'cprofile').strip().lower()
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+# Milliseconds between stack samples of the 'sample' profiler
+PROFILE_SAMPLE_MS = float(os.getenv('PROFILE_SAMPLE_MS', '5'))
+
+
+class Span:
+    """One timed step of a trace"""
+
+    def __init__(self, name, parent_id=None, start=None, **attributes):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.parent_id = parent_id
+        self.start = start or time.time()
+        self.end = None
+        self.status = 'ok'
+        self.error = None
+        self.attributes = attributes
+        self.events = []
+
+    def to_dict(self):
+        data = {
+            'span_id': self.id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'duration_ms': round((self.end - self.start) * 1000, 3) if self.end else None,
+            'status': self.status,
+        }
+        if self.error:
+            data['error'] = self.error
+        if self.attributes:
+            data['attributes'] = self.attributes
+        if self.events:
+            data['events'] = self.events
+        return data
+
+
+class Trace:
+    """Spans of one job or request.
+
+    A trace is used by one operation at a time, so nesting follows a simple
+    stack: a new span's parent is the innermost span still open. The trace is
+    written out once it is finished and none of its spans are open.
+    """
+
+    def __init__(self, tracer, name, trace_id=None, profile=None, **attributes):
+        self.tracer = tracer
+        self.id = trace_id or uuid.uuid4().hex
+        self.name = name
+        self.started_at = time.time()
+        self.finished_at = None
+        self.attributes = attributes
+        self.spans = []
+        self.profile = profile
+        self.profiler = None
+        self._stack = []
+        self._lock = threading.Lock()
+        self._written = False
+
+    def begin(self, name, **attributes):
+        """Open a span under the innermost open one; close it with end()"""
+        with self._lock:
+            parent_id = self._stack[-1].id if self._stack else None
+            span = Span(name, parent_id, **attributes)
+            self.spans.append(span)
+            self._stack.append(span)
+        return span
+
+    def end(self, span, error=None):
+        with self._lock:
+            span.end = time.time()
+            if error is not None:
+                span.status = 'error'
+                span.error = str(error)
+            if span in self._stack:
+                self._stack.remove(span)
+        self._maybe_write()
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time a with-block as a span (also around awaits)"""
+        span = self.begin(name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end(span, error=e)
+            raise
+        else:
+            self.end(span)
+
+    def record(self, name, start, end, **attributes):
+        """Add a span that was timed elsewhere (e.g. time spent in the queue)"""
+        with self._lock:
+            parent_id = self._stack[-1].id if self._stack else None
+            span = Span(name, parent_id, start=start, **attributes)
+            span.end = end
+            self.spans.append(span)
+
+    def event(self, name, **attributes):
+        """Attach a point-in-time event to the innermost open span"""
+        with self._lock:
+            target = self._stack[-1] if self._stack else None
+            entry = dict(attributes, name=name, time=time.time())
+            if target:
+                target.events.append(entry)
+            else:
+                self.attributes.setdefault('events', []).append(entry)
+
+    def start_profiling(self):
+        """Start the requested profiler on the calling thread (no-op unless profiling was asked for)"""
+        if not self.profile or self.profiler:
+            return
+        self.profiler = start_profiler(self.profile, self)
+
+    def stop_profiling(self):
+        if not self.profiler:
+            return
+        try:
+            self.attributes['profile'] = self.profiler.stop()
+        except Exception as e:
+            self.attributes['profile'] = {'error': str(e)}
+        finally:
+            _profiling.release()
+        self.profiler = None
+
+    def finish(self, **attributes):
+        """Mark the trace complete; it is written as soon as no span is open"""
+        self.stop_profiling()
+        self.attributes.update(attributes)
+        self.finished_at = time.time()
+        self._maybe_write()
+
+    def _maybe_write(self):
+        with self._lock:
+            if self._written or self.finished_at is None or self._stack:
+                return
+            self._written = True
+        self.tracer._finished(self)
+
+    def to_dict(self):
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {
+            'trace_id': self.id,
+            'name': self.name,
+            'start': self.started_at,
+            'end': self.finished_at,
+            'duration_ms': round((self.finished_at - self.started_at) * 1000, 3) if self.finished_at else None,
+            'attributes': self.attributes,
+            'spans': spans,
+        }
+
+
+class Tracer:
+    """Creates traces, keeps the most recent ones and appends finished ones to TRACE_FILE"""
+
+    def __init__(self, trace_file=TRACE_FILE, history=TRACE_HISTORY, max_mb=TRACE_MAX_MB):
+        self.trace_file = trace_file
+        self.history = history
+        self.max_mb = max_mb
+        self.traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    def start(self, name, trace_id=None, profile=None, **attributes):
+        trace = Trace(self, name, trace_id, profile, **attributes)
+        with self._lock:
+            self.traces[trace.id] = trace
+            while len(self.traces) > self.history:
+                self.traces.popitem(last=False)
+        return trace
+
+    def get(self, trace_id):
+        with self._lock:
+            return self.traces.get(trace_id)
+
+    def recent(self, name=None, limit=100):
+        """Most recent traces first, optionally only those with a given name"""
+        with self._lock:
+            traces = [t for t in reversed(self.traces.values()) if name is None or t.name == name]
+        return traces[:limit]
+
+    def _finished(self, trace):
+        if not self.trace_file:
+            return
+        line = json.dumps(trace.to_dict(), default=str) + '\n'
+        with self._file_lock:
+            try:
+                if os.path.exists(self.trace_file) and os.path.getsize(self.trace_file) > self.max_mb * 1024 * 1024:
+                    os.replace(self.trace_file, self.trace_file + '.1')
+                with open(self.trace_file, 'a', encoding='utf-8') as f:
+                    f.write(line)
+            except OSError as e:
+                print(f"[WARNING] Could not write trace {trace.id}: {e}")
+
+
+class CProfileHook:
+    """Deterministic profile of the thread that runs the operation, saved as a .prof file.
+
+    Bot operations share the browser pool's event loop thread, so coroutines of
+    other jobs running at the same time show up in the profile as well.
+    """
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f'{self.trace.id}.prof')
+        self.profile.dump_stats(path)
+
+        summary = io.StringIO()
+        pstats.Stats(self.profile, stream=summary).sort_stats('cumulative').print_stats(15)
+        lines = [line for line in summary.getvalue().splitlines() if line.strip()]
+        # Column header plus the 15 most expensive functions
+        return {'profiler': 'cprofile', 'file': path, 'top': lines[-16:]}
+
+
+class SamplingHook:
+    """Samples the operation's thread stack every PROFILE_SAMPLE_MS ms and saves folded stacks
+    (flamegraph.pl / speedscope input)"""
+
+    def __init__(self, trace, interval_ms=PROFILE_SAMPLE_MS):
+        self.trace = trace
+        self.interval = interval_ms / 1000
+        self.thread_id = threading.get_ident()
+        self.samples = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name=f'profiler-{trace.id[:8]}', daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = ';'.join(
+                f'{name} ({os.path.basename(filename)}:{line})'
+                for filename, line, name, _ in traceback.extract_stack(frame)
+            )
+            self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f'{self.trace.id}.folded')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.samples.items(), key=lambda item: -item[1]):
+                f.write(f'{stack} {count}\n')
+        return {'profiler': 'sample', 'file': path, 'samples': sum(self.samples.values())}
+
+
+# name -> factory(trace) returning an object with stop() -> dict; started on
+# the thread that runs the operation. Other profilers can be registered here.
+PROFILE_HOOKS = {
+    'cprofile': CProfileHook,
+    'sample': SamplingHook,
+}
+
+# Only one operation is profiled at a time, profilers don't nest
+_profiling = threading.Lock()
+
+
+def register_profiler(name, factory):
+    PROFILE_HOOKS[name] = factory
+
+
+def profiler_name(value):
+    """Profiler requested by a header/JSON value (True/'1' means the default), or None"""
+    if value in (None, False, '', '0', 'false', 'off'):
+        return None
+    if value is True or str(value).lower() in ('1', 'true', 'on', 'yes'):
+        return PROFILER
+    return str(value).lower()
+
+
+def start_profiler(name, trace):
+    factory = PROFILE_HOOKS.get(name)
+    if not factory:
+        trace.attributes['profile'] = {'error': f'Unknown profiler: {name}'}
+        return None
+    if not _profiling.acquire(blocking=False):
+        trace.attributes['profile'] = {'error': 'Another operation is being profiled'}
+        return None
+    try:
+        return factory(trace)
+    except Exception as e:
+        _profiling.release()
+        trace.attributes['profile'] = {'error': str(e)}
+        return None
+
+
+# Shared by every request in the process
+tracer = Tracer()
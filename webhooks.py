@@ -0,0 +1,210 @@
+"""
+Completion webhooks for Instagram Bot API
+POSTs send results to a callback URL once jobs finish, so callers don't have to hold a
+connection open through the tunnel or poll /jobs
+"""
+
+import os
+import json
+import hmac
+import time
+import heapq
+import hashlib
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from metrics import WEBHOOK_EVENTS_TOTAL
+
+load_dotenv()
+
+# Where results go when a request doesn't pass its own callback_url (empty = nowhere)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+# Signs each body as X-Instabot-Signature: sha256=<hex HMAC> when set
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Results for the same URL are sent together: up to WEBHOOK_BATCH_SIZE per POST, waiting
+# at most WEBHOOK_BATCH_WINDOW_MS (milliseconds) for more to finish
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '50'))
+WEBHOOK_BATCH_WINDOW_MS = float(os.getenv('WEBHOOK_BATCH_WINDOW_MS', '250'))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv('WEBHOOK_TIMEOUT_SECONDS', '10'))
+# Delivery attempts per batch; retries back off from WEBHOOK_BACKOFF_SECONDS, doubling up to
+# WEBHOOK_BACKOFF_MAX_SECONDS
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '6'))
+WEBHOOK_BACKOFF_SECONDS = float(os.getenv('WEBHOOK_BACKOFF_SECONDS', '2'))
+WEBHOOK_BACKOFF_MAX_SECONDS = float(os.getenv('WEBHOOK_BACKOFF_MAX_SECONDS', '300'))
+
+# Receiver answers worth retrying; other 4xx mean the batch will never be accepted
+RETRY_STATUSES = {408, 425, 429}
+
+
+def valid_callback_url(url):
+    """True for an absolute http(s) URL"""
+    if not isinstance(url, str):
+        return False
+    parsed = urlparse(url)
+    return parsed.scheme in ('http', 'https') and bool(parsed.netloc)
+
+
+class WebhookDispatcher:
+    """Batches finished jobs per callback URL and delivers them from one background thread.
+
+    Connections are kept alive in a pooled requests.Session. A batch that
+    fails with a network error, a 5xx, 408 or 429 is retried with exponential
+    backoff (honouring Retry-After) without holding up other URLs' batches.
+    Undelivered results live in memory only; GET /jobs/<id> still has them.
+    """
+
+    def __init__(self, url=WEBHOOK_URL, secret=WEBHOOK_SECRET, batch_size=WEBHOOK_BATCH_SIZE,
+                 window_ms=WEBHOOK_BATCH_WINDOW_MS, timeout=WEBHOOK_TIMEOUT_SECONDS,
+                 max_attempts=WEBHOOK_MAX_ATTEMPTS, backoff=WEBHOOK_BACKOFF_SECONDS,
+                 backoff_max=WEBHOOK_BACKOFF_MAX_SECONDS):
+        self.url = url or None
+        self.secret = secret
+        self.batch_size = max(1, batch_size)
+        self.window = window_ms / 1000
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=8)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.delivered = 0
+        self.failed = 0
+        self.posts = 0
+        self.last_error = None
+        # url -> events not yet sent, and when the oldest of them arrived
+        self._pending = {}
+        self._pending_since = {}
+        # (due, sequence, url, events, attempts) for batches waiting to be retried
+        self._retries = []
+        self._sequence = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def set_url(self, url):
+        """Change the default callback URL (None turns it off)"""
+        self.url = url or None
+
+    def target(self, job):
+        return job.callback_url or self.url
+
+    def job_finished(self, job):
+        """Queue a job's result for its callback URL, if it has one"""
+        url = self.target(job)
+        if not url:
+            return
+        self.enqueue(url, {
+            'type': 'job.finished',
+            'job_id': job.id,
+            'status': job.status,
+            'job': job.to_dict(),
+            'sent_at': time.time(),
+        })
+
+    def enqueue(self, url, event):
+        self._start()
+        with self._cond:
+            self._pending.setdefault(url, []).append(event)
+            self._pending_since.setdefault(url, time.time())
+            self._cond.notify()
+
+    def _start(self):
+        with self._cond:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._worker, name='webhook-sender', daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        """Block until a batch is full, its window has passed or a retry is due"""
+        with self._cond:
+            while True:
+                now = time.time()
+                if self._retries and self._retries[0][0] <= now:
+                    _, _, url, events, attempts = heapq.heappop(self._retries)
+                    return url, events, attempts
+                for url, events in self._pending.items():
+                    if len(events) >= self.batch_size or self._pending_since[url] + self.window <= now:
+                        batch = events[:self.batch_size]
+                        del events[:self.batch_size]
+                        if events:
+                            self._pending_since[url] = now
+                        else:
+                            del self._pending[url]
+                            del self._pending_since[url]
+                        return url, batch, 0
+                wakeups = [since + self.window for since in self._pending_since.values()]
+                if self._retries:
+                    wakeups.append(self._retries[0][0])
+                self._cond.wait(max(0, min(wakeups) - now) if wakeups else None)
+
+    def _worker(self):
+        while True:
+            url, events, attempts = self._next_batch()
+            self._deliver(url, events, attempts)
+
+    def _sign(self, body):
+        return 'sha256=' + hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def _deliver(self, url, events, attempts):
+        body = json.dumps({'events': events, 'count': len(events)}).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.secret:
+            headers['X-Instabot-Signature'] = self._sign(body)
+        attempts += 1
+        retry_after = None
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout)
+            self.posts += 1
+            if 200 <= response.status_code < 300:
+                self.delivered += len(events)
+                WEBHOOK_EVENTS_TOTAL.inc(len(events), result='delivered')
+                return
+            error = f'HTTP {response.status_code}'
+            retryable = response.status_code >= 500 or response.status_code in RETRY_STATUSES
+            try:
+                retry_after = float(response.headers.get('Retry-After', ''))
+            except ValueError:
+                pass
+        except requests.RequestException as e:
+            error = str(e)
+            retryable = True
+
+        self.last_error = f'{url}: {error}'
+        if retryable and attempts < self.max_attempts:
+            delay = min(self.backoff_max, self.backoff * 2 ** (attempts - 1))
+            if retry_after:
+                delay = max(delay, min(retry_after, self.backoff_max))
+            print(f"[WEBHOOK] Delivery of {len(events)} result(s) to {url} failed ({error}), "
+                  f"retrying in {delay:.1f}s")
+            WEBHOOK_EVENTS_TOTAL.inc(len(events), result='retried')
+            with self._cond:
+                self._sequence += 1
+                heapq.heappush(self._retries, (time.time() + delay, self._sequence, url, events, attempts))
+                self._cond.notify()
+            return
+        print(f"[WARNING] Dropping {len(events)} webhook result(s) for {url} after {attempts} attempt(s): {error}")
+        self.failed += len(events)
+        WEBHOOK_EVENTS_TOTAL.inc(len(events), result='failed')
+
+    def stats(self):
+        with self._cond:
+            pending = sum(len(events) for events in self._pending.values())
+            retrying = sum(len(entry[3]) for entry in self._retries)
+        return {
+            'url': self.url,
+            'signed': bool(self.secret),
+            'pending': pending,
+            'retrying': retrying,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'posts': self.posts,
+            'last_error': self.last_error,
+        }
+
+
+# Shared by the send queue and the /webhook endpoint
+webhooks = WebhookDispatcher()